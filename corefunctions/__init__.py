@@ -1,5 +1,11 @@
 """Importing all modules for easy referencing."""
 from .all_cities import all_cities
+from .city_registry import city_registry, normalise_city, CityRegistry
+from .conversion_registry import convert_unit, convert_units
+from .date_parser import parse_date_string
 from .date_to_int import date_to_int
+from .datetime_to_epoch import datetime_to_epoch
+from .epoch_to_datetime import epoch_to_datetime
+from .fast_json import json_dumps
 from .int_to_datetime import int_to_datetime
 from .unit_conversion import UnitConversion
@@ -0,0 +1,121 @@
+"""A registry of all the cities which can be queried.
+The list of cities is loaded once into a frozen hash index where each city
+name is normalised (case, whitespace and diacritics) so that a lookup is an
+O(1) dictionary access rather than a scan over the list of cities.
+
+The registry also supports aliases (alternative names for a city) and a prefix
+search which can be used to autocomplete city names.
+"""
+
+# IMPORTS
+# Python Core Imports
+from bisect import bisect_left
+from types import MappingProxyType
+import unicodedata
+
+# Third Party Imports
+
+# Local Imports
+# The except route is followed when calling the module directly.
+try:
+    from corefunctions import all_cities
+except ModuleNotFoundError:
+    from all_cities import all_cities
+
+
+# Alternative names for a city mapped to the name of the city as it appears in
+# all_cities.json. Aliases never override the name of an existing city.
+CITY_ALIASES = {
+    'hull': 'kingston upon hull',
+    'newcastle-upon-tyne': 'newcastle upon tyne',
+    'newcastle on tyne': 'newcastle upon tyne',
+    'saint albans': 'st albans',
+    'saint davids': 'st davids',
+    'brighton': 'brighton and hove',
+    'hove': 'brighton and hove',
+}
+
+
+def normalise_city(name):
+    """Normalises a city name so that different spellings of the same name
+    produce the same key. The name is case folded, diacritics are removed,
+    "&" is replaced with "and" and any whitespace is collapsed.
+    e.g: " Brighton  &  Hove" -> "brighton and hove"
+    """
+    name = unicodedata.normalize('NFKD', name.casefold())
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = name.replace('&', ' and ')
+
+    return ' '.join(name.split())
+
+
+class CityRegistry:
+    """An immutable index of city names.
+    Arguments:
+        * cities [iterable]: the names of the cities.
+        * aliases [dict]: (default=None) alternative names mapped to a city in
+                          cities. Aliases pointing at an unknown city are
+                          ignored.
+    """
+
+    def __init__(self, cities, aliases=None):
+        index = {}
+        for city in cities:
+            index[normalise_city(city)] = city
+
+        for alias, city in (aliases or {}).items():
+            canonical = index.get(normalise_city(city))
+            if canonical is not None:
+                index.setdefault(normalise_city(alias), canonical)
+
+        self._index = MappingProxyType(index)
+
+        # Sorted keys allow a prefix search to be done with a binary search.
+        self._sortedKeys = tuple(sorted(index))
+        self._cities = frozenset(index.values())
+
+    def lookup(self, name):
+        """Returns the name of the city as it appears in all_cities.json
+        where name is a city name or an alias. Returns None if the city
+        cannot be found.
+        """
+        if not isinstance(name, str):
+            return None
+
+        return self._index.get(normalise_city(name))
+
+    def prefix_search(self, prefix, limit=10):
+        """Returns up to limit city names (sorted) whose name or alias begins
+        with prefix.
+        """
+        prefix = normalise_city(prefix)
+        matches = []
+
+        position = bisect_left(self._sortedKeys, prefix)
+        for idx in range(position, len(self._sortedKeys)):
+            key = self._sortedKeys[idx]
+            if len(matches) >= limit or not key.startswith(prefix):
+                break
+
+            city = self._index[key]
+            if city not in matches:
+                matches.append(city)
+
+        return matches
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    def __iter__(self):
+        return iter(self._cities)
+
+    def __len__(self):
+        return len(self._cities)
+
+
+city_registry = CityRegistry(all_cities, CITY_ALIASES)
+
+
+if __name__ == "__main__":
+    print(city_registry.lookup(' Brighton & Hove'))
+    print(city_registry.prefix_search('new'))
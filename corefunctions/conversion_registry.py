@@ -0,0 +1,150 @@
+"""Registry of the unit conversions supported for temperature and pressure.
+Each conversion is an affine function of the value,
+value * multiplier / divisor + offset, so a conversion is a dictionary
+lookup followed by a little arithmetic whether converting one value or a
+whole array of values.
+    * convert_unit: converts a single value.
+    * convert_units: converts many values in one call, using NumPy when it is
+      installed.
+"""
+
+# IMPORTS
+# Python Core Imports
+from collections import namedtuple
+
+# Third Party Imports
+# NumPy is optional, without it convert_units converts each value in turn.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Local Imports
+
+Conversion = namedtuple(
+    'Conversion',
+    ['multiplier', 'divisor', 'offset', 'rounded']
+)
+Conversion.__doc__ = """Converts a value to value * multiplier / divisor +
+offset, rounded to the precision requested if rounded is True.
+"""
+
+# Conversions keyed by (quantity, initial unit, new unit). Units are lower
+# case.
+CONVERSIONS = {
+    # Kelvin (K) to Celsius (C)
+    ('temperature', 'k', 'c'): Conversion(1, 1, -273.15, True),
+    # Celsius (C) to Kelvin (K)
+    ('temperature', 'c', 'k'): Conversion(1, 1, 273.15, True),
+    # Kelvin (K) to Fahrenheit (F)
+    ('temperature', 'k', 'f'): Conversion(9, 5, -459.67, True),
+    # hectopascals (hPa) to pascals (Pa)
+    ('pressure', 'hpa', 'pa'): Conversion(100, 1, 0, False),
+    # hectopascals (hPa) to bar (bar)
+    ('pressure', 'hpa', 'bar'): Conversion(1, 1000, 0, False),
+    # hectopascals (hPa) to standard atmosphere (atm)
+    ('pressure', 'hpa', 'atm'): Conversion(1, 1013.25, 0, True),
+    # hectopascals (hPa) to torr (Torr)
+    ('pressure', 'hpa', 'torr'): Conversion(1, 1.33, 0, True),
+    # hectopascals (hPa) to pound per square inch (psi)
+    ('pressure', 'hpa', 'psi'): Conversion(1, 68.95, 0, True),
+}
+
+# Symbols shown after a converted value.
+UNIT_SYMBOLS = {
+    'k': 'K',
+    'c': 'C',
+    'f': 'F',
+    'pa': 'Pa',
+    'hpa': 'hPa',
+    'bar': 'bar',
+    'atm': 'atm',
+    'torr': 'Torr',
+    'psi': 'psi',
+}
+
+
+def _apply(conversion, value):
+    """Returns value converted by conversion (before rounding). Dividing
+    by 1 is skipped so that integers stay integers where no division is
+    needed (e.g: hPa to Pa).
+    """
+    value = value * conversion.multiplier
+    if conversion.divisor != 1:
+        value = value / conversion.divisor
+
+    return value + conversion.offset
+
+
+def get_conversion(quantity, initialUnit, newUnit):
+    """Returns the Conversion of quantity ("temperature" or "pressure") from
+    initialUnit to newUnit. Raises a ValueError if the conversion is not
+    supported.
+    """
+    try:
+        return CONVERSIONS[(quantity, initialUnit.lower(), newUnit.lower())]
+    except KeyError:
+        raise ValueError(
+            f'{quantity.capitalize()} convert of {initialUnit.lower()} to '
+            f'{newUnit.lower()} is not supported.'
+        ) from None
+
+
+def convert_unit(
+    quantity,
+    value,
+    initialUnit,
+    newUnit,
+    maxPrecision=10,
+    showUnits=False
+):
+    """Converts value of quantity ("temperature" or "pressure") from
+    initialUnit to newUnit.
+    Arguments:
+        * maxPrecision [int]: (default=10) the number of decimal places the
+                              converted value is rounded to.
+        * showUnits [bool]: (default=False) if True, returns a string with
+                            the units placed at the end.
+    """
+    conversion = get_conversion(quantity, initialUnit, newUnit)
+
+    convertedValue = _apply(conversion, value)
+    if conversion.rounded:
+        convertedValue = round(convertedValue, maxPrecision)
+
+    if showUnits:
+        return f'{convertedValue}{UNIT_SYMBOLS[newUnit.lower()]}'
+
+    return convertedValue
+
+
+def convert_units(quantity, values, initialUnit, newUnit, maxPrecision=10):
+    """Converts each of values (a sequence or NumPy array) of quantity from
+    initialUnit to newUnit in one call. Returns a NumPy array if NumPy is
+    installed, otherwise a list.
+    NumPy rounds by scaling, so a rounded value can differ from convert_unit
+    in the last decimal place.
+    """
+    conversion = get_conversion(quantity, initialUnit, newUnit)
+
+    if numpy is not None:
+        convertedValues = (
+            numpy.asarray(values, dtype=float)
+            * conversion.multiplier / conversion.divisor
+            + conversion.offset
+        )
+        if conversion.rounded:
+            convertedValues = numpy.round(convertedValues, maxPrecision)
+
+        return convertedValues
+
+    if conversion.rounded:
+        return [round(_apply(conversion, value), maxPrecision)
+                for value in values]
+
+    return [_apply(conversion, value) for value in values]
+
+
+if __name__ == "__main__":
+    print(convert_unit('temperature', 99, 'K', 'C', showUnits=True))
+    print(convert_units('pressure', [1000, 1013.25], 'hPa', 'atm'))
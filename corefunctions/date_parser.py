@@ -0,0 +1,107 @@
+"""Parses the ISO-8601 date strings accepted by the "at" query parameter into
+datetime objects.
+This is a faster replacement for UnitConversion.convert_date_string: the
+patterns are compiled once, the datetime is built directly from the matched
+groups (rather than with datetime.strptime) and recently parsed strings are
+cached.
+The following formats are supported:
+    * YYYY-MM-DD
+    * YYYY-MM-DDTHH:MM:SSZ
+    * YYYY-MM-DDTHH:MM:SS+HH:MM (or -HH:MM)
+    * YYYYMMDDTHHMMSSZ
+Times with an offset are converted to UTC. A "+" in a URL is decoded as a
+space, so a space is accepted in place of "+" before the offset.
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime, timedelta
+from functools import lru_cache
+import re
+
+# Third Party Imports
+
+# Local Imports
+
+_DATE = r'([12]\d{3})-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+_TIME = r'([01]\d|2[0-3]):([0-5]\d):([0-5]\d)'
+
+# example pattern: 2020-02-15
+DATE_PATTERN = re.compile(_DATE)
+
+# example pattern: 2017-01-01T00:00:00Z
+DATETIME_UTC_PATTERN = re.compile(f'{_DATE}T{_TIME}Z')
+
+# example patterns: 2020-02-15T20:53:15+00:00, 2020-02-15T20:53:15-00:00,
+# 2020-02-15T20:53:15 00:00
+DATETIME_OFFSET_PATTERN = re.compile(
+    f'{_DATE}T{_TIME}([ +-])([0-5]\\d):([0-5]\\d)'
+)
+
+# example pattern: 20200215T205315Z
+BASIC_UTC_PATTERN = re.compile(
+    r'([12]\d{3})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])'
+    r'T([01]\d|2[0-3])([0-5]\d)([0-5]\d)Z'
+)
+
+# Number of parsed date strings cached.
+CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date_string(value):
+    """Converts value, a date string in one of the supported formats, to a
+    datetime object. Raises a ValueError if the value is not in a supported
+    format or is not a valid date.
+    """
+    match = DATE_PATTERN.fullmatch(value)
+    if match:
+        return datetime(*map(int, match.groups()))
+
+    match = (DATETIME_UTC_PATTERN.fullmatch(value)
+             or BASIC_UTC_PATTERN.fullmatch(value))
+    if match:
+        return datetime(*map(int, match.groups()))
+
+    match = DATETIME_OFFSET_PATTERN.fullmatch(value)
+    if match:
+        groups = match.groups()
+        offset = timedelta(hours=int(groups[7]), minutes=int(groups[8]))
+
+        # Convert the time to UTC.
+        if groups[6] == '-':
+            offset = -offset
+
+        return datetime(*map(int, groups[:6])) - offset
+
+    raise ValueError(
+        f'Could not find datetime in the string provided ({value}).'
+    )
+
+
+if __name__ == "__main__":
+    # Compare the time taken to parse each format against
+    # UnitConversion.convert_date_string.
+    import timeit
+    from unit_conversion import UnitConversion
+
+    for value in ['2020-02-15', '2017-01-01T11:22:33Z',
+                  '2020-02-15T20:53:15+03:02', '20170101T112233Z']:
+        assert parse_date_string(value) == UnitConversion(
+            value, 'unknown', 'datetime').convert_date_string()
+
+        before = timeit.timeit(
+            lambda: UnitConversion(
+                value, 'unknown', 'datetime').convert_date_string(),
+            number=20000
+        )
+        uncached = timeit.timeit(
+            lambda: parse_date_string.__wrapped__(value),
+            number=20000
+        )
+        cached = timeit.timeit(lambda: parse_date_string(value), number=20000)
+
+        print(f'{value:<26} convert_date_string: {before:.3f}s, '
+              f'parse_date_string: {uncached:.3f}s '
+              f'({before / uncached:.1f}x), cached: {cached:.3f}s '
+              f'({before / cached:.0f}x)')
@@ -0,0 +1,16 @@
+"""Converts a datetime object to an epoch (the number of seconds since
+1970-01-01 00:00 UTC).
+"""
+
+
+def datetime_to_epoch(inputDate):
+    """Converts inputDate into an integer number of seconds since the epoch
+    where inputDate is a datetime object. A naive inputDate is taken to be in
+    local time (as returned by datetime.now()).
+    """
+    return int(inputDate.timestamp())
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+    print(datetime_to_epoch(datetime.now()))
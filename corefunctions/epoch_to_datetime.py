@@ -0,0 +1,24 @@
+"""Converts an epoch (the number of seconds since 1970-01-01 00:00 UTC) into
+a datetime object.
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime
+
+# Third Party Imports
+
+# Local Imports
+
+
+def epoch_to_datetime(epoch):
+    """Converts epoch, an integer number of seconds since the epoch, to a
+    naive datetime object in local time.
+    """
+    return datetime.fromtimestamp(epoch)
+
+
+if __name__ == "__main__":
+    print(
+        epoch_to_datetime(0) == datetime.fromtimestamp(0)
+    )
@@ -0,0 +1,53 @@
+"""Serialises data to JSON bytes, using orjson when it is installed and the
+standard library json module otherwise.
+orjson writes bytes directly (no str to bytes encoding step) and is several
+times faster than json.dumps for the dictionaries of strings and numbers
+returned by the service.
+"""
+
+# IMPORTS
+# Python Core Imports
+import json
+
+# Third Party Imports
+# orjson is optional, the standard library is used if it is not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(data):
+    """Returns data serialised as UTF-8 encoded JSON (bytes)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+
+    # Matches the output of orjson.
+    return json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+if __name__ == "__main__":
+    # Compare the time taken to serialise a forecast response and a batch
+    # response for 500 cities.
+    import timeit
+
+    forecast = {
+        'clouds': 'broken clouds',
+        'humidity': '66.6%',
+        'pressure': '1027.51 hPa',
+        'temperature': '14.4C',
+    }
+    batch = {'forecasts': {f'city {idx}': forecast for idx in range(500)}}
+
+    for name, data, number in [('forecast', forecast, 100000),
+                               ('batch', batch, 500)]:
+        stdlib = timeit.timeit(
+            lambda: json.dumps(data).encode('utf-8'), number=number
+        )
+        fast = timeit.timeit(lambda: json_dumps(data), number=number)
+
+        print(f'{name:<9} json.dumps: {stdlib / number * 1e6:.2f}us, '
+              f'json_dumps ({"orjson" if orjson else "json"}): '
+              f'{fast / number * 1e6:.2f}us ({stdlib / fast:.1f}x)')
@@ -0,0 +1,79 @@
+"""Unittests for the corefunctions.city_registry module.
+Included tests:
+    * test_lookup_normalises_names
+    * test_lookup_aliases
+    * test_unknown_city
+    * test_prefix_search
+    * test_all_cities_indexed
+"""
+
+# IMPORTS
+# Python Core Imports
+import unittest
+
+# Third Party Imports
+
+# Local Imports
+from corefunctions import all_cities, city_registry, CityRegistry
+
+
+class TestCityRegistry(unittest.TestCase):
+    """Tests each method in the CityRegistry class."""
+
+    def test_lookup_normalises_names(self):
+        """Test that case, whitespace and diacritics are ignored."""
+        self.assertEqual(city_registry.lookup('London'), 'london')
+        self.assertEqual(city_registry.lookup('  LONDON '), 'london')
+        self.assertEqual(
+            city_registry.lookup('Kingston  Upon   Hull'),
+            'kingston upon hull'
+        )
+        self.assertEqual(
+            city_registry.lookup('Brighton & Hove'),
+            'brighton and hove'
+        )
+
+        registry = CityRegistry(['sao paulo'])
+        self.assertEqual(registry.lookup('São Paulo'), 'sao paulo')
+
+    def test_lookup_aliases(self):
+        """Test that aliases resolve to the city and never override the name
+        of an existing city.
+        """
+        self.assertEqual(city_registry.lookup('Hull'), 'kingston upon hull')
+        self.assertEqual(
+            city_registry.lookup('Newcastle-upon-Tyne'),
+            'newcastle upon tyne'
+        )
+        self.assertEqual(city_registry.lookup('Newcastle'), 'newcastle')
+
+        registry = CityRegistry(['bath'], {'bath': 'york', 'aquae sulis': 'bath'})
+        self.assertEqual(registry.lookup('bath'), 'bath')
+        self.assertEqual(registry.lookup('aquae sulis'), 'bath')
+        self.assertEqual(len(registry), 1)
+
+    def test_unknown_city(self):
+        """Test that an unknown city returns None."""
+        self.assertIsNone(city_registry.lookup('westeros'))
+        self.assertIsNone(city_registry.lookup(None))
+        self.assertNotIn('westeros', city_registry)
+        self.assertIn('LONDON', city_registry)
+
+    def test_prefix_search(self):
+        """Test that the prefix search returns sorted unique matches."""
+        registry = CityRegistry(
+            ['newport', 'newcastle', 'newcastle upon tyne', 'york'],
+            {'newcastle-upon-tyne': 'newcastle upon tyne'}
+        )
+        self.assertEqual(
+            registry.prefix_search('New'),
+            ['newcastle', 'newcastle upon tyne', 'newport']
+        )
+        self.assertEqual(registry.prefix_search('new', limit=1), ['newcastle'])
+        self.assertEqual(registry.prefix_search('zz'), [])
+
+    def test_all_cities_indexed(self):
+        """Test that every city in all_cities can be looked up."""
+        self.assertEqual(len(city_registry), len(all_cities))
+        for city in all_cities:
+            self.assertEqual(city_registry.lookup(city), city)
@@ -0,0 +1,84 @@
+"""Unittests for the corefunctions.conversion_registry module.
+Included tests:
+    * test_convert_unit
+    * test_unsupported_conversion
+    * test_convert_units
+    * test_convert_units_without_numpy
+    * test_convert_units_with_numpy (skipped if NumPy is not installed)
+"""
+
+# IMPORTS
+# Python Core Imports
+import unittest
+from unittest import mock
+
+# Third Party Imports
+
+# Local Imports
+from corefunctions import conversion_registry, convert_unit, convert_units
+
+
+class TestConversionRegistry(unittest.TestCase):
+    """Tests the convert_unit and convert_units functions."""
+
+    def test_convert_unit(self):
+        """Test that values are converted, with and without units."""
+        self.assertEqual(convert_unit('temperature', 99, 'K', 'C'), -174.15)
+        self.assertEqual(
+            convert_unit('temperature', 300, 'k', 'f', showUnits=True),
+            '80.33F'
+        )
+        self.assertEqual(
+            convert_unit('pressure', 1000, 'hPa', 'Pa', showUnits=True),
+            '100000Pa'
+        )
+        self.assertEqual(convert_unit('pressure', 1013.25, 'hPa', 'atm'), 1)
+
+    def test_unsupported_conversion(self):
+        """Test that an unsupported conversion raises a ValueError."""
+        with self.assertRaises(ValueError):
+            convert_unit('temperature', 10, 'F', 'K')
+
+        with self.assertRaises(ValueError):
+            convert_units('pressure', [10], 'psi', 'hPa')
+
+    def test_convert_units(self):
+        """Test that many values are converted in one call."""
+        values = [0, 273.15, 300]
+        self.assertEqual(
+            list(convert_units('temperature', values, 'K', 'C', 2)),
+            [convert_unit('temperature', value, 'K', 'C', 2)
+             for value in values]
+        )
+
+    def test_convert_units_without_numpy(self):
+        """Test that values are converted when NumPy is not installed."""
+        with mock.patch.object(conversion_registry, 'numpy', None):
+            self.assertEqual(
+                convert_units('pressure', [1000, 2000], 'hPa', 'bar'),
+                [1, 2]
+            )
+
+    @unittest.skipUnless(conversion_registry.numpy, 'NumPy is not installed')
+    def test_convert_units_with_numpy(self):
+        """Test that the NumPy path gives the same values as converting each
+        value in turn, for every conversion.
+        """
+        values = [0, 1.5, 273.15, 300, 1013.25, 101325]
+
+        for quantity, initialUnit, newUnit in \
+                conversion_registry.CONVERSIONS:
+            converted = convert_units(quantity, values, initialUnit, newUnit,
+                                      4)
+            self.assertIsInstance(converted, conversion_registry.numpy.ndarray)
+
+            with mock.patch.object(conversion_registry, 'numpy', None):
+                expected = convert_units(quantity, values, initialUnit,
+                                         newUnit, 4)
+
+            for value, expectedValue in zip(converted, expected):
+                # NumPy rounds by scaling (see convert_units).
+                self.assertAlmostEqual(
+                    value, expectedValue, places=3,
+                    msg=(quantity, initialUnit, newUnit)
+                )
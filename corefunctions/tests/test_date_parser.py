@@ -0,0 +1,54 @@
+"""Unittests for the corefunctions.date_parser module.
+Included tests:
+    * test_formats
+    * test_matches_unit_conversion
+    * test_invalid_dates
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime
+import unittest
+
+# Third Party Imports
+
+# Local Imports
+from corefunctions import parse_date_string, UnitConversion
+
+
+class TestDateParser(unittest.TestCase):
+    """Tests the parse_date_string function."""
+
+    def test_formats(self):
+        """Test that each supported format is parsed, with offsets converted
+        to UTC and a space read as "+".
+        """
+        for value, expected in [
+            ('2020-02-15', datetime(2020, 2, 15)),
+            ('2017-01-01T11:22:33Z', datetime(2017, 1, 1, 11, 22, 33)),
+            ('20170101T112233Z', datetime(2017, 1, 1, 11, 22, 33)),
+            ('2020-02-15T20:53:15+03:02', datetime(2020, 2, 15, 17, 51, 15)),
+            ('2020-02-15T20:53:15 03:02', datetime(2020, 2, 15, 17, 51, 15)),
+            ('2020-02-15T20:53:15-03:02', datetime(2020, 2, 15, 23, 55, 15)),
+        ]:
+            self.assertEqual(parse_date_string(value), expected, value)
+
+    def test_matches_unit_conversion(self):
+        """Test that the results match UnitConversion.convert_date_string."""
+        for value in ['2020-02-29', '2017-12-31T23:59:59Z',
+                      '2020-01-01T00:30:00+01:00', '20201231T000000Z']:
+            self.assertEqual(
+                parse_date_string(value),
+                UnitConversion(
+                    value, 'unknown', 'datetime'
+                ).convert_date_string()
+            )
+
+    def test_invalid_dates(self):
+        """Test that invalid dates and unsupported formats raise a
+        ValueError.
+        """
+        for value in ['2020-02-30', '2020-13-01', '15/02/2020',
+                      '2020-02-15T20:53', '2020-02-15\n', '']:
+            with self.assertRaises(ValueError, msg=value):
+                parse_date_string(value)
@@ -0,0 +1,56 @@
+"""Unittests for the corefunctions.datetime_to_epoch and
+corefunctions.epoch_to_datetime modules.
+Included tests:
+    * test_round_trip
+    * test_legacy_int_conversion
+    * test_distance_across_boundaries
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime
+import unittest
+
+# Third Party Imports
+
+# Local Imports
+from corefunctions import (date_to_int, datetime_to_epoch, epoch_to_datetime,
+                           int_to_datetime)
+
+
+class TestEpochConversion(unittest.TestCase):
+    """Tests the conversions between datetimes and epochs."""
+
+    def test_round_trip(self):
+        """Test that converting to an epoch and back returns the same
+        datetime.
+        """
+        forecastDate = datetime(2020, 2, 15, 21, 0)
+        epoch = datetime_to_epoch(forecastDate)
+
+        self.assertIsInstance(epoch, int)
+        self.assertEqual(epoch_to_datetime(epoch), forecastDate)
+
+    def test_legacy_int_conversion(self):
+        """Test that a YYYYMMDDHHMM value converts to the same time as an
+        epoch.
+        """
+        forecastDate = datetime(2020, 12, 31, 23, 0)
+        self.assertEqual(
+            datetime_to_epoch(int_to_datetime(date_to_int(forecastDate))),
+            datetime_to_epoch(forecastDate)
+        )
+
+    def test_distance_across_boundaries(self):
+        """Test that the difference between epochs is the number of seconds
+        between the times across day, month and year boundaries.
+        """
+        for before, after in [
+            (datetime(2020, 1, 1, 22, 0), datetime(2020, 1, 2, 1, 0)),
+            (datetime(2020, 1, 31, 22, 0), datetime(2020, 2, 1, 1, 0)),
+            (datetime(2019, 12, 31, 22, 0), datetime(2020, 1, 1, 1, 0)),
+        ]:
+            self.assertEqual(
+                datetime_to_epoch(after) - datetime_to_epoch(before),
+                3 * 60 * 60
+            )
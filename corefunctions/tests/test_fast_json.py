@@ -0,0 +1,48 @@
+"""Unittests for the corefunctions.fast_json module.
+Included tests:
+    * test_json_dumps
+    * test_stdlib_fallback
+"""
+
+# IMPORTS
+# Python Core Imports
+import json
+import unittest
+from unittest import mock
+
+# Third Party Imports
+
+# Local Imports
+from corefunctions import fast_json, json_dumps
+
+
+class TestFastJson(unittest.TestCase):
+    """Tests the json_dumps function."""
+
+    data = {
+        'clouds': 'broken clouds',
+        'humidity': '66.6%',
+        'temperature': 14.4,
+        'forecasts': [1, None, True, 'Zürich'],
+    }
+
+    def test_json_dumps(self):
+        """Test that the data is serialised to bytes which decode to the
+        same data.
+        """
+        body = json_dumps(self.data)
+
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body), self.data)
+
+    def test_stdlib_fallback(self):
+        """Test that the json module is used when orjson is not installed
+        and that the output is the same.
+        """
+        with mock.patch.object(fast_json, 'orjson', None):
+            body = json_dumps(self.data)
+
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body), self.data)
+        if fast_json.orjson is not None:
+            self.assertEqual(body, json_dumps(self.data))
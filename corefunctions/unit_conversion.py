@@ -10,8 +10,10 @@ from datetime import datetime, timedelta
 # Local Imports
 # The except route is followed when calling the module directly.
 try:
+    from corefunctions.conversion_registry import convert_unit
     from corefunctions import date_to_int
 except ModuleNotFoundError:
+    from conversion_registry import convert_unit
     from date_to_int import date_to_int
 
 
@@ -46,89 +48,30 @@ class UnitConversion:
         self.showUnits = showUnits
 
     def convert_temperature(self):
-        """Converts temperatures to new units."""
-        converted = False
-
-        # Convert Kelvin (K) to Celsius (C)
-        if self.initialUnit == 'k' and self.newUnit == 'c':
-            convertedValue = round(self.value - 273.15, self.maxPrecision)
-            converted = True
-
-        # Convert Celsius (C) to Kelvin (K)
-        elif self.initialUnit == 'c' and self.newUnit == 'k':
-            convertedValue = round(self.value + 273.15, self.maxPrecision)
-            converted = True
-
-        # Convert Kelvin (K) to Fahrenheit (F)
-        if self.initialUnit == 'k' and self.newUnit == 'f':
-            convertedValue = round(
-                self.value * 9 / 5 - 459.67,
-                self.maxPrecision
-            )
-            converted = True
-
-        # Check if value has been converted, raise a ValueError.
-        if converted:
-            if self.showUnits:
-                return f'{convertedValue}{self.newUnit.upper()}'
-            else:
-                return convertedValue
-
-        else:
-            raise ValueError(
-                f'temperature convert of {self.initialUnit} to {self.newUnit} \
-                is not supported.'
-            )
+        """Converts temperatures to new units. The supported conversions are
+        listed in conversion_registry.CONVERSIONS.
+        """
+        return convert_unit(
+            'temperature',
+            self.value,
+            self.initialUnit,
+            self.newUnit,
+            self.maxPrecision,
+            self.showUnits
+        )
 
     def convert_pressure(self):
-        """Converts pressure units"""
-        converted = False
-
-        # Convert hectopascals (hPa) to pascals (Pa)
-        if self.initialUnit == 'hpa' and self.newUnit == 'pa':
-            convertedValue = self.value * 100
-            converted = True
-
-        # Convert hectopascals (hPa) to bar (bar)
-        elif self.initialUnit == 'hpa' and self.newUnit == 'bar':
-            convertedValue = self.value / 1000
-            converted = True
-
-        # Convert hectopascals (hPa) to standard atmosphere (atm)
-        elif self.initialUnit == 'hpa' and self.newUnit == 'atm':
-            convertedValue = round(self.value / 1013.25, self.maxPrecision)
-            converted = True
-
-        # Convert hectopascals (hPa) to torr (Torr)
-        elif self.initialUnit == 'hpa' and self.newUnit == 'torr':
-            convertedValue = round(self.value / 1.33, self.maxPrecision)
-            converted = True
-
-        # Convert hectopascals (hPa) to pound per square inch (psi)
-        elif self.initialUnit == 'hpa' and self.newUnit == 'psi':
-            convertedValue = round(self.value / 68.95, self.maxPrecision)
-            converted = True
-
-        # If the value has not been converted, raise a ValueError.
-        if converted:
-            if self.showUnits:
-                unitCorrectFormat = {
-                    'pa': 'Pa',
-                    'bar': 'bar',
-                    'atm': 'atm',
-                    'hpa': 'hPa',
-                    'torr': 'Torr',
-                    'psi': 'psi'
-                }
-                return f'{convertedValue}{unitCorrectFormat[self.newUnit]}'
-            else:
-                return convertedValue
-
-        else:
-            raise ValueError(
-                f'Pressure convert of {self.initialUnit} to {self.newUnit} \
-                is not supported.'.replace('\t', '')
-            )
+        """Converts pressure units. The supported conversions are listed in
+        conversion_registry.CONVERSIONS.
+        """
+        return convert_unit(
+            'pressure',
+            self.value,
+            self.initialUnit,
+            self.newUnit,
+            self.maxPrecision,
+            self.showUnits
+        )
 
     def convert_date_string(self):
         """Converts date strings to a new format.
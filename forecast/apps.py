@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ForecastConfig(AppConfig):
     name = 'forecast'
+
+    def ready(self):
+        # Connects the signal receivers.
+        from . import signals  # noqa: F401
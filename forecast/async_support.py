@@ -0,0 +1,124 @@
+"""Support for the asynchronous forecast view.
+    * run_db: runs a blocking (database) function on a bounded thread pool.
+    * AsyncSingleFlight: coalesces concurrent coroutines for the same key so
+      that thousands of requests for a city can wait on a single fetch
+      without holding a thread each.
+    * refresh_forecasts_async: the asynchronous version of
+      ResponseBuilder.refresh_forecasts.
+"""
+
+# IMPORTS
+# Python Core Imports
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import time
+
+# Third Party Imports
+from django.db import close_old_connections
+
+# Local Imports
+from . import config
+from .response_builder import ResponseBuilder
+from .single_flight import acquire_refresh_lock, release_refresh_lock
+from .upstream import upstream_client
+
+db_executor = ThreadPoolExecutor(
+    config.ASYNC_DB_THREADS,
+    thread_name_prefix='forecast-db'
+)
+
+
+def _with_connection(function, *args, **kwargs):
+    """Calls function, closing the thread's database connection before and
+    after if it has been open for longer than settings.CONN_MAX_AGE (as
+    Django does at the start and end of each request).
+    """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(function, *args, **kwargs):
+    """Runs function (which may access the database) on the bounded database
+    thread pool and returns its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db_executor,
+        functools.partial(
+            # The context is copied so that the database queries are timed
+            # as part of the request (see metrics.request_timings).
+            contextvars.copy_context().run,
+            _with_connection, function, *args, **kwargs
+        )
+    )
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutines which share a key. While a call for a
+    key is in progress on an event loop, any other calls for the same key on
+    that loop await its result rather than running again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, function, *args):
+        """Awaits function(*args) unless a call for key is already in
+        progress, in which case awaits that call's result.
+        """
+        callKey = (asyncio.get_running_loop(), key)
+
+        call = self._calls.get(callKey)
+        if call is not None:
+            # shield() stops a cancelled waiter from cancelling the call.
+            return await asyncio.shield(call)
+
+        call = asyncio.ensure_future(function(*args))
+        self._calls[callKey] = call
+        call.add_done_callback(lambda _: self._calls.pop(callKey, None))
+
+        return await asyncio.shield(call)
+
+
+city_refreshes_async = AsyncSingleFlight()
+
+
+async def refresh_forecasts_async(city, hasData):
+    """Fetches new forecasts for the city from the API unless hasData (a
+    blocking function) returns a truthy value. Returns the number of rows
+    written.
+    Only one refresh of a city runs at a time: concurrent requests on the
+    event loop await the refresh already in progress and other processes
+    wait for the city's refresh lock to be released. Waiting never holds a
+    thread.
+    """
+    async def refresh():
+        while True:
+            acquiredAt = time.time()
+            if await run_db(acquire_refresh_lock, city, acquiredAt):
+                break
+            await asyncio.sleep(config.REFRESH_LOCK_POLL_SECS)
+
+        try:
+            # Another process may have fetched the forecasts while waiting
+            # for the lock.
+            if await run_db(hasData):
+                return 0
+
+            apiData = await upstream_client.fetch_async(city)
+            rowsWritten = await run_db(ResponseBuilder.ingest, city, apiData)
+
+            # Warm the cache for the requests waiting on the refresh.
+            await run_db(hasData)
+
+            return rowsWritten
+
+        finally:
+            await run_db(release_refresh_lock, city, acquiredAt)
+
+    return await city_refreshes_async.do(city, refresh)
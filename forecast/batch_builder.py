@@ -0,0 +1,250 @@
+"""Builds the response for the batch forecast view: the current forecast for
+many cities in a single JSON HttpResponse. A city which cannot be found or
+whose forecasts cannot be fetched has an error in place of its forecast
+without failing the other cities.
+At most config.BATCH_MAX_FETCHES cities without forecasts are fetched from the
+API during the request. The other cities are fetched in the background and
+returned as pending (unless the API is failing), so that a batch of cities without forecasts does not
+hold the request for longer than the server's timeout.
+"""
+
+# IMPORTS
+# Python Core Imports
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import logging
+
+# Third Party Imports
+from django.db import connections
+
+# Local Imports
+from . import config
+import corefunctions
+from .response_builder import ResponseBuilder
+from .upstream import CircuitOpenError, UpstreamError, upstream_client
+
+logger = logging.getLogger(__name__)
+
+
+class BatchBuilder:
+    """Builds the response for the batch forecast view.
+    Arguments:
+    request [obj]: HTTP request object. The cities are read from the
+                   "cities" parameter (comma separated) or, for a POST, from
+                   a JSON body of the form {"cities": ["london", ...]}.
+                   "temp_units" and "pressure_units" are applied to every
+                   city.
+    """
+
+    def __init__(self, request):
+        # Arguments attached to the self object.
+        self.request = request
+
+        # Build the response
+        self._response = self._set_response()
+
+    def _set_response(self):
+        """Sets the HTTP response"""
+        try:
+            cities = self.requested_cities()
+        except ValueError:
+            return self.error_response(
+                'Invalid request body, expected {"cities": [...]}',
+                'invalid request'
+            )
+
+        if not cities:
+            return self.error_response('No cities provided', 'invalid request')
+
+        if len(cities) > config.BATCH_MAX_CITIES:
+            return self.error_response(
+                f'At most {config.BATCH_MAX_CITIES} cities can be requested',
+                'invalid request'
+            )
+
+        tempUnits = self.request.GET.get('temp_units') or 'C'
+        if tempUnits not in ResponseBuilder.TEMP_UNITS:
+            return ResponseBuilder.INVALID_TEMP_UNITS()
+
+        pressureUnits = (
+            self.request.GET.get('pressure_units') or 'hPa'
+        ).lower()
+        if pressureUnits not in ResponseBuilder.PRESSURE_UNITS:
+            return ResponseBuilder.INVALID_PRESSURE_UNITS()
+
+        canonicalCities = {
+            city: corefunctions.city_registry.lookup(city) for city in cities
+        }
+        forecasts, pending, errors = self.nearest_forecasts(
+            # In the order requested, so that the cities fetched first are
+            # the first requested.
+            list(dict.fromkeys(
+                city for city in canonicalCities.values() if city
+            )),
+            datetime.now()
+        )
+
+        response = {}
+        for city, canonicalCity in canonicalCities.items():
+            if canonicalCity is None:
+                response[city] = {
+                    'error': f"Cannot find city '{city}'",
+                    'error_code': 'city not found'
+                }
+
+            elif canonicalCity in pending:
+                response[city] = {
+                    'error': 'The forecast is being fetched, retry shortly',
+                    'error_code': 'pending'
+                }
+
+            elif canonicalCity in errors:
+                response[city] = ResponseBuilder.upstream_error(
+                    errors[canonicalCity]
+                )[0]
+
+            elif canonicalCity not in forecasts:
+                response[city] = {
+                    'error': 'Unable to fetch the forecast',
+                    'error_code': 'upstream error'
+                }
+
+            else:
+                response[city] = ResponseBuilder.format_values(
+                    ResponseBuilder.queryset_to_dict(forecasts[canonicalCity]),
+                    tempUnits,
+                    pressureUnits
+                )
+
+        return ResponseBuilder.format_json_response(
+            {'forecasts': response}, 200
+        )
+
+    def requested_cities(self):
+        """Returns the cities requested, without duplicates, in the order
+        requested. Raises a ValueError if a POST body is invalid.
+        """
+        if self.request.method == 'POST':
+            body = json.loads(self.request.body or b'{}')
+            cities = body.get('cities') if isinstance(body, dict) else None
+            if not isinstance(cities, list) or \
+                    not all(isinstance(city, str) for city in cities):
+                raise ValueError(body)
+        else:
+            cities = self.request.GET.get('cities', '').split(',')
+
+        return list(dict.fromkeys(
+            city.strip() for city in cities if city.strip()
+        ))
+
+    @staticmethod
+    def nearest_forecasts(cities, forecastDate):
+        """Returns a dictionary of city to the forecast row nearest to
+        forecastDate for each of cities, the set of cities pending and a
+        dictionary of city to the UpstreamError raised fetching its
+        forecasts. The rows are read from the cache or with a single query
+        for all the cities. The forecasts for the first
+        config.BATCH_MAX_FETCHES cities without any are fetched from the API
+        concurrently. The forecasts for the other cities without any are
+        fetched in the background (see ResponseBuilder.revalidate) and the
+        cities are pending, unless the API is failing (the circuit is open).
+        """
+        forecastFor = corefunctions.datetime_to_epoch(forecastDate)
+        minTime = forecastFor - config.API_TIME_INTERVAL_MINS * 60
+        maxTime = forecastFor + config.API_TIME_INTERVAL_MINS * 60
+
+        def window_rows(cities):
+            rowsByCity = {}
+            for city, slotRows in ResponseBuilder.slot_rows(
+                cities, forecastDate
+            ).items():
+                rows = [row for row in slotRows
+                        if minTime <= row['forecast_for'] <= maxTime]
+                if rows:
+                    rowsByCity[city] = rows
+
+            return rowsByCity
+
+        rowsByCity = window_rows(list(cities))
+
+        missing = [city for city in cities if city not in rowsByCity]
+        fetchNow = missing[:config.BATCH_MAX_FETCHES]
+        errors = {}
+        pending = set()
+
+        if fetchNow:
+            errors = BatchBuilder.refresh_cities(
+                fetchNow,
+                lambda city: window_rows([city]).get(city)
+            )
+            rowsByCity.update(window_rows(fetchNow))
+
+        for city in missing[config.BATCH_MAX_FETCHES:]:
+            if ResponseBuilder.revalidate(
+                city,
+                lambda city=city: window_rows([city]).get(city)
+            ) or ResponseBuilder.refreshing(city):
+                pending.add(city)
+            else:
+                # The API is failing, so retrying shortly will not help.
+                errors[city] = CircuitOpenError(
+                    city, upstream_client.breaker.retry_after()
+                )
+
+        return {
+            city: ResponseBuilder.queryset_filter(
+                rows, forecastFor, 'forecast_for'
+            )
+            for city, rows in rowsByCity.items()
+        }, pending, errors
+
+    @staticmethod
+    def refresh_cities(cities, hasData):
+        """Fetches the forecasts for cities from the API, up to
+        config.BATCH_FETCH_WORKERS cities at a time. hasData(city) returns a
+        truthy value if the forecasts for the city no longer need fetching.
+        A city which fails is logged and skipped. Returns a dictionary of
+        city to the UpstreamError raised for each city which the API failed
+        to return.
+        """
+        errors = {}
+
+        def refresh(city, closeConnection=False):
+            try:
+                ResponseBuilder.refresh_forecasts(city, lambda: hasData(city))
+            except UpstreamError as error:
+                logger.warning('Failed to fetch forecasts for %s: %s', city,
+                               error)
+                errors[city] = error
+            except Exception:
+                logger.exception('Failed to fetch forecasts for %s', city)
+            finally:
+                # Each worker thread opens its own database connection.
+                if closeConnection:
+                    connections.close_all()
+
+        workers = min(config.BATCH_FETCH_WORKERS, len(cities))
+        if workers <= 1:
+            for city in cities:
+                refresh(city)
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                list(executor.map(
+                    lambda city: refresh(city, closeConnection=True),
+                    cities
+                ))
+
+        return errors
+
+    @staticmethod
+    def error_response(message, errorCode, status=400):
+        """Returns a JSON error response."""
+        return ResponseBuilder.format_json_response(
+            {'error': message, 'error_code': errorCode},
+            status
+        )
+
+    def get_response(self):
+        """Gets the HTTP response"""
+        return self._response
@@ -0,0 +1,99 @@
+"""Removes forecasts which are no longer needed from the database so that the
+Forecast table does not grow without bound:
+    * forecasts for times more than config.RETENTION_HOURS in the past,
+      including the dummy forecasts (forecast_for=-99) created by migration
+      0004.
+There is at most one forecast for each city and time (see the unique
+constraint on models.Forecast), so there are no duplicates to remove.
+Used by the compact_forecasts management command and, when
+config.AUTO_COMPACT_INTERVAL_MINS is set, run automatically in the background
+after new forecasts are fetched from the API.
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime, timedelta
+import logging
+import threading
+
+# Third Party Imports
+from django.core.cache import caches
+from django.db import connections
+
+# Local Imports
+from . import config
+import corefunctions
+from .models import Forecast
+
+logger = logging.getLogger(__name__)
+
+
+def retention_threshold(now, horizonHours):
+    """Returns the earliest forecast_for value kept when compacting at now (a
+    datetime object).
+    """
+    return corefunctions.datetime_to_epoch(
+        now - timedelta(hours=horizonHours)
+    )
+
+
+def purge_expired(threshold, chunkSize):
+    """Deletes the forecasts for times before threshold. Returns the number
+    of forecasts deleted.
+    """
+    return Forecast.objects.filter(
+        forecast_for__lt=threshold
+    ).delete_in_chunks(chunkSize)
+
+
+def compact(
+    horizonHours=config.RETENTION_HOURS,
+    chunkSize=config.COMPACTION_CHUNK_SIZE,
+    now=None
+):
+    """Deletes the expired forecasts. Returns a dictionary of the number of
+    forecasts deleted.
+    """
+    threshold = retention_threshold(now or datetime.now(), horizonHours)
+
+    expired = purge_expired(threshold, chunkSize)
+
+    logger.info('Compacted forecasts: %d expired deleted', expired)
+
+    return {'expired': expired}
+
+
+def _compact_in_background():
+    """Compacts the forecasts, closing the thread's database connection
+    afterwards.
+    """
+    try:
+        compact()
+    except Exception:
+        logger.exception('Automatic compaction failed')
+    finally:
+        connections.close_all()
+
+
+def maybe_compact():
+    """Starts a compaction in a background thread if no worker has started
+    one in the last config.AUTO_COMPACT_INTERVAL_MINS minutes. Returns True
+    if a compaction was started.
+    """
+    interval = config.AUTO_COMPACT_INTERVAL_MINS
+    if interval <= 0:
+        return False
+
+    # add() only succeeds for one worker per interval when the cache is
+    # shared between the workers.
+    cache = caches[config.FORECAST_CACHE_ALIAS]
+    if not cache.add('compaction:last', datetime.now(), interval * 60):
+        return False
+
+    threading.Thread(
+        target=_compact_in_background,
+        name='compact-forecasts',
+        daemon=True
+    ).start()
+
+    return True
@@ -18,10 +18,174 @@ from datetime import datetime
 # Local Imports
 
 # Open Weather Map URL
-API_BASE_URL = f"http://api.openweathermap.org/data/2.5/forecast?appid={os.getenv('OWM_API')}&q="
+API_URL = 'http://api.openweathermap.org/data/2.5/forecast'
+API_KEY = os.getenv('OWM_API')
+API_BASE_URL = f"{API_URL}?appid={API_KEY}&q="
+
+# Seconds to wait for the API to accept a connection and to respond.
+API_TIMEOUT_SECS = 10
+
+# Number of times a failed API call is retried and the backoff factor
+# (seconds) between retries.
+API_RETRIES = 2
+API_BACKOFF_SECS = 0.5
+
+# Maximum number of connections to the API kept open by each worker.
+API_POOL_SIZE = 10
+
+# API quota (see quota.py)
+# Calls to the API allowed per minute across all the workers using the API
+# key. Set to 0 to not meter the calls.
+QUOTA_CALLS_PER_MIN = 60
+
+# Fraction of the calls per minute reserved for user requests. Background
+# calls (prefetching, refreshing stale forecasts) wait while no more than this
+# is left.
+QUOTA_USER_RESERVE = 0.2
+
+# Maximum number of seconds a user request and a background call wait for the
+# quota before failing.
+QUOTA_USER_MAX_WAIT_SECS = 2
+QUOTA_BACKGROUND_MAX_WAIT_SECS = 60
+
+# Number of API calls in a row which must fail before a worker stops calling
+# the API (the circuit opens) and fails requests fast. Set to 0 to always
+# call the API.
+UPSTREAM_FAILURE_THRESHOLD = 5
+
+# Number of seconds the API is not called for once the circuit opens, after
+# which a single call is made to test whether the API has recovered.
+UPSTREAM_OPEN_SECS = 30
+
+# Number of seconds a city which the API does not know (responds with a 404)
+# is remembered for, so that the API is not asked for it again.
+UPSTREAM_NOT_FOUND_SECS = 3600
+
+# Maximum number of minutes between the time requested and an older forecast
+# served when the API cannot be reached (see also STALE_MAX_MINS).
+OUTAGE_STALE_MAX_MINS = 1440
 
 # Maximum number of days into the future a forecast can be retrieved.
 MAX_FORCAST_DAYS = 5
 
 # The time interval between any two sets of datapoints.
 API_TIME_INTERVAL_MINS = 180
+
+# Maximum number of minutes between the time requested and an older forecast
+# which is served (marked as stale) while the city's forecasts are fetched
+# from the API in the background. Set to 0 to always wait for the API.
+STALE_MAX_MINS = 360
+
+# Maximum number of cities served stale which are refreshed in the background
+# at the same time (each refresh holds a database connection).
+REVALIDATE_WORKERS = 2
+
+# Maximum number of (city, time slot) entries held by the in-process forecast
+# cache. Setting this to 0 disables the cache.
+FORECAST_CACHE_MAX_ENTRIES = 4096
+
+# Maximum number of seconds an entry is kept in the in-process forecast cache.
+# Refreshing a city only clears the cache of the worker which refreshed it
+# (and the shared cache), so other workers serve the old rows for up to this
+# long. Set to 0 to keep entries until the next API interval boundary.
+FORECAST_CACHE_TTL_SECS = 60
+
+# The cache in settings.CACHES shared between all the workers which holds the
+# forecast rows for each city and time slot.
+FORECAST_CACHE_ALIAS = 'forecast'
+
+# Number of seconds after which a lock held by a worker fetching forecasts for
+# a city is treated as abandoned and can be taken by another worker.
+REFRESH_LOCK_TIMEOUT_SECS = 30
+
+# Number of seconds between attempts to acquire a lock held by another worker.
+REFRESH_LOCK_POLL_SECS = 0.1
+
+# Number of hours over which the requests for each city are counted. The
+# counts are used to rank the cities when prefetching the most requested
+# cities.
+REQUEST_COUNT_WINDOW_HOURS = 24
+
+# Prefetching (manage.py prefetch_forecasts)
+# Number of minutes before the end of a time slot at which the forecasts for
+# the next time slot are prefetched.
+PREFETCH_LEAD_MINS = 15
+
+# Maximum number of cities fetched from the API at the same time.
+PREFETCH_MAX_WORKERS = 4
+
+# Maximum number of API calls made per minute while prefetching.
+PREFETCH_CALLS_PER_MIN = 50
+
+# Maximum random delay (seconds) added before each API call to avoid sending
+# calls in lockstep.
+PREFETCH_JITTER_SECS = 1.0
+
+# Asynchronous views
+# Route /forecast/<city> to the asynchronous view (for ASGI servers).
+ASYNC_VIEWS = os.getenv('FORECAST_ASYNC_VIEWS') == '1'
+
+# Maximum number of threads used by the asynchronous views to access the
+# database (each thread holds its own database connection).
+ASYNC_DB_THREADS = 16
+
+# Compaction (manage.py compact_forecasts)
+# Forecasts for times more than this number of hours in the past are deleted.
+# Requests can ask for forecasts from the start of the current day.
+RETENTION_HOURS = 48
+
+# Number of rows deleted in each transaction.
+COMPACTION_CHUNK_SIZE = 5000
+
+# Minutes between compactions run automatically after new forecasts are
+# fetched from the API. Set to 0 to only compact with the management command.
+AUTO_COMPACT_INTERVAL_MINS = 0
+
+# Series (/forecast/<city>/series)
+# Maximum number of forecasts returned by a series request when resampling
+# with the "step" parameter.
+SERIES_MAX_POINTS = 1000
+
+# Batch (/forecast/batch)
+# Maximum number of cities in a batch request.
+BATCH_MAX_CITIES = 500
+
+# Maximum number of cities without forecasts fetched from the API at the same
+# time during a batch request.
+BATCH_FETCH_WORKERS = 8
+
+# Maximum number of cities without forecasts fetched from the API during a
+# batch request. The forecasts for any other cities are fetched in the
+# background and the cities are returned as pending.
+BATCH_MAX_FETCHES = 16
+
+# Export (/forecast/export and manage.py export_forecasts)
+# Number of rows fetched from the database at a time.
+EXPORT_CHUNK_SIZE = 2000
+
+# Import (manage.py import_forecasts)
+# Number of forecasts written in each transaction.
+IMPORT_CHUNK_SIZE = 5000
+
+# Maximum number of characters in a record of a JSON array. A longer record
+# (e.g: one which is never closed) stops the import, so that a corrupt file
+# is not read into memory.
+IMPORT_MAX_RECORD_CHARS = 1048576
+
+# Metrics (/metrics)
+# Directory in which each worker process writes its metrics so that they can
+# be added up across the processes. If not set, each process reports its own
+# metrics.
+METRICS_DIR = os.getenv('FORECAST_METRICS_DIR') or None
+
+# Debugging (see profiling.py)
+# Add a Server-Timing header with the time spent in each stage to the
+# responses of the forecast views.
+SERVER_TIMING = True
+
+# Directory in which the profiles requested by staff users are stored. If not
+# set, the system's temporary directory is used.
+PROFILE_DIR = os.getenv('FORECAST_PROFILE_DIR') or None
+
+# Number of functions listed in a profile returned as text.
+PROFILE_TOP_FUNCTIONS = 40
@@ -0,0 +1,132 @@
+"""Exports the Forecast table as NDJSON, CSV or Parquet.
+Rows are read with a server-side cursor where the database supports one
+(QuerySet.iterator) and written as they are read, so memory use does not
+grow with the size of the table.
+Used by the export view (/forecast/export) and the export_forecasts
+management command.
+"""
+
+# IMPORTS
+# Python Core Imports
+import csv
+import json
+
+# Third Party Imports
+# pyarrow is optional and only needed to export Parquet files.
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Local Imports
+from . import config
+from .models import Forecast
+
+# Columns exported for each forecast, "city" is the name of the city and
+# "forecast_for" is an epoch.
+EXPORT_FIELDS = ('city', 'forecast_for', 'humidity', 'pressure',
+                 'temperature', 'clouds')
+
+# Formats which can be streamed (the Parquet footer is written last).
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_rows(
+    cities=None,
+    fromEpoch=None,
+    toEpoch=None,
+    chunkSize=config.EXPORT_CHUNK_SIZE
+):
+    """Yields the forecasts as tuples of EXPORT_FIELDS ordered by city and
+    time, optionally only for cities and the forecasts between fromEpoch and
+    toEpoch. chunkSize rows are fetched from the database at a time.
+    """
+    querySet = Forecast.objects.all()
+    if cities:
+        querySet = querySet.filter(city__in=cities)
+    if fromEpoch is not None:
+        querySet = querySet.filter(forecast_for__gte=fromEpoch)
+    if toEpoch is not None:
+        querySet = querySet.filter(forecast_for__lte=toEpoch)
+
+    return querySet.order_by('city', 'forecast_for').values_list(
+        *EXPORT_FIELDS
+    ).iterator(chunk_size=chunkSize)
+
+
+def ndjson_lines(rows):
+    """Yields each row as a line of JSON."""
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+
+class _Echo:
+    """File-like object which returns what is written to it, so that
+    csv.writer can format one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Yields a header line followed by each row as a line of CSV."""
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_lines(rows, exportFormat):
+    """Yields the rows as lines of exportFormat (one of STREAM_FORMATS)."""
+    if exportFormat == 'ndjson':
+        return ndjson_lines(rows)
+    elif exportFormat == 'csv':
+        return csv_lines(rows)
+
+    raise ValueError(f'{exportFormat} exports cannot be streamed')
+
+
+def write_parquet(rows, path, chunkSize=config.EXPORT_CHUNK_SIZE):
+    """Writes the rows to a Parquet file at path, one row group of chunkSize
+    rows at a time. Returns the number of rows written. Raises a
+    RuntimeError if pyarrow is not installed.
+    """
+    if pyarrow is None:
+        raise RuntimeError('pyarrow must be installed to export Parquet')
+
+    schema = pyarrow.schema([
+        ('city', pyarrow.string()),
+        ('forecast_for', pyarrow.int64()),
+        ('humidity', pyarrow.float64()),
+        ('pressure', pyarrow.float64()),
+        ('temperature', pyarrow.float64()),
+        ('clouds', pyarrow.float64()),
+    ])
+
+    def write_chunk(writer, chunk):
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column) for column in zip(*chunk)],
+            schema=schema
+        ))
+
+    written = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunkSize:
+                write_chunk(writer, chunk)
+                written += len(chunk)
+                chunk = []
+
+        if chunk:
+            write_chunk(writer, chunk)
+            written += len(chunk)
+
+    return written
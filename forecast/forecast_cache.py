@@ -0,0 +1,151 @@
+"""An in-process cache of the forecast rows for a city.
+The forecast data for a city only changes every config.API_TIME_INTERVAL_MINS
+and so the rows retrieved from the database are cached against the city and
+the time slot (a block of config.API_TIME_INTERVAL_MINS) they were requested
+for. Repeated requests for the same city and time slot will then not need to
+query the database.
+
+Entries are evicted when the cache is full (least recently used first) and
+expire once the next API interval boundary has passed, or after
+config.FORECAST_CACHE_TTL_SECS if sooner. Each worker process has its own
+cache which other workers cannot invalidate, so the TTL bounds how long a
+worker serves rows which another worker has refreshed.
+"""
+
+# IMPORTS
+# Python Core Imports
+from collections import OrderedDict
+import threading
+import time
+
+# Third Party Imports
+
+# Local Imports
+from . import config
+
+
+def interval_seconds():
+    """Returns the time between any two sets of API datapoints in seconds."""
+    return config.API_TIME_INTERVAL_MINS * 60
+
+
+def time_slot(forecastDate):
+    """Returns the index of the time slot containing forecastDate where
+    forecastDate is a datetime object. A time slot is a block of time of
+    config.API_TIME_INTERVAL_MINS minutes.
+    """
+    return int(forecastDate.timestamp()) // interval_seconds()
+
+
+def next_slot_boundary(now):
+    """Returns the epoch time of the start of the time slot after now where
+    now is an epoch time.
+    """
+    interval = interval_seconds()
+    return (int(now) // interval + 1) * interval
+
+
+class ForecastCache:
+    """A thread safe LRU cache of forecast rows keyed on (city, time slot)
+    where each entry expires at the next API interval boundary or after
+    ttlSecs, whichever comes first.
+    Arguments:
+        * maxEntries [int]: the maximum number of entries held in the cache.
+        * ttlSecs [int]: (default=config.FORECAST_CACHE_TTL_SECS) maximum
+                         number of seconds an entry is kept. If 0, entries
+                         are kept until the next API interval boundary.
+        * clock [function]: (default=time.time) returns the current epoch
+                            time.
+    """
+
+    def __init__(
+        self,
+        maxEntries,
+        ttlSecs=config.FORECAST_CACHE_TTL_SECS,
+        clock=time.time
+    ):
+        self.maxEntries = maxEntries
+        self.ttlSecs = ttlSecs
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, city, slot):
+        """Returns the cached rows for the city and time slot or None if
+        there are no rows cached or the entry has expired.
+        """
+        key = (city, slot)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expiresAt, rows = entry
+            if self.clock() >= expiresAt:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def set(self, city, slot, rows):
+        """Caches rows for the city and time slot until the next API interval
+        boundary or for ttlSecs, whichever is sooner.
+        """
+        if self.maxEntries <= 0:
+            return
+
+        key = (city, slot)
+        now = self.clock()
+        expiresAt = next_slot_boundary(now)
+        if self.ttlSecs:
+            expiresAt = min(expiresAt, now + self.ttlSecs)
+
+        with self._lock:
+            self._entries[key] = (expiresAt, rows)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, city):
+        """Removes all the cached entries for a city."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == city]:
+                del self._entries[key]
+
+    def clear(self):
+        """Removes all the entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and the size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+forecast_cache = ForecastCache(config.FORECAST_CACHE_MAX_ENTRIES)
@@ -0,0 +1,355 @@
+"""Imports forecasts from archive files, e.g: historical OpenWeatherMap dumps
+or files written by the export_forecasts command.
+Files are read one record at a time and written in chunks, so memory use does
+not grow with the size of the file. The following formats are supported:
+    * ndjson: a JSON object per line.
+    * json: a JSON array of objects, or a single API response (an object
+            with the forecasts in "list").
+    * csv: a header line followed by a line per forecast.
+Each record can either use the columns written by export_forecasts (city,
+forecast_for, humidity, pressure, temperature, clouds) or the fields of the
+OpenWeatherMap API and history dumps (city_name, dt, main.temp,
+main.pressure, main.humidity and clouds.all, or temp, pressure, humidity and
+clouds_all in CSV dumps).
+Used by the import_forecasts management command.
+"""
+
+# IMPORTS
+# Python Core Imports
+import csv
+import json
+import logging
+import math
+import time
+
+# Third Party Imports
+
+# Local Imports
+from . import config
+import corefunctions
+from .models import Forecast
+from .response_builder import ResponseBuilder
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'json', 'csv')
+
+# Largest forecast_for which can be stored (Forecast.forecast_for is a
+# BigIntegerField).
+MAX_EPOCH = 2 ** 63 - 1
+
+# File extensions of each format.
+EXTENSIONS = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'json',
+    '.csv': 'csv',
+}
+
+
+def detect_format(path):
+    """Returns the format of the file at path from its extension. Raises a
+    ValueError if the extension is not recognised.
+    """
+    for extension, fileFormat in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return fileFormat
+
+    raise ValueError(f'Cannot tell the format of {path}, use --format')
+
+
+class InvalidRecord:
+    """Stands for a record which could not be decoded, so that it is skipped
+    (or stops a strict import) like any other invalid record.
+    Arguments:
+        * error [str]: why the record could not be decoded.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def element_end(buffer, pos):
+    """Returns the index just past the JSON array element starting at pos in
+    buffer (the "," or "]" following it), or None if the element continues
+    past the end of the buffer. Only brackets and strings are followed, so
+    the end of an element is found even if the element is not valid JSON.
+    """
+    depth = 0
+    inString = False
+    idx = pos
+
+    while idx < len(buffer):
+        char = buffer[idx]
+        if inString:
+            if char == '\\':
+                idx += 1
+            elif char == '"':
+                inString = False
+        elif char == '"':
+            inString = True
+        elif char in '[{':
+            depth += 1
+        elif depth:
+            if char in ']}':
+                depth -= 1
+        elif char in ',]':
+            return idx
+        idx += 1
+
+    return None
+
+
+def iter_json_array(
+    f,
+    bufferSize=65536,
+    maxRecordSize=config.IMPORT_MAX_RECORD_CHARS
+):
+    """Yields each element of the JSON array in the file f without reading
+    the whole file. If the file contains an object (a single API response)
+    rather than an array, the forecasts in its "list" are yielded with the
+    city's name added.
+    An element which is not valid JSON is yielded as an InvalidRecord. A
+    ValueError is raised if the file is not a JSON array, or if an element is
+    longer than maxRecordSize characters (e.g: it is never closed).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+
+    def next_char():
+        """Skips whitespace and returns the next character, or '' at the end
+        of the file.
+        """
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+
+            buffer = f.read(bufferSize)
+            pos = 0
+            if not buffer:
+                return ''
+
+    char = next_char()
+    if char == '{':
+        # API responses hold at most a few days of forecasts for one city.
+        response = json.loads(buffer[pos:] + f.read())
+        cityName = response.get('city', {}).get('name')
+        for record in response.get('list', []):
+            record.setdefault('city_name', cityName)
+            yield record
+        return
+
+    if char != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+
+    while True:
+        char = next_char()
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+        if not char:
+            raise ValueError('Unexpected end of the JSON array')
+
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as error:
+            end = element_end(buffer, pos)
+            if end is not None:
+                # The whole element is in the buffer, so it is invalid.
+                record = InvalidRecord(f'Invalid JSON: {error}')
+                pos = end
+            else:
+                # The element continues past the end of the buffer.
+                if len(buffer) - pos > maxRecordSize:
+                    raise ValueError(
+                        f'Element longer than {maxRecordSize} characters'
+                    )
+                more = f.read(bufferSize)
+                if not more:
+                    raise ValueError('Unexpected end of the JSON array')
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+        yield record
+
+        # Drop the elements which have been read.
+        if pos > bufferSize:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def read_records(f, fileFormat):
+    """Yields the records (dictionaries) in the file f of fileFormat.
+    Records which cannot be decoded are yielded as InvalidRecords.
+    """
+    if fileFormat == 'ndjson':
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield InvalidRecord(f'Invalid JSON: {error}')
+    elif fileFormat == 'json':
+        yield from iter_json_array(f)
+    elif fileFormat == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        raise ValueError(f'Unknown format {fileFormat}')
+
+
+def parse_record(record, defaultCity=None):
+    """Converts a record to an unsaved Forecast. The city is taken from the
+    record or, if the record does not have one, defaultCity. Raises a
+    ValueError if the record is not a valid forecast.
+    """
+    if isinstance(record, InvalidRecord):
+        raise ValueError(record.error)
+    if not isinstance(record, dict):
+        raise ValueError('Record is not an object')
+
+    try:
+        if 'forecast_for' in record:
+            city = record.get('city') or defaultCity
+            forecastFor = record['forecast_for']
+            humidity = record['humidity']
+            pressure = record['pressure']
+            temperature = record['temperature']
+            clouds = record['clouds']
+        else:
+            city = (record.get('city_name') or record.get('city')
+                    or defaultCity)
+            forecastFor = record['dt']
+            main = record.get('main') or record
+            humidity = main['humidity']
+            pressure = main['pressure']
+            temperature = main['temp']
+            clouds = record.get('clouds_all')
+            if clouds is None:
+                clouds = record['clouds']['all']
+
+        values = [float(value) for value in
+                  (forecastFor, humidity, pressure, temperature, clouds)]
+        if not all(math.isfinite(value) for value in values):
+            raise ValueError('Values must be finite numbers')
+
+        forecast = Forecast(
+            forecast_for=int(values[0]),
+            humidity=values[1],
+            pressure=values[2],
+            temperature=values[3],
+            clouds=values[4]
+        )
+
+    except (KeyError, TypeError, OverflowError) as error:
+        raise ValueError(f'Missing or invalid field {error}') from error
+
+    canonicalCity = corefunctions.city_registry.lookup(city or '')
+    if canonicalCity is None:
+        raise ValueError(f"Cannot find city '{city}'")
+    forecast.city_id = canonicalCity
+
+    if not 0 < forecast.forecast_for <= MAX_EPOCH:
+        raise ValueError(f'Invalid time {forecastFor}')
+    if not 0 <= forecast.humidity <= 100:
+        raise ValueError(f'Invalid humidity {humidity}')
+    if not 0 <= forecast.clouds <= 100:
+        raise ValueError(f'Invalid clouds {clouds}')
+    if forecast.temperature <= 0 or forecast.pressure <= 0:
+        # Temperatures are in kelvins and pressures in hPa.
+        raise ValueError('Invalid temperature or pressure')
+
+    return forecast
+
+
+class Importer:
+    """Writes forecasts read from archive files onto the database.
+    Arguments:
+        * chunkSize [int]: number of forecasts written in each transaction.
+        * useCopy [bool]: (default=True) write with COPY on PostgreSQL.
+        * progress [function]: (default=None) called with the statistics
+                               (see run) after each chunk is written.
+        * clock [function]: (default=time.monotonic)
+    """
+
+    def __init__(
+        self,
+        chunkSize=config.IMPORT_CHUNK_SIZE,
+        useCopy=True,
+        progress=None,
+        clock=time.monotonic
+    ):
+        self.chunkSize = chunkSize
+        self.useCopy = useCopy
+        self.progress = progress
+        self.clock = clock
+
+    def run(self, records, defaultCity=None, strict=False):
+        """Validates and writes the records (dictionaries). Returns a
+        dictionary with the number of forecasts written, the number of
+        invalid records skipped, the number of cities imported and the
+        number of seconds taken. A forecast which appears in several chunks
+        is written (and counted) once per chunk.
+        Invalid records are logged and skipped unless strict is True, in
+        which case a ValueError is raised.
+        """
+        start = self.clock()
+        stats = {'written': 0, 'invalid': 0, 'cities': 0, 'seconds': 0}
+        cities = set()
+
+        # Forecasts keyed on (city, forecast_for) so that a chunk does not
+        # upsert the same forecast twice (the last record wins).
+        chunk = {}
+
+        def write_chunk():
+            forecasts = list(chunk.values())
+            if self.useCopy:
+                Forecast.objects.copy_upsert(forecasts)
+            else:
+                Forecast.objects.upsert(forecasts)
+
+            stats['written'] += len(forecasts)
+            stats['seconds'] = self.clock() - start
+            cities.update(forecast.city_id for forecast in forecasts)
+            stats['cities'] = len(cities)
+            chunk.clear()
+
+            if self.progress is not None:
+                self.progress(stats)
+
+        try:
+            for lineNumber, record in enumerate(records, 1):
+                try:
+                    forecast = parse_record(record, defaultCity)
+                except ValueError as error:
+                    if strict:
+                        raise ValueError(f'Record {lineNumber}: {error}')
+                    logger.warning('Skipping record %d: %s', lineNumber,
+                                   error)
+                    stats['invalid'] += 1
+                    continue
+
+                chunk[(forecast.city_id, forecast.forecast_for)] = forecast
+                if len(chunk) >= self.chunkSize:
+                    write_chunk()
+
+            if chunk:
+                write_chunk()
+
+        finally:
+            # The raw SQL writes do not send signals, so remove the cached
+            # rows of the cities written, including when the import stops
+            # part way through.
+            for city in cities:
+                ResponseBuilder.invalidate_cache(city)
+
+        stats['seconds'] = self.clock() - start
+
+        return stats
@@ -0,0 +1,59 @@
+"""Builds the JSON HTTP responses returned by the service.
+Bodies are serialised with corefunctions.json_dumps (orjson when installed)
+and passed to HttpResponse as bytes. Responses whose body never changes (e.g:
+the generic error responses) are serialised once with PreparedResponse.
+"""
+
+# IMPORTS
+# Python Core Imports
+
+# Third Party Imports
+from django.http import HttpResponse
+
+# Local Imports
+import corefunctions
+from .metrics import stage
+
+CONTENT_TYPE = 'application/json; charset=utf-8'
+
+
+def json_response(data, status=200):
+    """Returns an HttpResponse with data serialised as JSON.
+    Arguments:
+        * data [dict]: response to be converted to JSON.
+        * status [int]: HTTP status code.
+    The "error_code" of an error response is kept as the response's
+    errorCode attribute for the metrics.
+    """
+    with stage('serialization'):
+        body = corefunctions.json_dumps(data)
+
+    response = HttpResponse(body, status=status, content_type=CONTENT_TYPE)
+    response.errorCode = data.get('error_code')
+
+    return response
+
+
+class PreparedResponse:
+    """A JSON response with a constant body, which is serialised once. Call
+    the object to get a new HttpResponse (responses are not shared as
+    headers may be added to them).
+    Arguments:
+        * data [dict]: response to be converted to JSON.
+        * status [int]: (default=200) HTTP status code.
+    """
+
+    def __init__(self, data, status=200):
+        self.body = corefunctions.json_dumps(data)
+        self.status = status
+        self.errorCode = data.get('error_code')
+
+    def __call__(self):
+        response = HttpResponse(
+            self.body,
+            status=self.status,
+            content_type=CONTENT_TYPE
+        )
+        response.errorCode = self.errorCode
+
+        return response
@@ -0,0 +1,39 @@
+"""Deletes expired forecasts from the database, e.g:
+
+    python3 manage.py compact_forecasts --horizon 48
+"""
+
+# IMPORTS
+# Python Core Imports
+import time
+
+# Third Party Imports
+from django.core.management.base import BaseCommand
+
+# Local Imports
+from forecast import config
+from forecast.compaction import compact
+
+
+class Command(BaseCommand):
+    help = 'Deletes forecasts for past times.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon', type=int, default=config.RETENTION_HOURS,
+            help='Delete forecasts for times more than HORIZON hours ago.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=config.COMPACTION_CHUNK_SIZE,
+            help='Number of rows deleted in each transaction.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+
+        results = compact(options['horizon'], options['chunk_size'])
+
+        self.stdout.write(
+            f"Reclaimed {results['expired']} expired rows in "
+            f"{time.monotonic() - start:.1f}s"
+        )
@@ -0,0 +1,104 @@
+"""Exports the stored forecasts as NDJSON, CSV or Parquet, e.g:
+
+    python3 manage.py export_forecasts --format csv --output forecasts.csv
+    python3 manage.py export_forecasts --city london --from 2020-02-15
+
+NDJSON and CSV are written to stdout unless --output is given. Parquet
+requires pyarrow and an --output file.
+"""
+
+# IMPORTS
+# Python Core Imports
+import time
+
+# Third Party Imports
+from django.core.management.base import BaseCommand, CommandError
+
+# Local Imports
+import corefunctions
+from forecast import config, export
+
+
+class Command(BaseCommand):
+    help = 'Exports the stored forecasts as NDJSON, CSV or Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=['ndjson', 'csv', 'parquet'],
+            default='ndjson', help='Export format.'
+        )
+        parser.add_argument(
+            '--output', help='File to write to (default: stdout).'
+        )
+        parser.add_argument(
+            '--city', action='append', default=[],
+            help='City to export, may be repeated (default: all cities).'
+        )
+        parser.add_argument(
+            '--from', dest='from_date',
+            help='ISO 8601 time of the first forecast to export.'
+        )
+        parser.add_argument(
+            '--to', dest='to_date',
+            help='ISO 8601 time of the last forecast to export.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=config.EXPORT_CHUNK_SIZE,
+            help='Number of rows fetched from the database at a time.'
+        )
+
+    def handle(self, *args, **options):
+        cities = []
+        for city in options['city']:
+            canonicalCity = corefunctions.city_registry.lookup(city)
+            if canonicalCity is None:
+                raise CommandError(f"Cannot find city '{city}'")
+            cities.append(canonicalCity)
+
+        try:
+            fromEpoch, toEpoch = (
+                corefunctions.datetime_to_epoch(
+                    corefunctions.parse_date_string(value)
+                ) if value else None
+                for value in (options['from_date'], options['to_date'])
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        rows = export.export_rows(
+            cities, fromEpoch, toEpoch, options['chunk_size']
+        )
+        start = time.monotonic()
+
+        if options['format'] == 'parquet':
+            if not options['output']:
+                raise CommandError('Parquet exports need an --output file')
+            try:
+                written = export.write_parquet(
+                    rows, options['output'], options['chunk_size']
+                )
+            except RuntimeError as error:
+                raise CommandError(error)
+
+        else:
+            if options['output']:
+                output = open(options['output'], 'w', newline='')
+                write = output.write
+            else:
+                output = None
+                write = lambda line: self.stdout.write(line, ending='')
+
+            # The CSV header is not a forecast.
+            written = -1 if options['format'] == 'csv' else 0
+            try:
+                for line in export.stream_lines(rows, options['format']):
+                    write(line)
+                    written += 1
+            finally:
+                if output is not None:
+                    output.close()
+
+        self.stderr.write(
+            f'Exported {written} forecasts in '
+            f'{time.monotonic() - start:.1f}s'
+        )
@@ -0,0 +1,82 @@
+"""Imports forecasts from NDJSON, JSON or CSV archives, e.g:
+
+    python3 manage.py import_forecasts history.ndjson
+    python3 manage.py import_forecasts london.json --city london
+
+See forecast/importer.py for the supported formats. Forecasts already
+stored for the same city and time are updated.
+"""
+
+# IMPORTS
+# Python Core Imports
+
+# Third Party Imports
+from django.core.management.base import BaseCommand, CommandError
+
+# Local Imports
+from forecast import config, importer
+
+
+class Command(BaseCommand):
+    help = 'Imports forecasts from NDJSON, JSON or CSV archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Files to import.')
+        parser.add_argument(
+            '--format', choices=importer.FORMATS,
+            help='Format of the files (default: from the file extension).'
+        )
+        parser.add_argument(
+            '--city',
+            help='City of the records which do not name a city.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=config.IMPORT_CHUNK_SIZE,
+            help='Number of forecasts written in each transaction.'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Use INSERT rather than COPY on PostgreSQL.'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Stop at the first invalid record rather than skipping it.'
+        )
+
+    def handle(self, *args, **options):
+        forecastImporter = importer.Importer(
+            chunkSize=options['chunk_size'],
+            useCopy=not options['no_copy'],
+            progress=self.show_progress
+        )
+
+        for path in options['files']:
+            try:
+                fileFormat = options['format'] or importer.detect_format(path)
+
+                with open(path, newline='') as f:
+                    stats = forecastImporter.run(
+                        importer.read_records(f, fileFormat),
+                        options['city'],
+                        options['strict']
+                    )
+            except (OSError, ValueError) as error:
+                raise CommandError(f'{path}: {error}')
+            finally:
+                # End the progress line.
+                self.stderr.write('')
+
+            self.stdout.write(
+                f"{path}: wrote {stats['written']} forecasts for "
+                f"{stats['cities']} cities ({stats['invalid']} invalid) in "
+                f"{stats['seconds']:.1f}s"
+            )
+
+    def show_progress(self, stats):
+        """Writes the number of forecasts written so far and the rate."""
+        rate = stats['written'] / stats['seconds'] if stats['seconds'] else 0
+        self.stderr.write(
+            f"\rWrote {stats['written']} forecasts "
+            f"({rate:.0f}/s, {stats['invalid']} invalid)",
+            ending=''
+        )
@@ -0,0 +1,114 @@
+"""Prefetches the forecasts for cities from the API ahead of the next time
+slot. Run once, e.g: from cron shortly before each time slot boundary,
+
+    python3 manage.py prefetch_forecasts --top 200
+
+or as a long running worker which wakes config.PREFETCH_LEAD_MINS before
+each time slot boundary,
+
+    python3 manage.py prefetch_forecasts --loop
+"""
+
+# IMPORTS
+# Python Core Imports
+import time
+
+# Third Party Imports
+from django.core.management.base import BaseCommand
+
+# Local Imports
+import corefunctions
+from forecast import config
+from forecast.prefetch import Prefetcher, seconds_until_prefetch
+from forecast.shared_cache import city_request_counts
+
+
+class Command(BaseCommand):
+    help = 'Fetches the forecasts for cities from the API ahead of the ' \
+        'next time slot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cities', nargs='*',
+            help='Cities to prefetch. Defaults to all the cities.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=0,
+            help='Only prefetch the TOP most requested cities.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=config.PREFETCH_MAX_WORKERS,
+            help='Maximum number of cities fetched at the same time.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=config.PREFETCH_CALLS_PER_MIN,
+            help='Maximum number of API calls per minute (0 for no limit).'
+        )
+        parser.add_argument(
+            '--jitter', type=float, default=config.PREFETCH_JITTER_SECS,
+            help='Maximum random delay in seconds before each API call.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running, prefetching before each time slot boundary.'
+        )
+        parser.add_argument(
+            '--lead', type=int, default=config.PREFETCH_LEAD_MINS,
+            help='Minutes before each time slot boundary to prefetch at '
+                 '(with --loop).'
+        )
+
+    def handle(self, *args, **options):
+        prefetcher = Prefetcher(
+            maxWorkers=options['workers'],
+            callsPerMin=options['rate'],
+            jitterSecs=options['jitter'],
+        )
+
+        while True:
+            self.prefetch(prefetcher, options)
+
+            if not options['loop']:
+                break
+
+            time.sleep(seconds_until_prefetch(time.time(), options['lead']))
+
+    def prefetch(self, prefetcher, options):
+        """Prefetches the forecasts for the selected cities."""
+        cities = self.select_cities(options['cities'], options['top'])
+        start = time.monotonic()
+
+        results = prefetcher.run(cities)
+
+        self.stdout.write(
+            f"Prefetched {results['refreshed']} cities "
+            f"({results['failed']} failed, {results['rows']} rows) in "
+            f"{time.monotonic() - start:.1f}s"
+        )
+
+    def select_cities(self, cities, top):
+        """Returns the cities to prefetch, the most requested first when top
+        is set.
+        """
+        if cities:
+            selected = []
+            for city in cities:
+                canonicalCity = corefunctions.city_registry.lookup(city)
+                if canonicalCity is None:
+                    self.stderr.write(f"Cannot find city '{city}'")
+                else:
+                    selected.append(canonicalCity)
+        else:
+            selected = sorted(corefunctions.city_registry)
+
+        if top:
+            if city_request_counts.shared:
+                selected = city_request_counts.most_requested(selected, top)
+            else:
+                # The requests made to the workers were not counted.
+                self.stderr.write(self.style.WARNING(
+                    '--top needs a cache shared with the workers '
+                    '(FORECAST_CACHE_BACKEND), prefetching all the cities'
+                ))
+
+        return selected
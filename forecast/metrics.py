@@ -0,0 +1,520 @@
+"""Collects metrics about the service and renders them in the Prometheus text
+format for the /metrics view.
+    * Counter: a count which only goes up, e.g: requests by status.
+    * Histogram: counts observations (e.g: seconds taken) in buckets.
+    * stage: times a stage of building a response, for the stage histogram
+      and the Server-Timing header of the request (see request_timings).
+    * MetricsMiddleware: counts the requests and times each view.
+
+Values are kept in memory unless config.METRICS_DIR is set, in which case
+each process writes its values to a memory mapped file in that directory and
+/metrics adds up the files of every process. Use a directory when running
+several worker processes (e.g: gunicorn) and empty it before the service
+starts.
+"""
+
+# IMPORTS
+# Python Core Imports
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Third Party Imports
+from django.urls import resolve, Resolver404
+
+# Local Imports
+from . import config
+
+# Upper bounds (seconds) of the buckets of the latency histograms.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10)
+
+
+class DictValues:
+    """Values held in memory by a single process. Thread safe."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        """Adds amount to the value of key."""
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        """Returns a list of (key, value)."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class MmapValues:
+    """Values written by a single process to a memory mapped file, so that
+    other processes can read them (see read_mmap_file). Thread safe.
+    The file starts with the number of bytes used (8 bytes), followed by an
+    entry for each key: the length of the key (4 bytes), the key (UTF-8,
+    padded to a multiple of 8 bytes with the length) and the value (a
+    double). Entries are only ever added, so readers never see a key move.
+    """
+
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.truncate(self.INITIAL_SIZE)
+            size = self.INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        used = struct.unpack_from('Q', self._map, 0)[0]
+        if used == 0:
+            struct.pack_into('Q', self._map, 0, 8)
+        for key, _, position in _entries(self._map):
+            self._positions[key] = position
+
+    def _add(self, key):
+        """Adds an entry for key, returning the position of its value."""
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (-(len(encoded) + 4) % 8)
+        entry = struct.pack(f'I{len(padded)}sd', len(encoded), padded, 0.0)
+
+        used = struct.unpack_from('Q', self._map, 0)[0]
+        if used + len(entry) > len(self._map):
+            size = len(self._map)
+            while used + len(entry) > size:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+
+        self._map[used:used + len(entry)] = entry
+        # Publish the entry after it has been written.
+        struct.pack_into('Q', self._map, 0, used + len(entry))
+
+        position = used + len(entry) - 8
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        """Adds amount to the value of key."""
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            value = struct.unpack_from('d', self._map, position)[0]
+            struct.pack_into('d', self._map, position, value + amount)
+
+    def items(self):
+        """Returns a list of (key, value)."""
+        with self._lock:
+            return [(key, value) for key, value, _ in _entries(self._map)]
+
+
+def _entries(data):
+    """Yields (key, value, position of the value) for each entry in the
+    bytes of a file written by MmapValues.
+    """
+    used = struct.unpack_from('Q', data, 0)[0]
+    position = 8
+    while position < used:
+        length = struct.unpack_from('I', data, position)[0]
+        start = position + 4
+        key = bytes(data[start:start + length]).decode('utf-8')
+        position = start + length + (-(length + 4) % 8)
+        yield key, struct.unpack_from('d', data, position)[0], position
+        position += 8
+
+
+def read_mmap_file(path):
+    """Returns a list of (key, value) in a file written by MmapValues."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return []
+    return [(key, value) for key, value, _ in _entries(data)]
+
+
+class Registry:
+    """Holds the metrics and the values of this process.
+    Arguments:
+        * directory [str]: (default=config.METRICS_DIR, read on first use)
+                           directory shared by the processes or None to keep
+                           the values in memory.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = {}
+        self._keys = {}
+        self._values = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Adds metric to the registry and returns it."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    @property
+    def values(self):
+        """The values of this process. Reopened after a fork, so that each
+        worker process writes its own file.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    directory = self.directory or config.METRICS_DIR
+                    if directory:
+                        self._values = MmapValues(os.path.join(
+                            directory, f'metrics_{os.getpid()}.db'
+                        ))
+                    else:
+                        self._values = DictValues()
+                    self._pid = os.getpid()
+        return self._values
+
+    def inc(self, name, labels, amount=1):
+        """Adds amount to the sample name with labels (a tuple of (label,
+        value) pairs).
+        """
+        key = self._keys.get((name, labels))
+        if key is None:
+            key = self._keys[(name, labels)] = json.dumps([name, labels])
+        self.values.inc(key, amount)
+
+    def collect(self):
+        """Returns a dictionary of (sample name, labels) to the value added
+        up across all the processes.
+        """
+        directory = self.directory or config.METRICS_DIR
+        if directory:
+            # Make sure this process's file exists.
+            self.values
+            items = [
+                item
+                for path in sorted(glob.glob(
+                    os.path.join(directory, 'metrics_*.db')
+                ))
+                for item in read_mmap_file(path)
+            ]
+        else:
+            items = self.values.items()
+
+        totals = {}
+        for key, value in items:
+            name, labels = json.loads(key)
+            sample = (name, tuple(tuple(label) for label in labels))
+            totals[sample] = totals.get(sample, 0.0) + value
+
+        return totals
+
+    def render(self, totals=None, extra=()):
+        """Returns all the metrics in the Prometheus text format, followed by
+        the lines in extra. totals (default: collected now) are the values
+        as returned by collect.
+        """
+        if totals is None:
+            totals = self.collect()
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples(totals))
+        lines.extend(extra)
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def format_sample(name, labels, value):
+    """Returns a line of the Prometheus text format."""
+    if labels:
+        name += '{' + ','.join(
+            '{}="{}"'.format(
+                label,
+                str(labelValue).replace('\\', '\\\\').replace('"', '\\"')
+            )
+            for label, labelValue in labels
+        ) + '}'
+
+    if value == int(value):
+        value = int(value)
+
+    return f'{name} {value}'
+
+
+class Counter:
+    """A count which only goes up.
+    Arguments:
+        * name [str]: name of the metric.
+        * description [str]: description of the metric (its HELP).
+        * labelNames [tuple]: names of the labels given to inc.
+        * registry [Registry]: (default=registry)
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, description, labelNames=(), registry=registry):
+        self.name = name
+        self.help = description
+        self.labelNames = labelNames
+        self.registry = registry
+        registry.register(self)
+
+    def labels(self, labels):
+        """Returns the labels (a dictionary) as (name, value) pairs in the
+        order of labelNames.
+        """
+        return tuple((name, str(labels[name])) for name in self.labelNames)
+
+    def inc(self, amount=1, **labels):
+        """Adds amount to the count with labels."""
+        self.registry.inc(self.name, self.labels(labels), amount)
+
+    def samples(self, totals):
+        """Yields the lines of the metric."""
+        for (name, labels), value in sorted(totals.items()):
+            if name == self.name:
+                yield format_sample(name, labels, value)
+
+
+class Histogram(Counter):
+    """Counts observations in buckets, along with their count and sum.
+    Arguments:
+        * buckets [tuple]: (default=LATENCY_BUCKETS) upper bounds of the
+                           buckets, in increasing order.
+        * see Counter for the other arguments.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, description, labelNames=(),
+                 buckets=LATENCY_BUCKETS, registry=registry):
+        super().__init__(name, description, labelNames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Adds an observation of value with labels."""
+        labels = self.labels(labels)
+        idx = bisect_left(self.buckets, value)
+        bound = self.buckets[idx] if idx < len(self.buckets) else '+Inf'
+
+        # Each bucket holds the observations which are not in a lower
+        # bucket, the cumulative counts are calculated when rendering.
+        self.registry.inc(self.name + '_bucket',
+                          labels + (('le', str(bound)),))
+        self.registry.inc(self.name + '_count', labels)
+        self.registry.inc(self.name + '_sum', labels, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the number of seconds taken by the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, totals):
+        """Yields the lines of the metric."""
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        seriesLabels = sorted({
+            labels for (name, labels) in totals
+            if name == self.name + '_count'
+        })
+
+        for labels in seriesLabels:
+            cumulative = 0
+            for bound in bounds:
+                cumulative += totals.get(
+                    (self.name + '_bucket', labels + (('le', bound),)), 0
+                )
+                yield format_sample(
+                    self.name + '_bucket', labels + (('le', bound),),
+                    cumulative
+                )
+            yield format_sample(self.name + '_count', labels,
+                                totals[(self.name + '_count', labels)])
+            yield format_sample(self.name + '_sum', labels,
+                                totals.get((self.name + '_sum', labels), 0))
+
+
+REQUESTS = Counter(
+    'forecast_requests_total',
+    'HTTP requests by view, status code and error code.',
+    ('view', 'status', 'error_code')
+)
+REQUEST_SECONDS = Histogram(
+    'forecast_request_seconds',
+    'Seconds taken to respond to HTTP requests by view.',
+    ('view',)
+)
+STAGE_SECONDS = Histogram(
+    'forecast_stage_seconds',
+    'Seconds spent in each stage of building a forecast response.',
+    ('stage',)
+)
+CACHE_LOOKUPS = Counter(
+    'forecast_cache_lookups_total',
+    'Forecast cache lookups by cache (local or shared) and result.',
+    ('cache', 'result')
+)
+UPSTREAM_CALLS = Counter(
+    'forecast_upstream_calls_total',
+    'Calls to the forecast API by result.',
+    ('result',)
+)
+QUOTA_TOKENS = Counter(
+    'forecast_quota_tokens_total',
+    'API quota tokens granted, waited for and denied by priority.',
+    ('priority', 'outcome')
+)
+
+
+# The seconds spent in each stage of the request being handled (see
+# request_timings), or None.
+_timings = ContextVar('forecast_timings', default=None)
+
+
+@contextmanager
+def request_timings():
+    """Collects the seconds spent in each stage (see stage) within the with
+    block. Yields a dictionary of stage to seconds which is filled in as the
+    stages run.
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Times the with block as the stage name of building a response. The
+    time is observed by STAGE_SECONDS and added to the timings of the
+    request, if they are being collected.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + seconds
+
+
+def cache_hit_ratios(totals):
+    """Returns lines for the hit ratio of each cache, calculated from the
+    lookups in totals (see Registry.collect).
+    """
+    lookups = {}
+    for (name, labels), value in totals.items():
+        if name == CACHE_LOOKUPS.name:
+            labels = dict(labels)
+            counts = lookups.setdefault(labels['cache'], {})
+            counts[labels['result']] = counts.get(labels['result'], 0) + value
+
+    lines = [
+        '# HELP forecast_cache_hit_ratio Hits as a fraction of lookups.',
+        '# TYPE forecast_cache_hit_ratio gauge',
+    ]
+    for cache, counts in sorted(lookups.items()):
+        total = sum(counts.values())
+        lines.append(format_sample(
+            'forecast_cache_hit_ratio', (('cache', cache),),
+            round(counts.get('hit', 0) / total, 6) if total else 0
+        ))
+
+    return lines
+
+
+def gauge(name, description, value):
+    """Returns the lines for a gauge (a value which can go up and down)
+    measured when rendering.
+    """
+    return [
+        f'# HELP {name} {description}',
+        f'# TYPE {name} gauge',
+        format_sample(name, (), value),
+    ]
+
+
+def exposition(extra=()):
+    """Returns the metrics of every process in the Prometheus text format,
+    with the hit ratio of each cache and the lines in extra.
+    """
+    totals = registry.collect()
+
+    return registry.render(totals, cache_hit_ratios(totals) + list(extra))
+
+
+class MetricsMiddleware:
+    """Counts each request by view, status code and error code (the
+    "error_code" of JSON error responses) and times each view. Supports
+    synchronous and asynchronous views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.isAsync = asyncio.iscoroutinefunction(get_response)
+        if self.isAsync:
+            # Tells Django to await this middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.isAsync:
+            return self._async_call(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, start)
+
+        return response
+
+    async def _async_call(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, start)
+
+        return response
+
+    @staticmethod
+    def record(request, response, start):
+        """Counts and times the request, which started at start (as returned
+        by time.perf_counter).
+        """
+        try:
+            view = resolve(request.path_info).url_name or 'unknown'
+        except Resolver404:
+            view = 'not_found'
+
+        REQUEST_SECONDS.observe(time.perf_counter() - start, view=view)
+        REQUESTS.inc(
+            view=view,
+            status=response.status_code,
+            error_code=getattr(response, 'errorCode', None) or ''
+        )
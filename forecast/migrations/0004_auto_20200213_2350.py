@@ -13,17 +13,17 @@ import corefunctions
 def initial_forecasts_data(apps, schemeEditior):
     """Populates the "Forecast" model with dummy data for all cities"""
     Forecast = apps.get_model('forecast', 'Forecast')
-    Cities = apps.get_model('forecast', 'Cities')
 
-    for city in corefunctions.all_cities:
-        newForecast = Forecast.objects.create(
-            city=Cities.objects.get(name=city),
+    Forecast.objects.bulk_create([
+        Forecast(
+            city_id=city,
             humidity=-99,
             pressure=-99,
             temperature=-99,
             forecast_for=-99
         )
-        newForecast.save()
+        for city in corefunctions.all_cities
+    ])
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-18 03:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast', '0005_forecast_clouds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshLock',
+            fields=[
+                ('city', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='forecast.Cities')),
+                ('acquired_at', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.7 on 2026-10-18 03:10
+
+# IMPORTS
+# Python Core Imports
+
+# Third Party Imports
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+# Local Imports
+
+
+def remove_duplicate_forecasts(apps, schemaEditor):
+    """Removes duplicate forecasts (forecasts for the same city and time)
+    keeping the newest forecast (the highest id) so that the unique
+    constraint can be created.
+    """
+    Forecast = apps.get_model('forecast', 'Forecast')
+
+    duplicates = Forecast.objects.values('city', 'forecast_for').annotate(
+        newestId=Max('id'),
+        total=Count('id')
+    ).filter(total__gt=1)
+
+    for duplicate in duplicates.iterator():
+        Forecast.objects.filter(
+            city=duplicate['city'],
+            forecast_for=duplicate['forecast_for'],
+            id__lt=duplicate['newestId']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast', '0006_refreshlock'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_forecasts,
+            migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='forecast',
+            constraint=models.UniqueConstraint(fields=('city', 'forecast_for'), name='unique_city_forecast_for'),
+        ),
+    ]
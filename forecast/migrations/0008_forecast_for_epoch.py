@@ -0,0 +1,71 @@
+# IMPORTS
+# Python Core Imports
+
+# Third Party Imports
+from django.db import migrations
+
+# Local Imports
+import corefunctions
+
+# Epochs are 10 digits until 2286 and YYYYMMDDHHMM values are 12 digits, so
+# any forecast_for above this is in the old format. The dummy forecasts
+# (forecast_for=-99) are left unchanged.
+EPOCH_MAX = 10 ** 11
+
+# Number of forecasts updated in each query.
+BATCH_SIZE = 1000
+
+
+def convert_forecasts(apps, filters, convert):
+    """Updates forecast_for for the forecasts matching filters to
+    convert(forecast_for), BATCH_SIZE forecasts at a time.
+    """
+    Forecast = apps.get_model('forecast', 'Forecast')
+
+    batch = []
+    for forecast in Forecast.objects.filter(**filters).only(
+        'id', 'forecast_for'
+    ).iterator(chunk_size=BATCH_SIZE):
+        forecast.forecast_for = convert(forecast.forecast_for)
+        batch.append(forecast)
+
+        if len(batch) == BATCH_SIZE:
+            Forecast.objects.bulk_update(batch, ['forecast_for'])
+            batch = []
+
+    Forecast.objects.bulk_update(batch, ['forecast_for'])
+
+
+def int_to_epoch(apps, schemaEditor):
+    """Converts forecast_for from YYYYMMDDHHMM (local time) to an epoch."""
+    convert_forecasts(
+        apps,
+        {'forecast_for__gt': EPOCH_MAX},
+        lambda value: corefunctions.datetime_to_epoch(
+            corefunctions.int_to_datetime(value)
+        )
+    )
+
+
+def epoch_to_int(apps, schemaEditor):
+    """Converts forecast_for from an epoch back to YYYYMMDDHHMM (local
+    time).
+    """
+    convert_forecasts(
+        apps,
+        {'forecast_for__gte': 0, 'forecast_for__lte': EPOCH_MAX},
+        lambda value: corefunctions.date_to_int(
+            corefunctions.epoch_to_datetime(value)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast', '0007_forecast_unique_city_forecast_for'),
+    ]
+
+    operations = [
+        migrations.RunPython(int_to_epoch, epoch_to_int),
+    ]
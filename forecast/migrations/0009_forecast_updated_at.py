@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:38
+
+from django.db import migrations, models
+import forecast.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast', '0008_forecast_for_epoch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='updated_at',
+            field=models.BigIntegerField(default=forecast.models.current_epoch),
+        ),
+    ]
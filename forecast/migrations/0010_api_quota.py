@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast', '0009_forecast_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiQuota',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField()),
+            ],
+        ),
+    ]
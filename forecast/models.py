@@ -2,17 +2,27 @@
 The module will handle the following models:
     * Cities: contains a list of cities.
     * Forecast: Contains weather forecasts for cities at various times.
+    * RefreshLock: Locks held while fetching new forecasts for a city.
+    * ApiQuota: Token buckets metering the calls made to the API.
 """
 
 # IMPORTS
 # Python Core Imports
+import csv
+import io
+import time
 
 # Third Party Imports
-from django.db import models
+from django.db import connections, models, transaction
 
 # Local Imports
 
 
+def current_epoch():
+    """Returns the current time as an epoch (an integer)."""
+    return int(time.time())
+
+
 class Cities(models.Model):
     """Contains a list of all the cities around the world.
     PRIMARY KEY: name
@@ -24,6 +34,168 @@ class Cities(models.Model):
         verbose_name_plural = "Cities"
 
 
+class ForecastQuerySet(models.QuerySet):
+    """Query set for models.Forecast."""
+
+    # Fields written by an upsert, other than the unique (city, forecast_for).
+    UPSERT_FIELDS = ('humidity', 'pressure', 'temperature', 'clouds',
+                     'updated_at')
+
+    def upsert(self, forecasts):
+        """Inserts the forecasts (unsaved Forecast objects), updating any
+        existing forecast for the same city and forecast_for, so that there
+        is at most one forecast for a city at any time.
+        PostgreSQL and SQLite use INSERT ... ON CONFLICT and MySQL uses
+        INSERT ... ON DUPLICATE KEY UPDATE. For other databases the existing
+        forecasts are deleted before inserting the new forecasts.
+        Returns the number of forecasts written.
+        """
+        connection = connections[self.db]
+        vendor = connection.vendor
+        forecasts = list(forecasts)
+
+        if not forecasts:
+            return 0
+
+        with transaction.atomic(using=self.db):
+            if vendor in ('postgresql', 'sqlite', 'mysql'):
+                self._upsert_sql(connection, forecasts)
+            else:
+                for forecast in forecasts:
+                    self.filter(
+                        city_id=forecast.city_id,
+                        forecast_for=forecast.forecast_for
+                    ).delete()
+                self.bulk_create(forecasts)
+
+        return len(forecasts)
+
+    def copy_upsert(self, forecasts):
+        """Writes the forecasts as upsert does, using COPY on PostgreSQL: the
+        forecasts are copied into a temporary table and then upserted from
+        it with a single statement. Other databases use upsert.
+        Returns the number of forecasts written.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return self.upsert(forecasts)
+
+        forecasts = list(forecasts)
+        if not forecasts:
+            return 0
+
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        fields = self._upsert_fields()
+        columns = ', '.join(quote(field.column) for field in fields)
+
+        data = io.StringIO()
+        writer = csv.writer(data)
+        for forecast in forecasts:
+            writer.writerow(
+                [getattr(forecast, field.attname) for field in fields]
+            )
+        data.seek(0)
+
+        with transaction.atomic(using=self.db), \
+                connection.cursor() as cursor:
+            # The table is only dropped when the outermost transaction
+            # commits, which may be after an earlier copy_upsert.
+            cursor.execute('DROP TABLE IF EXISTS forecast_import')
+            cursor.execute(
+                'CREATE TEMPORARY TABLE forecast_import ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {quote(meta.db_table)} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY forecast_import ({columns}) FROM STDIN '
+                'WITH (FORMAT csv)',
+                data
+            )
+            cursor.execute(
+                f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+                f'SELECT {columns} FROM forecast_import '
+                f'{self._conflict_sql(connection, fields)}'
+            )
+
+        return len(forecasts)
+
+    def _upsert_fields(self):
+        """Returns the fields written by an upsert."""
+        meta = self.model._meta
+        return [meta.get_field(name)
+                for name in ('city', 'forecast_for') + self.UPSERT_FIELDS]
+
+    def _conflict_sql(self, connection, fields):
+        """Returns the clause which turns an INSERT into an upsert."""
+        quote = connection.ops.quote_name
+
+        if connection.vendor == 'mysql':
+            return 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+                f'{quote(name)} = VALUES({quote(name)})'
+                for name in self.UPSERT_FIELDS
+            )
+
+        return (
+            f'ON CONFLICT ({quote(fields[0].column)}, '
+            f'{quote(fields[1].column)}) '
+            'DO UPDATE SET ' + ', '.join(
+                f'{quote(name)} = excluded.{quote(name)}'
+                for name in self.UPSERT_FIELDS
+            )
+        )
+
+    def _upsert_sql(self, connection, forecasts):
+        """Writes the forecasts with the database's upsert statement."""
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        fields = self._upsert_fields()
+        columns = ', '.join(quote(field.column) for field in fields)
+        placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+        conflict = self._conflict_sql(connection, fields)
+        batchSize = connection.ops.bulk_batch_size(fields, forecasts)
+
+        with connection.cursor() as cursor:
+            for idx in range(0, len(forecasts), batchSize):
+                batch = forecasts[idx:idx + batchSize]
+                params = [
+                    getattr(forecast, field.attname)
+                    for forecast in batch for field in fields
+                ]
+                cursor.execute(
+                    f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+                    f'VALUES {", ".join([placeholders] * len(batch))} '
+                    f'{conflict}',
+                    params
+                )
+
+    def delete_in_chunks(self, chunkSize):
+        """Deletes the forecasts in the query set, chunkSize rows at a time
+        with each chunk in its own transaction, so that a large delete does
+        not hold locks on the table for long. Signals are not sent.
+        Returns the number of forecasts deleted.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        deleted = 0
+
+        while True:
+            ids = list(self.values_list('pk', flat=True)[:chunkSize])
+            if not ids:
+                return deleted
+
+            with transaction.atomic(using=self.db), \
+                    connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {quote(meta.db_table)} '
+                    f'WHERE {quote(meta.pk.column)} IN '
+                    f'({", ".join(["%s"] * len(ids))})',
+                    ids
+                )
+                deleted += cursor.rowcount
+
+
 class Forecast(models.Model):
     """Contains weather forecasts at different times for cities around the
     world.
@@ -41,6 +213,51 @@ class Forecast(models.Model):
     # This could be a models.DateTimeField but not all databases can support
     # this field type.
     # To provide compatibility between all databases, this is an integer
-    # field where the value will be in the format YYYYMMDDHHMM (time will be
-    # stored as 24hr format.)
+    # field containing the time as an epoch (seconds since 1970-01-01 00:00
+    # UTC) so that the difference between two times is the number of seconds
+    # between them. Use corefunctions.datetime_to_epoch and
+    # corefunctions.epoch_to_datetime to convert to and from datetimes.
     forecast_for = models.BigIntegerField()
+    # The time (epoch) the forecast was last written, used as the
+    # Last-Modified time of responses.
+    updated_at = models.BigIntegerField(default=current_epoch)
+
+    objects = ForecastQuerySet.as_manager()
+
+    class Meta:
+        # There is at most one forecast for a city at any time. The unique
+        # index on (city, forecast_for) also serves range queries on
+        # forecast_for for a city.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['city', 'forecast_for'],
+                name='unique_city_forecast_for'
+            ),
+        ]
+
+
+class RefreshLock(models.Model):
+    """A lock held by the worker fetching new forecasts for a city from the
+    API so that only one worker (across all processes) fetches the forecasts
+    for a city at any one time.
+    A lock is a row in this table. Locks older than
+    config.REFRESH_LOCK_TIMEOUT_SECS are treated as abandoned.
+    PRIMARY KEY: city
+    FOREIGN KEYS: - city: models.Cities
+    """
+    city = models.OneToOneField(Cities, on_delete=models.CASCADE,
+                                primary_key=True)
+    # Epoch time the lock was acquired.
+    acquired_at = models.FloatField()
+
+
+class ApiQuota(models.Model):
+    """A token bucket metering the calls made to the API with the shared API
+    key, across all processes (see quota.QuotaManager).
+    PRIMARY KEY: name
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    # Tokens left in the bucket at updated_at.
+    tokens = models.FloatField()
+    # Epoch time the tokens were last counted.
+    updated_at = models.FloatField()
@@ -0,0 +1,138 @@
+"""Prefetches the forecasts for cities from the API ahead of the next time
+slot so that user requests are served from the database (or cache) rather
+than waiting on the API.
+Used by the prefetch_forecasts management command.
+"""
+
+# IMPORTS
+# Python Core Imports
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+
+# Third Party Imports
+from django.db import connections
+
+# Local Imports
+from . import config, quota
+from .forecast_cache import next_slot_boundary
+from .response_builder import ResponseBuilder
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than callsPerMin calls start in any
+    minute. Thread safe.
+    Arguments:
+        * callsPerMin [int/float]: maximum number of calls per minute. A
+                                   value of 0 disables the limit.
+        * clock [function]: (default=time.monotonic) returns the current
+                            time in seconds.
+        * sleep [function]: (default=time.sleep)
+    """
+
+    def __init__(self, callsPerMin, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60 / callsPerMin if callsPerMin else 0
+        self.clock = clock
+        self.sleep = sleep
+
+        self._nextCall = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the next call is allowed to start."""
+        if not self.interval:
+            return
+
+        # Reserve the next start time under the lock and sleep outside it.
+        with self._lock:
+            now = self.clock()
+            startAt = max(now, self._nextCall or now)
+            self._nextCall = startAt + self.interval
+
+        if startAt > now:
+            self.sleep(startAt - now)
+
+
+class Prefetcher:
+    """Refreshes the forecasts of a list of cities from the API.
+    Arguments:
+        * maxWorkers [int]: maximum number of cities fetched at the same time.
+        * callsPerMin [int/float]: maximum number of API calls per minute.
+        * jitterSecs [float]: maximum random delay before each API call.
+        * refresh [function]: (default=ResponseBuilder.refresh_forecasts)
+                              fetches and stores the forecasts of a city.
+        * sleep [function]: (default=time.sleep)
+    """
+
+    def __init__(
+        self,
+        maxWorkers=config.PREFETCH_MAX_WORKERS,
+        callsPerMin=config.PREFETCH_CALLS_PER_MIN,
+        jitterSecs=config.PREFETCH_JITTER_SECS,
+        refresh=ResponseBuilder.refresh_forecasts,
+        sleep=time.sleep
+    ):
+        self.maxWorkers = maxWorkers
+        self.jitterSecs = jitterSecs
+        self.refresh = refresh
+        self.sleep = sleep
+        self.rateLimiter = RateLimiter(callsPerMin, sleep=sleep)
+
+    def fetch(self, city, closeConnection=False):
+        """Refreshes the forecasts of a city. Returns the number of rows
+        written or None if the refresh failed.
+        """
+        try:
+            if self.jitterSecs:
+                self.sleep(random.uniform(0, self.jitterSecs))
+            self.rateLimiter.wait()
+
+            # User requests take priority over prefetching for the API quota.
+            with quota.priority(quota.BACKGROUND):
+                return self.refresh(city)
+
+        except Exception:
+            logger.exception('Failed to prefetch forecasts for %s', city)
+            return None
+
+        finally:
+            # Each worker thread opens its own database connection.
+            if closeConnection:
+                connections.close_all()
+
+    def run(self, cities):
+        """Refreshes the forecasts of all the cities. Returns a dictionary
+        with the number of cities refreshed, the number of cities which
+        failed and the number of rows written.
+        """
+        if self.maxWorkers <= 1:
+            results = [self.fetch(city) for city in cities]
+        else:
+            with ThreadPoolExecutor(self.maxWorkers) as executor:
+                results = list(executor.map(
+                    lambda city: self.fetch(city, closeConnection=True),
+                    cities
+                ))
+
+        failed = [result for result in results if result is None]
+
+        return {
+            'refreshed': len(results) - len(failed),
+            'failed': len(failed),
+            'rows': sum(result for result in results if result is not None),
+        }
+
+
+def seconds_until_prefetch(now, leadMins=config.PREFETCH_LEAD_MINS):
+    """Returns the number of seconds from now (an epoch time) until the next
+    prefetch should start, leadMins before the end of the current time slot.
+    """
+    startAt = next_slot_boundary(now) - leadMins * 60
+    if startAt <= now:
+        startAt = next_slot_boundary(startAt + leadMins * 60) - leadMins * 60
+
+    return startAt - now
@@ -0,0 +1,135 @@
+"""Helps to debug slow requests to the forecast views.
+    * Server-Timing: the time spent in each stage of building the response
+      (see metrics.stage) is added to the response as a Server-Timing
+      header, e.g: "db_query;dur=1.204, serialization;dur=0.031,
+      total;dur=2.519" (milliseconds).
+    * Profiling: a staff user can run a request under cProfile by adding
+      the "profile" parameter (or an X-Profile header) to the request.
+      "profile=text" returns the profile as text in place of the response.
+      Any other value stores the profile (a pstats file, which can be opened
+      with pstats, snakeviz or speedscope) in config.PROFILE_DIR and returns
+      its path in an X-Profile-File header.
+Both are added to a view with the instrument decorator.
+"""
+
+# IMPORTS
+# Python Core Imports
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import time
+
+# Third Party Imports
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+# Local Imports
+from . import config
+from .metrics import request_timings
+
+# Order of the stages in the Server-Timing header. Any other stages follow.
+STAGES = ('city_lookup', 'db_query', 'upstream_call', 'unit_formatting',
+          'serialization')
+
+
+def server_timing(timings, totalSecs):
+    """Returns the value of the Server-Timing header for the timings (a
+    dictionary of stage to seconds) of a request which took totalSecs.
+    """
+    names = [name for name in STAGES if name in timings]
+    names += sorted(name for name in timings if name not in STAGES)
+
+    return ', '.join(
+        [f'{name};dur={timings[name] * 1000:.3f}' for name in names]
+        + [f'total;dur={totalSecs * 1000:.3f}']
+    )
+
+
+def profile_mode(request):
+    """Returns how the request should be profiled ('text' or 'file'), or
+    None if profiling was not requested by a staff user.
+    """
+    mode = request.GET.get('profile') or request.headers.get('X-Profile')
+    if not mode:
+        return None
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return None
+
+    return 'text' if mode == 'text' else 'file'
+
+
+def profile_view(view, mode, request, *args, **kwargs):
+    """Calls the view under cProfile and returns the response with the
+    profile (see the module docstring).
+    """
+    profiler = cProfile.Profile()
+    response = profiler.runcall(view, request, *args, **kwargs)
+
+    if mode == 'text':
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(
+            'cumulative'
+        ).print_stats(config.PROFILE_TOP_FUNCTIONS)
+        response = HttpResponse(
+            stream.getvalue(),
+            content_type='text/plain; charset=utf-8'
+        )
+
+    else:
+        directory = config.PROFILE_DIR or tempfile.gettempdir()
+        path = os.path.join(
+            directory,
+            f'{view.__name__}-'
+            f'{time.time_ns()}.prof'
+        )
+        profiler.dump_stats(path)
+        response['X-Profile-File'] = path
+
+    # Profiled responses must not be served to other clients.
+    patch_cache_control(response, private=True, no_store=True)
+
+    return response
+
+
+def instrument(view):
+    """Decorates a view to add the Server-Timing header to its responses
+    (if config.SERVER_TIMING is set) and to profile the requests which ask
+    for it. Asynchronous views are timed but not profiled.
+    """
+    def add_timing(response, timings, start):
+        if config.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(
+                timings, time.perf_counter() - start
+            )
+        return response
+
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            with request_timings() as timings:
+                response = await view(request, *args, **kwargs)
+
+            return add_timing(response, timings, start)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        start = time.perf_counter()
+        with request_timings() as timings:
+            mode = profile_mode(request)
+            if mode is None:
+                response = view(request, *args, **kwargs)
+            else:
+                response = profile_view(view, mode, request, *args, **kwargs)
+
+        return add_timing(response, timings, start)
+
+    return wrapper
@@ -0,0 +1,238 @@
+"""Meters the calls made to the API with the shared API key so that all the
+workers together stay within the plan's calls per minute.
+The quota is a token bucket stored in the database (models.ApiQuota), so it
+is shared by every process. The bucket holds up to a minute of calls and is
+refilled continuously. Each call to the API takes a token.
+On databases which lock rows (PostgreSQL, MySQL) the bucket is locked while
+a token is taken. Other databases (SQLite) have no row locks, so the bucket is
+only written if no other worker has written it since it was read, and read
+again otherwise.
+Calls have a priority. Calls made to serve a user request (USER) can take any
+token. Background calls (BACKGROUND, e.g: prefetching or refreshing a stale
+forecast) can only take a token while more than a reserve is left, so that
+user requests win when tokens are scarce.
+"""
+
+# IMPORTS
+# Python Core Imports
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+# Third Party Imports
+from django.db import connections, transaction
+
+# Local Imports
+from . import config
+from .metrics import QUOTA_TOKENS
+from .models import ApiQuota
+
+USER = 'user'
+BACKGROUND = 'background'
+
+# The priority of the API calls made in the current thread (or task).
+_priority = ContextVar('quota_priority', default=USER)
+
+
+@contextmanager
+def priority(value):
+    """Makes the API calls within the with block with the priority value."""
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    """Returns the priority of API calls made now."""
+    return _priority.get()
+
+
+class QuotaExceeded(Exception):
+    """Raised when a token could not be taken in time.
+    Attributes:
+        * retryAfter [int]: seconds until a token is expected to be free.
+    """
+
+    def __init__(self, retryAfter):
+        super().__init__(f'API quota exceeded, retry after {retryAfter}s')
+        self.retryAfter = retryAfter
+
+
+class QuotaManager:
+    """Takes tokens from the shared token bucket before each API call.
+    Arguments:
+        * name [str]: the name of the bucket (models.ApiQuota).
+        * callsPerMin [int/float]: calls allowed per minute, which is also
+                                   the size of the bucket. A value of 0
+                                   disables the quota.
+        * userReserve [float]: fraction of the bucket reserved for USER
+                               calls.
+        * maxWait [dict]: priority to the maximum number of seconds to wait
+                          for a token.
+        * clock [function]: (default=time.time) returns the current epoch
+                            time.
+        * sleep [function]: (default=time.sleep)
+    """
+
+    def __init__(
+        self,
+        name='api',
+        callsPerMin=config.QUOTA_CALLS_PER_MIN,
+        userReserve=config.QUOTA_USER_RESERVE,
+        maxWait=None,
+        clock=time.time,
+        sleep=time.sleep
+    ):
+        self.name = name
+        self.callsPerMin = callsPerMin
+        self.userReserve = userReserve
+        self.maxWait = maxWait or {
+            USER: config.QUOTA_USER_MAX_WAIT_SECS,
+            BACKGROUND: config.QUOTA_BACKGROUND_MAX_WAIT_SECS,
+        }
+        self.clock = clock
+        self.sleep = sleep
+
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def minimum_tokens(self, callPriority):
+        """Returns the number of tokens which must be in the bucket for a
+        call with callPriority to take one.
+        """
+        if callPriority == USER:
+            return 1
+        return 1 + self.callsPerMin * self.userReserve
+
+    def try_acquire(self, callPriority):
+        """Takes a token if there are enough in the bucket. Returns 0 if a
+        token was taken, otherwise the number of seconds until there should
+        be enough.
+        """
+        connection = connections[ApiQuota.objects.db]
+        if connection.features.has_select_for_update:
+            return self._try_acquire_locked(callPriority)
+
+        return self._try_acquire_conditional(callPriority)
+
+    def _bucket(self, queryset):
+        """Returns the bucket, creating a full bucket if there is none."""
+        bucket, _ = queryset.get_or_create(
+            name=self.name,
+            defaults={'tokens': self.callsPerMin, 'updated_at': self.clock()}
+        )
+        return bucket
+
+    def _take(self, bucket, now, callPriority):
+        """Returns the number of tokens in the bucket at now after taking a
+        token, and the number of seconds to wait (0 if a token was taken).
+        """
+        capacity = self.callsPerMin
+        refillPerSec = capacity / 60
+        required = self.minimum_tokens(callPriority)
+
+        tokens = min(
+            capacity,
+            bucket.tokens + max(0, now - bucket.updated_at) * refillPerSec
+        )
+        if tokens >= required:
+            return tokens - 1, 0
+
+        return tokens, (required - tokens) / refillPerSec
+
+    def _try_acquire_locked(self, callPriority):
+        """try_acquire with the bucket's row locked (SELECT ... FOR
+        UPDATE).
+        """
+        with transaction.atomic():
+            bucket = self._bucket(ApiQuota.objects.select_for_update())
+            now = self.clock()
+            tokens, waitSecs = self._take(bucket, now, callPriority)
+
+            bucket.tokens = tokens
+            bucket.updated_at = now
+            bucket.save(update_fields=['tokens', 'updated_at'])
+
+        return waitSecs
+
+    def _try_acquire_conditional(self, callPriority):
+        """try_acquire with a conditional UPDATE, for databases without row
+        locks. The token is only taken if the bucket has not changed since
+        it was read, otherwise the bucket is read again.
+        """
+        while True:
+            bucket = self._bucket(ApiQuota.objects)
+            now = self.clock()
+            tokens, waitSecs = self._take(bucket, now, callPriority)
+            if waitSecs:
+                return waitSecs
+
+            updated = ApiQuota.objects.filter(
+                name=self.name,
+                tokens=bucket.tokens,
+                updated_at=bucket.updated_at
+            ).update(tokens=tokens, updated_at=now)
+            if updated:
+                return 0
+
+    def acquire(self, callPriority=None):
+        """Takes a token for a call with callPriority (default: the priority
+        set with quota.priority), waiting for one for up to the priority's
+        maximum wait. Raises QuotaExceeded if no token could be taken in
+        time.
+        """
+        if not self.callsPerMin:
+            return
+
+        callPriority = callPriority or current_priority()
+        deadline = self.clock() + self.maxWait.get(callPriority, 0)
+
+        while True:
+            waitSecs = self.try_acquire(callPriority)
+            if not waitSecs:
+                self._count(callPriority, 'granted')
+                return
+
+            if self.clock() + waitSecs > deadline:
+                self._count(callPriority, 'denied')
+                raise QuotaExceeded(int(waitSecs) + 1)
+
+            self._count(callPriority, 'waited')
+            self.sleep(waitSecs)
+
+    def _count(self, callPriority, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(
+                callPriority, {'granted': 0, 'waited': 0, 'denied': 0}
+            )
+            counts[outcome] += 1
+
+        QUOTA_TOKENS.inc(priority=callPriority, outcome=outcome)
+
+    def stats(self):
+        """Returns the number of tokens granted, waited for and denied in
+        this process for each priority and the tokens left in the bucket.
+        """
+        with self._lock:
+            stats = {key: dict(counts) for key, counts in self._stats.items()}
+        stats['tokens'] = self.tokens()
+
+        return stats
+
+    def tokens(self):
+        """Returns the number of tokens in the bucket now."""
+        bucket = ApiQuota.objects.filter(name=self.name).first()
+        if bucket is None:
+            return self.callsPerMin
+
+        return min(
+            self.callsPerMin,
+            bucket.tokens + max(0, self.clock() - bucket.updated_at)
+            * self.callsPerMin / 60
+        )
+
+
+api_quota = QuotaManager()
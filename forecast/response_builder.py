@@ -4,18 +4,61 @@ JSON HttpRespose.
 
 # IMPORTS
 # Python Core Imports
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import hashlib
+import logging
+import threading
 import time
-import json
 
 # Third Party Imports
-from django.http import HttpResponse, HttpResponseServerError, HttpResponseBadRequest
-import requests
+from django.db import close_old_connections
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
 # Local Imports
 from . import config
 import corefunctions
+from .compaction import maybe_compact
+from .forecast_cache import (forecast_cache, interval_seconds,
+                             next_slot_boundary, time_slot)
+from .json_response import json_response, PreparedResponse
+from .metrics import CACHE_LOOKUPS, stage
 from .models import Forecast
+from .shared_cache import city_request_counts, shared_forecast_cache
+from .single_flight import city_refreshes, refresh_lock
+from . import quota
+from .upstream import (CircuitBreaker, CircuitOpenError, QuotaExceededError,
+                       UpstreamError, upstream_client)
+
+logger = logging.getLogger(__name__)
+
+# Refreshes the forecasts of cities served stale in the background (see
+# ResponseBuilder.revalidate), so that many stale cities do not each start a
+# thread and open a database connection.
+revalidate_executor = ThreadPoolExecutor(
+    config.REVALIDATE_WORKERS,
+    thread_name_prefix='revalidate'
+)
+
+# Cities waiting for or being refreshed by revalidate_executor.
+_revalidating = set()
+_revalidatingLock = threading.Lock()
+
+
+class RefreshRequired(Exception):
+    """Raised by a ResponseBuilder which is not allowed to call the API when
+    there is no data for the city.
+    Attributes:
+        * city [str]: the city which needs new forecasts.
+        * hasData [function]: returns the forecast rows needed by the
+                              request, or an empty list if there are none.
+    """
+
+    def __init__(self, city, hasData):
+        super().__init__(f'No forecasts stored for {city}')
+        self.city = city
+        self.hasData = hasData
 
 
 class ResponseBuilder:
@@ -23,12 +66,64 @@ class ResponseBuilder:
     Arguments:
     request [obj]: HTTP request object
     city [str]: city name
+    allowRefresh [bool]: (default=True) if the data does not exist, call the
+                         API. If False, raise RefreshRequired instead so that
+                         the caller can fetch the data.
+    refreshError [UpstreamError]: (default=None) the error raised when the
+                                  caller fetched the data, handled as if
+                                  raised by the API call (e.g: an older
+                                  forecast is served).
+    refreshed [bool]: (default=False) the response is built again after the
+                      caller fetched the data for a RefreshRequired raised
+                      for the (canonical) city. The request is not looked up
+                      or counted again and the API is not called.
     """
 
-    def __init__(self, request, city):
+    # Fields retrieved for each forecast row.
+    ROW_FIELDS = ('humidity', 'pressure', 'temperature', 'clouds',
+                  'forecast_for', 'updated_at')
+
+    # Units which can be requested with "temp_units" and "pressure_units"
+    # (case insensitive).
+    TEMP_UNITS = ('K', 'C', 'F')
+    PRESSURE_UNITS = ('pa', 'bar', 'atm', 'torr', 'psi', 'hpa')
+
+    # Error responses which do not depend on the request.
+    INVALID_DATE = PreparedResponse({
+        'error': 'Invalid date format, use ISO 8601',
+        'error_code': 'invalid date'
+    }, 400)
+    DATE_IN_PAST = PreparedResponse({
+        'error': 'Date is in the past',
+        'error_code': 'invalid date'
+    }, 400)
+    INVALID_TEMP_UNITS = PreparedResponse({
+        'error': 'Invalid temperature units',
+        'error_code': 'invalid_units'
+    }, 400)
+    INVALID_PRESSURE_UNITS = PreparedResponse({
+        'error': 'Invalid pressure units',
+        'error_code': 'invalid_units'
+    }, 400)
+    SERVER_ERROR = PreparedResponse({
+        'error': 'Something went wrong',
+        'error_code': 'internal server error'
+    }, 500)
+
+    def __init__(self, request, city, allowRefresh=True, refreshError=None,
+                 refreshed=False):
         # Arguments attached to the self object.
+        self.httpRequest = request
         self.request = request.GET
         self.city = city
+        self.allowRefresh = allowRefresh
+        self.refreshError = refreshError
+        self.refreshed = refreshed
+
+        # Seconds between the time requested and the forecast returned when
+        # an older forecast is served while the city's forecasts are
+        # refreshed (see forecast_data), otherwise None.
+        self.staleSecs = None
 
         # Build the response
         self._response = self._set_response()
@@ -38,8 +133,15 @@ class ResponseBuilder:
         # If the city is not valid, then return a 404.
         # This can be queried against the database, but there is a finite
         # number of cities and so this avoids a database call by checking
-        # a local file.
-        if self.city not in corefunctions.all_cities:
+        # the city registry (a hash index of the cities in a local file).
+        # The registry also resolves aliases and alternative spellings to
+        # the name of the city stored in the database.
+        if self.refreshed:
+            canonicalCity = self.city
+        else:
+            with stage('city_lookup'):
+                canonicalCity = corefunctions.city_registry.lookup(self.city)
+        if canonicalCity is None:
             response = {
                 "error": f"Cannot find city '{self.city}'",
                 "error_code": "city not found"
@@ -48,23 +150,24 @@ class ResponseBuilder:
             return self.format_json_response(response, 404)
 
         else:
+            self.city = canonicalCity
+
+            # The number of requests for each city is used to decide which
+            # cities to prefetch forecasts for.
+            if not self.refreshed:
+                city_request_counts.increment(self.city)
+
             # Check if there is a date, if so, convert the date before
             # continuing.
             if self.request.get('at'):
 
                 # Try and except to handle an invalid date
                 try:
-                    forecastDate = corefunctions.UnitConversion(
-                        self.request.get('at'),
-                        'unknown',
-                        'datetime'
-                    ).convert_date_string()
+                    forecastDate = corefunctions.parse_date_string(
+                        self.request.get('at')
+                    )
                 except ValueError:
-                    response = {
-                        'error': 'Invalid date format, use ISO 8601',
-                        'error_code': 'invalid date'
-                    }
-                    return self.format_json_response(response, 400)
+                    return self.INVALID_DATE()
 
                 # If the date is in the past or greater than the latest
                 # forecast available, return a 400.
@@ -73,11 +176,7 @@ class ResponseBuilder:
                 maxDate = now + timedelta(days=config.MAX_FORCAST_DAYS)
 
                 if forecastDate < minDate:
-                    response = {
-                        'error': 'Date is in the past',
-                        'error_code': 'invalid date'
-                    }
-                    return self.format_json_response(response, 400)
+                    return self.DATE_IN_PAST()
 
                 elif forecastDate > maxDate:
                     response = {
@@ -90,63 +189,379 @@ class ResponseBuilder:
                 forecastDate = datetime.now()
 
             # Retrieve the forecast data
-            querySet = self.forecast_data(forecastDate)
+            try:
+                querySet = self.forecast_data(forecastDate)
+            except UpstreamError as error:
+                return self.upstream_error_response(error)
 
             # The querySet may return multiple rows of data contain forcast
             # information at different times of the day.
             # Filter the results and return the data at a single time.
             querySet = self.queryset_filter(
                 querySet,
-                corefunctions.date_to_int(forecastDate),
+                corefunctions.datetime_to_epoch(forecastDate),
                 'forecast_for'
             )
 
+            # Clients and caches which already hold this forecast get a 304
+            # without converting the units or serialising the response.
+            etag = self.make_etag(querySet, time_slot(forecastDate))
+            lastModified = querySet['updated_at']
+            expiresAt = None
+            if not self.request.get('at'):
+                # The row nearest to now changes half way between two
+                # forecasts, so the response can only be cached until then
+                # and was last modified no earlier than when the row became
+                # the nearest.
+                halfInterval = interval_seconds() // 2
+                expiresAt = querySet['forecast_for'] + halfInterval
+                lastModified = max(
+                    lastModified,
+                    min(querySet['forecast_for'] - halfInterval,
+                        int(time.time()))
+                )
+
+            notModified = get_conditional_response(
+                self.httpRequest,
+                etag=etag,
+                last_modified=lastModified
+            )
+            if notModified is not None:
+                return self.add_cache_headers(
+                    notModified, etag, lastModified, self.staleSecs,
+                    expiresAt
+                )
+
             # Convert the querySet to a dictionary
             querySet = self.queryset_to_dict(querySet)
 
             # Configure units in accordance to the paramaters set in the URL.
-            querySet = self.format_units(querySet)
+            response = self.format_units(querySet)
+
+            if response.status_code == 200:
+                self.add_cache_headers(
+                    response, etag, lastModified, self.staleSecs, expiresAt
+                )
+
+            return response
+
+    def make_etag(self, row, slot):
+        """Returns a strong ETag for the forecast row (as returned by
+        queryset_filter) in the time slot with the units requested.
+        """
+        key = ':'.join(str(value) for value in (
+            self.city,
+            slot,
+            self.request.get('temp_units', ''),
+            self.request.get('pressure_units', ''),
+            row['forecast_for'],
+            row['updated_at'],
+        ))
 
-            return querySet
+        return '"' + hashlib.md5(key.encode()).hexdigest() + '"'
+
+    @staticmethod
+    def add_cache_headers(
+        response,
+        etag,
+        lastModified,
+        staleSecs=None,
+        expiresAt=None
+    ):
+        """Adds the ETag and Last-Modified headers to the response and allows
+        it to be cached until the next time slot, when new forecasts may be
+        fetched, or until expiresAt (an epoch) if sooner. Returns the
+        response.
+        A stale response (staleSecs is not None) is marked with a Warning
+        and an X-Forecast-Stale header (the number of seconds between the
+        time requested and the forecast) and must be revalidated, as fresh
+        forecasts are being fetched.
+        """
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(lastModified)
+
+        if staleSecs is None:
+            now = time.time()
+            expiresAt = min(expiresAt or float('inf'), next_slot_boundary(now))
+            maxAge = max(0, int(expiresAt) - int(now))
+        else:
+            response['Warning'] = '110 - "Response is Stale"'
+            response['X-Forecast-Stale'] = str(staleSecs)
+            maxAge = 0
+
+        patch_cache_control(response, public=True, max_age=maxAge)
+
+        return response
 
     def forecast_data(self, forecastDate):
-        """Given a city (string) and a forecast time (int in the format
-        YYYYMMDDHHMM or datetime.datetime), return the forcast for a city at
-        the specified time.
+        """Given a city (string) and a forecast time (int epoch or
+        datetime.datetime), return the forcast rows for a city within
+        config.API_TIME_INTERVAL_MINS of the specified time, ordered from the
+        latest to the earliest.
         """
 
         # NOTE: Amend the config file to reflect the time it takes before new data
         # by the API would be provided accordingly.
 
         if isinstance(forecastDate, int):
-            forecastDate = corefunctions.int_to_datetime(forecastDate)
+            forecastDate = corefunctions.epoch_to_datetime(forecastDate)
+
+        forecastFor = corefunctions.datetime_to_epoch(forecastDate)
+        minDate = forecastFor - interval_seconds()
+        maxTime = forecastFor + interval_seconds()
+
+        def window_rows():
+            return [
+                row for row in self.slot_data(forecastDate)
+                if minDate <= row['forecast_for'] <= maxTime
+            ]
+
+        rows = window_rows()
+
+        # If the data does not exist, serve the latest older forecast (when
+        # there is one recent enough) while the forecasts are fetched in the
+        # background. Otherwise call the API.
+        if not rows:
+            staleRow = self.stale_row(minDate, forecastFor)
+            if staleRow is not None:
+                self.staleSecs = forecastFor - staleRow['forecast_for']
+                self.revalidate(self.city, window_rows)
+                return [staleRow]
+
+            try:
+                if self.refreshError is not None:
+                    raise self.refreshError
+                if not self.refreshed:
+                    if not self.allowRefresh:
+                        raise RefreshRequired(self.city, window_rows)
+                    self.refresh_forecasts(self.city, window_rows)
+                    rows = window_rows()
+                if not rows:
+                    raise UpstreamError(self.city,
+                                        message='no forecasts returned')
+            except UpstreamError as error:
+                # Serve an older forecast rather than an error while the API
+                # is failing.
+                if error.status == 404:
+                    raise
+                staleRow = self.stale_row(
+                    minDate, forecastFor, config.OUTAGE_STALE_MAX_MINS
+                )
+                if staleRow is None:
+                    raise
+                self.staleSecs = forecastFor - staleRow['forecast_for']
+                return [staleRow]
 
-        minDate = corefunctions.date_to_int(
-            forecastDate
-            - timedelta(minutes=config.API_TIME_INTERVAL_MINS)
-        )
-        maxTime = corefunctions.date_to_int(
-            forecastDate
-            + timedelta(minutes=config.API_TIME_INTERVAL_MINS)
-        )
+        return rows
 
-        querySet = Forecast.objects.filter(
-            city=self.city,
-            forecast_for__gte=minDate,
-            forecast_for__lte=maxTime
-        ).order_by('-forecast_for')
+    def stale_row(self, before, forecastFor, maxStaleMins=None):
+        """Returns the latest forecast row (as a dictionary) for the city
+        before the epoch before and no more than maxStaleMins (default
+        config.STALE_MAX_MINS) minutes before forecastFor, or None.
+        """
+        if maxStaleMins is None:
+            maxStaleMins = config.STALE_MAX_MINS
+        maxStaleSecs = maxStaleMins * 60
+        if maxStaleSecs <= 0:
+            return None
+
+        with stage('db_query'):
+            return Forecast.objects.filter(
+                city=self.city,
+                forecast_for__lt=before,
+                forecast_for__gte=forecastFor - maxStaleSecs
+            ).order_by('-forecast_for').values(*self.ROW_FIELDS).first()
 
-        # If the data does not exist, then call the API.
-        if not querySet:
-            self.call_API(self.city)
+    @staticmethod
+    def revalidate(city, hasData):
+        """Queues a refresh of the city's forecasts (see refresh_forecasts)
+        on the revalidate_executor thread pool unless the city is already
+        queued or being refreshed in this process, or the API is failing
+        (the circuit is open). Returns True if a refresh was queued.
+        """
+        if upstream_client.breaker.state == CircuitBreaker.OPEN:
+            return False
+
+        with _revalidatingLock:
+            if city in _revalidating or city_refreshes.in_flight(city):
+                return False
+            _revalidating.add(city)
+
+        def refresh():
+            close_old_connections()
+            try:
+                # The request has been served, so user requests take
+                # priority over this call.
+                with quota.priority(quota.BACKGROUND):
+                    ResponseBuilder.refresh_forecasts(city, hasData)
+            except Exception:
+                logger.exception('Failed to refresh forecasts for %s', city)
+            finally:
+                with _revalidatingLock:
+                    _revalidating.discard(city)
+                close_old_connections()
+
+        revalidate_executor.submit(refresh)
+
+        return True
 
-        querySet = Forecast.objects.filter(
-            city=self.city,
-            forecast_for__gte=minDate,
-            forecast_for__lte=maxTime
-        ).order_by('-forecast_for')
+    @staticmethod
+    def refresh_forecasts(city, hasData=None):
+        """Fetches new forecasts for the city from the API unless hasData (a
+        function) returns a truthy value. Returns the number of rows written.
+        Only one refresh of a city runs at a time: concurrent requests within
+        the process wait for, and reuse, the refresh already in progress and
+        other processes wait for the city's refresh lock to be released.
+        """
+        def refresh():
+            with refresh_lock(city):
+                # Another process may have fetched the forecasts while this
+                # process was waiting for the lock.
+                if hasData is not None and hasData():
+                    return 0
 
-        return querySet
+                rowsWritten = ResponseBuilder.call_API(city)
+
+                # Warm the cache for the requests waiting on the refresh.
+                if hasData is not None:
+                    hasData()
+
+                return rowsWritten
+
+        return city_refreshes.do(city, refresh)
+
+    def slot_data(self, forecastDate):
+        """Returns the forecast rows (as dictionaries) for the city which
+        could be needed for any forecast time in the same time slot as
+        forecastDate, ordered from the latest to the earliest.
+        """
+        return self.slot_rows([self.city], forecastDate).get(self.city, ())
+
+    @staticmethod
+    def slot_rows(cities, forecastDate):
+        """Returns a dictionary of city to the forecast rows (as
+        dictionaries) which could be needed for any forecast time in the same
+        time slot as forecastDate, ordered from the latest to the earliest.
+        Cities without any rows are left out.
+        The rows are cached against the city and time slot so that repeated
+        requests within the same time slot do not query the database. The
+        in-process cache is checked first, followed by the cache shared
+        between all the workers. The rows for the remaining cities are
+        retrieved with a single query.
+        """
+        slot = time_slot(forecastDate)
+        rowsByCity = {}
+
+        for city in cities:
+            rows = forecast_cache.get(city, slot)
+            if rows is not None:
+                rowsByCity[city] = rows
+
+        missing = [city for city in cities if city not in rowsByCity]
+        CACHE_LOOKUPS.inc(len(rowsByCity), cache='local', result='hit')
+        CACHE_LOOKUPS.inc(len(missing), cache='local', result='miss')
+        if not missing:
+            return rowsByCity
+
+        for city, rows in shared_forecast_cache.get_many(
+            missing, slot
+        ).items():
+            forecast_cache.set(city, slot, rows)
+            rowsByCity[city] = rows
+
+        sharedHits = len(missing)
+        missing = [city for city in missing if city not in rowsByCity]
+        sharedHits -= len(missing)
+        CACHE_LOOKUPS.inc(sharedHits, cache='shared', result='hit')
+        CACHE_LOOKUPS.inc(len(missing), cache='shared', result='miss')
+        if not missing:
+            return rowsByCity
+
+        # Any forecast time in the slot can be up to
+        # config.API_TIME_INTERVAL_MINS either side of the slot.
+        interval = interval_seconds()
+        slotStart = slot * interval
+
+        with stage('db_query'):
+            queriedRows = list(Forecast.objects.filter(
+                city__in=missing,
+                forecast_for__gte=slotStart - interval,
+                forecast_for__lte=slotStart + 2 * interval
+            ).order_by('city', '-forecast_for').values(
+                'city', *ResponseBuilder.ROW_FIELDS
+            ))
+
+        fetched = {}
+        for row in queriedRows:
+            fetched.setdefault(row.pop('city'), []).append(row)
+
+        # Empty results are not cached so that the API is called for data.
+        fetched = {city: tuple(rows) for city, rows in fetched.items()}
+        for city, rows in fetched.items():
+            forecast_cache.set(city, slot, rows)
+        shared_forecast_cache.set_many(fetched, slot)
+
+        rowsByCity.update(fetched)
+
+        return rowsByCity
+
+    @staticmethod
+    def upstream_error(error):
+        """Returns the JSON error content and the HTTP status code for an
+        UpstreamError raised while fetching forecasts. A city which the API
+        does not know is a 404, and an open circuit (see
+        upstream.CircuitBreaker) or a used up API quota (see quota.py) is a
+        503. Other errors are a 502.
+        """
+        if error.status == 404:
+            return {
+                'error': f"Cannot find city '{error.city}'",
+                'error_code': 'city not found'
+            }, 404
+
+        if isinstance(error, (CircuitOpenError, QuotaExceededError)):
+            return {
+                'error': 'Forecasts are temporarily unavailable',
+                'error_code': 'upstream unavailable'
+                if isinstance(error, CircuitOpenError) else 'rate limited'
+            }, 503
+
+        return {
+            'error': 'Unable to fetch the forecast',
+            'error_code': 'upstream error'
+        }, 502
+
+    @staticmethod
+    def upstream_error_response(error):
+        """Returns the JSON error response for an UpstreamError (see
+        upstream_error). A 503 has a Retry-After header.
+        """
+        content, status = ResponseBuilder.upstream_error(error)
+        if status == 502:
+            logger.warning('%s', error)
+
+        response = ResponseBuilder.format_json_response(content, status)
+        if status == 503:
+            response['Retry-After'] = str(error.retryAfter)
+
+        return response
+
+    @staticmethod
+    def refreshing(city):
+        """Returns True if the city's forecasts are being fetched, or queued
+        to be fetched (see revalidate), in this process.
+        """
+        with _revalidatingLock:
+            return city in _revalidating or city_refreshes.in_flight(city)
+
+    @staticmethod
+    def invalidate_cache(city):
+        """Removes the cached forecast rows for a city from the in-process
+        cache and the cache shared between the workers. The in-process caches
+        of the other workers expire within config.FORECAST_CACHE_TTL_SECS.
+        """
+        forecast_cache.invalidate(city)
+        shared_forecast_cache.invalidate(city)
 
     @staticmethod
     def call_API(city):
@@ -161,159 +576,162 @@ class ResponseBuilder:
         * humidity: percentage
         * pressure: hPa
         * clouds: percentage
-        * forcast_for: integer in the format YYYYMMDDHHMM
+        * forcast_for: epoch (seconds since 1970-01-01 00:00 UTC)
+        Returns the number of rows written onto the database.
         """
-        response = requests.get(config.API_BASE_URL + city)
-        # If the response is not 200, then raise a 500 error. This assumes
-        # that the API URL defined in the config is correct as is the city
-        # name.
-        if not response.status_code == 200:
-            raise Exception(HttpResponseServerError())
+        # Raises upstream.UpstreamError (see upstream_error_response) if the
+        # API does not respond with a 200. This assumes that the API URL
+        # defined in the config is correct as is the city name.
+        apiData = upstream_client.fetch(city)
 
-        else:
-            apiData = json.loads(response.content)['list']
-            for data in apiData:
-                # Some of the data may need to converted to match that which
-                # is defined in the docstring.
-                # If a piece of data is not converted, it suggests that the
-                # API uses the datatype we want.
-
-                # Convert the forecast time epoch to local time.
-                forecastDate = time.strftime(
-                    '%Y%m%d%H%M',
-                    time.localtime(data['dt'])
-                )
+        return ResponseBuilder.ingest(city, apiData)
 
-                newData = Forecast.objects.create(
-                    city_id=city,
-                    forecast_for=forecastDate,
-                    humidity=data['main']['humidity'],
-                    pressure=data['main']['pressure'],
-                    clouds=data['clouds']['all'],
-                    temperature=data['main']['temp']
-                )
-                newData.save()
+    @staticmethod
+    def ingest(city, apiData):
+        """Stores the forecasts in apiData (the "list" in the API response)
+        for city and removes the city's cached rows now that fresh rows have
+        been written. Returns the number of rows written.
+        """
+        rowsWritten = ResponseBuilder.store_forecasts(city, apiData)
+        ResponseBuilder.invalidate_cache(city)
+
+        # Remove old forecasts if automatic compaction is enabled.
+        maybe_compact()
+
+        return rowsWritten
+
+    @staticmethod
+    def store_forecasts(city, apiData):
+        """Writes the forecasts in apiData (the "list" in the API response)
+        for city onto the database in a single transaction using one batched
+        upsert, replacing any existing forecast for the same city and time.
+        Returns the number of rows written.
+        """
+        newData = []
+        for data in apiData:
+            # Some of the data may need to converted to match that which
+            # is defined in the call_API docstring.
+            # If a piece of data is not converted, it suggests that the
+            # API uses the datatype we want (e.g: the forecast time is an
+            # epoch).
+            newData.append(Forecast(
+                city_id=city,
+                forecast_for=data['dt'],
+                humidity=data['main']['humidity'],
+                pressure=data['main']['pressure'],
+                clouds=data['clouds']['all'],
+                temperature=data['main']['temp']
+            ))
+
+        rowsWritten = Forecast.objects.upsert(newData)
+
+        logger.info('Stored %d forecasts for %s', rowsWritten, city)
+
+        return rowsWritten
 
     @staticmethod
     def queryset_filter(querySet, forecastDate, timeField):
         """Given a querySet which contains a timeField, find the row of data
         which is nearest to the forecastDate.
         Arguments:
-        querySet: Django query set
-        forecastDate: date and time in the formation YYYYMMDDHHMM.
-        timeField: a field in the querySet which contains a list of times in
-                   the format YYYYMMDDHHMM.
+        querySet: list of rows (dictionaries) ordered by timeField from the
+                  latest to the earliest.
+        forecastDate: date and time as an epoch.
+        timeField: a field in the querySet which contains times as epochs.
         """
 
-        if len(querySet) == 1:
-            return querySet[0]
-        else:
-            querySet = querySet.order_by('-'+timeField)
-            initDiff = abs(getattr(querySet[0], timeField) - forecastDate)
-
-        for dataRow in range(1, len(querySet)):
-            querySet[dataRow].forecast_for
-            diff = abs(getattr(querySet[dataRow], timeField) - forecastDate)
-            if diff < initDiff:
-                initDiff = diff
-
-            else:
-                return querySet[dataRow - 1]
-        else:
-            return querySet[len(querySet) - 1]
+        # The rows are already in memory (from the cache or a single
+        # values() query) so the nearest row is found in one pass. min()
+        # returns the first of any rows equally near, i.e. the latest.
+        return min(querySet, key=lambda row: abs(row[timeField] - forecastDate))
 
     @staticmethod
     def queryset_to_dict(querySet):
-        """Converts the querySet to a dictionary."""
+        """Converts the querySet row to a new dictionary."""
 
         fields = ['humidity', 'pressure', 'temperature', 'clouds']
 
-        return {field: getattr(querySet, field) for field in fields}
+        return {field: querySet[field] for field in fields}
 
     def format_units(self, querySet):
         """Checks the paramters defined in the URL for any any units that need
         to be converted amd adds the unit type at the end of each unit.
         """
-
-        # Add the "%" unit symbol to humidity
-        querySet['humidity'] = str(querySet['humidity']) + '%'
-
-        # Format temperature units.
         # Temperature is stored as kelvins in the database.
         # As a default, the HTTP response will display temperature as celsius.
-        if self.request.get('temp_units'):
-            tempUnits = self.request.get('temp_units')
+        tempUnits = self.request.get('temp_units') or 'C'
 
-            # Validate the units.
-            if tempUnits not in ('K', 'C', 'F'):
-                response = {
-                    'error': 'Invalid temperature units',
-                    'error_code': 'invalid_units'
-                }
+        # Validate the units.
+        if tempUnits not in self.TEMP_UNITS:
+            return self.INVALID_TEMP_UNITS()
 
-                return self.format_json_response(response, 400)
+        # Pressure is stored as hPa in the database.
+        pressureUnits = (self.request.get('pressure_units') or 'hPa').lower()
 
-            if tempUnits == 'K':
-                querySet['temperature'] = str(querySet['temperature']) + 'K'
-            else:
-                querySet['temperature'] = corefunctions.UnitConversion(
-                    querySet['temperature'],
-                    'K',
-                    tempUnits,
-                    showUnits=True
-                ).convert_temperature()
+        # Validate the units.
+        if pressureUnits not in self.PRESSURE_UNITS:
+            return self.INVALID_PRESSURE_UNITS()
+
+        with stage('unit_formatting'):
+            values = self.format_values(querySet, tempUnits, pressureUnits)
+
+        return self.format_json_response(values, 200)
+
+    @staticmethod
+    def format_values(querySet, tempUnits='C', pressureUnits='hpa'):
+        """Converts the values in the querySet row (dictionary) to
+        tempUnits and pressureUnits (which must be valid) and adds the unit
+        type at the end of each value. Returns the row.
+        """
+        # Add the "%" unit symbol to humidity
+        querySet['humidity'] = str(querySet['humidity']) + '%'
 
+        # Format temperature units.
+        if tempUnits == 'K':
+            querySet['temperature'] = str(querySet['temperature']) + 'K'
         else:
-            querySet['temperature'] = corefunctions.UnitConversion(
+            querySet['temperature'] = corefunctions.convert_unit(
+                'temperature',
                 querySet['temperature'],
                 'K',
-                'C',
+                tempUnits,
                 showUnits=True
-            ).convert_temperature()
-
-        # Format temperature units.
-        # Temperature is stored as kelvins in the database.
-        if self.request.get('pressure_units'):
-            pressureUnits = self.request.get('pressure_units').lower()
-
-            # Validate the units.
-            supportedUnits = ['pa', 'bar', 'atm', 'torr', 'psi', 'hpa']
-            if pressureUnits not in supportedUnits:
-                response = {
-                    'error': 'Invalid pressure units',
-                    'error_code': 'invalid_units'
-                }
-
-                return self.format_json_response(response, 400)
-
-            # hPa is the default unit, so no conversions will take place for
-            # hPa.
-            if pressureUnits == 'hPa':
-                querySet['pressure'] = str(querySet['pressure']) + 'hPa'
-            else:
-                querySet['pressure'] = corefunctions.UnitConversion(
-                    querySet['pressure'],
-                    'hPa',
-                    pressureUnits,
-                    showUnits=True
-                ).convert_pressure()
+            )
 
-        else:
+        # Format pressure units.
+        # hPa is the default unit, so no conversions will take place for
+        # hPa.
+        if pressureUnits == 'hpa':
             querySet['pressure'] = str(querySet['pressure']) + 'hPa'
+        else:
+            querySet['pressure'] = corefunctions.convert_unit(
+                'pressure',
+                querySet['pressure'],
+                'hPa',
+                pressureUnits,
+                showUnits=True
+            )
 
         # Format Cloud Value
-        if querySet['clouds'] <= 10:
-            querySet['clouds'] = 'clear sky'
-        elif querySet['clouds'] <= 36:
-            querySet['clouds'] = 'few clouds'
-        elif querySet['clouds'] <= 60:
-            querySet['clouds'] = 'scattered clouds'
-        elif querySet['clouds'] <= 84:
-            querySet['clouds'] = 'broken clouds'
-        else:
-            querySet['clouds'] = 'overcast'
+        querySet['clouds'] = ResponseBuilder.cloud_description(
+            querySet['clouds']
+        )
 
-        return self.format_json_response(querySet, 200)
+        return querySet
+
+    @staticmethod
+    def cloud_description(clouds):
+        """Describes the cloud cover given as a percentage."""
+        if clouds <= 10:
+            return 'clear sky'
+        elif clouds <= 36:
+            return 'few clouds'
+        elif clouds <= 60:
+            return 'scattered clouds'
+        elif clouds <= 84:
+            return 'broken clouds'
+        else:
+            return 'overcast'
 
     @staticmethod
     def format_json_response(response=None, status=200):
@@ -321,23 +739,12 @@ class ResponseBuilder:
         response [dict]: response to be converted to JSON.
         status [int]: HTTP status code.
         """
-        contentType = 'application/json; charset=utf-8'
-
         if response:
-            return HttpResponse(
-                json.dumps(response),
-                status=status,
-                content_type=contentType,
-            )
+            return json_response(response, status)
 
         # Handle generic errors
         if status == 500:
-            return HttpResponse(
-                json.dumps({
-                    'error': 'Something went wrong',
-                    'error_code': 'internal server error'
-                })
-            )
+            return ResponseBuilder.SERVER_ERROR()
 
     def get_response(self):
         """Gets the HTTP response"""
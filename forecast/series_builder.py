@@ -0,0 +1,233 @@
+"""Builds the response for the forecast series view: every forecast stored for
+a city between two times in a single JSON HttpResponse, optionally resampled
+to a fixed step.
+"""
+
+# IMPORTS
+# Python Core Imports
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+# Third Party Imports
+
+# Local Imports
+from . import config
+import corefunctions
+from .models import Forecast
+from .response_builder import ResponseBuilder
+from .upstream import UpstreamError
+
+
+class SeriesBuilder:
+    """Builds the response for the forecast series view.
+    Arguments:
+    request [obj]: HTTP request object, the following parameters are read:
+        * from: (default=now) ISO 8601 time of the earliest forecast.
+        * to: (default=config.MAX_FORCAST_DAYS days from now) ISO 8601 time
+              of the latest forecast.
+        * step: minutes between each forecast returned. The forecasts are
+                linearly interpolated from the stored forecasts. If not set,
+                the stored forecasts are returned.
+        * temp_units, pressure_units: as for the forecast view.
+    city [str]: city name
+    """
+
+    # Numeric fields in each forecast.
+    VALUE_FIELDS = ('humidity', 'pressure', 'temperature', 'clouds')
+
+    def __init__(self, request, city):
+        # Arguments attached to the self object.
+        self.request = request.GET
+        self.city = city
+
+        # Build the response
+        self._response = self._set_response()
+
+    def _set_response(self):
+        """Sets the HTTP response"""
+        canonicalCity = corefunctions.city_registry.lookup(self.city)
+        if canonicalCity is None:
+            return self.error_response(
+                f"Cannot find city '{self.city}'", 'city not found', 404
+            )
+        self.city = canonicalCity
+
+        now = datetime.now()
+        try:
+            fromDate = self.date_param('from', now)
+            toDate = self.date_param(
+                'to',
+                now + timedelta(days=config.MAX_FORCAST_DAYS)
+            )
+        except ValueError:
+            return ResponseBuilder.INVALID_DATE()
+
+        if toDate < fromDate:
+            return self.error_response(
+                '"to" is before "from"', 'invalid date'
+            )
+
+        fromEpoch = corefunctions.datetime_to_epoch(fromDate)
+        toEpoch = corefunctions.datetime_to_epoch(toDate)
+
+        step = self.request.get('step')
+        if step:
+            try:
+                step = int(step)
+                if step <= 0:
+                    raise ValueError(step)
+            except ValueError:
+                return self.error_response(
+                    'Step must be a whole number of minutes', 'invalid step'
+                )
+
+            if (toEpoch - fromEpoch) // (step * 60) >= \
+                    config.SERIES_MAX_POINTS:
+                return self.error_response(
+                    f'Step too small, at most {config.SERIES_MAX_POINTS} '
+                    'forecasts can be returned',
+                    'invalid step'
+                )
+
+        tempUnits = self.request.get('temp_units', 'C')
+        if tempUnits not in ResponseBuilder.TEMP_UNITS:
+            return ResponseBuilder.INVALID_TEMP_UNITS()
+
+        pressureUnits = self.request.get('pressure_units', 'hPa').lower()
+        if pressureUnits not in ResponseBuilder.PRESSURE_UNITS:
+            return ResponseBuilder.INVALID_PRESSURE_UNITS()
+
+        try:
+            rows = self.series_data(fromEpoch, toEpoch, now)
+        except UpstreamError as error:
+            return ResponseBuilder.upstream_error_response(error)
+        if step:
+            rows = self.resample(rows, fromEpoch, toEpoch, step * 60)
+
+        return ResponseBuilder.format_json_response({
+            'city': self.city,
+            'units': {
+                'humidity': '%',
+                'pressure': corefunctions.conversion_registry.UNIT_SYMBOLS[
+                    pressureUnits
+                ],
+                'temperature': tempUnits,
+            },
+            'forecasts': self.format_rows(rows, tempUnits, pressureUnits),
+        }, 200)
+
+    def date_param(self, name, default):
+        """Returns the request parameter name as a datetime, or default if it
+        is not set. Raises a ValueError if the date is invalid.
+        """
+        value = self.request.get(name)
+        if not value:
+            return default
+
+        return corefunctions.parse_date_string(value)
+
+    def series_data(self, fromEpoch, toEpoch, now):
+        """Returns the forecast rows (as dictionaries) for the city between
+        fromEpoch and toEpoch ordered from the earliest to the latest, using
+        a single range query. If there are no rows and the range has not
+        passed, the forecasts are fetched from the API first (raising an
+        UpstreamError if they cannot be fetched).
+        """
+        def rows_in_range():
+            return list(Forecast.objects.filter(
+                city=self.city,
+                forecast_for__gte=fromEpoch,
+                forecast_for__lte=toEpoch
+            ).order_by('forecast_for').values(*ResponseBuilder.ROW_FIELDS))
+
+        rows = rows_in_range()
+
+        if not rows and toEpoch >= corefunctions.datetime_to_epoch(now):
+            ResponseBuilder.refresh_forecasts(self.city, rows_in_range)
+            rows = rows_in_range()
+
+        return rows
+
+    @classmethod
+    def resample(cls, rows, fromEpoch, toEpoch, stepSecs):
+        """Returns forecast rows every stepSecs seconds from fromEpoch to
+        toEpoch, linearly interpolated between the nearest rows either side.
+        Times outside the first and last rows are left out.
+        Arguments:
+        rows: list of rows ordered by forecast_for from the earliest to the
+              latest.
+        """
+        if not rows:
+            return []
+
+        times = [row['forecast_for'] for row in rows]
+
+        # Start at the first step within the rows.
+        start = fromEpoch
+        if start < times[0]:
+            start += -(-(times[0] - start) // stepSecs) * stepSecs
+
+        resampled = []
+        for forecastFor in range(start, min(toEpoch, times[-1]) + 1,
+                                 stepSecs):
+            idx = bisect_left(times, forecastFor)
+            after = rows[idx]
+
+            if times[idx] == forecastFor:
+                resampled.append(after)
+                continue
+
+            before = rows[idx - 1]
+            weight = ((forecastFor - times[idx - 1])
+                      / (times[idx] - times[idx - 1]))
+
+            row = {field: before[field]
+                   + (after[field] - before[field]) * weight
+                   for field in cls.VALUE_FIELDS}
+            row['forecast_for'] = forecastFor
+            resampled.append(row)
+
+        return resampled
+
+    @staticmethod
+    def format_rows(rows, tempUnits, pressureUnits):
+        """Converts the units of all the rows in batch and returns a list of
+        forecasts for the response.
+        """
+        temperatures = [row['temperature'] for row in rows]
+        if tempUnits != 'K':
+            temperatures = corefunctions.convert_units(
+                'temperature', temperatures, 'K', tempUnits
+            )
+
+        pressures = [row['pressure'] for row in rows]
+        if pressureUnits != 'hpa':
+            pressures = corefunctions.convert_units(
+                'pressure', pressures, 'hPa', pressureUnits
+            )
+
+        return [
+            {
+                'time': corefunctions.epoch_to_datetime(
+                    row['forecast_for']
+                ).isoformat(),
+                'humidity': row['humidity'],
+                'pressure': float(pressure),
+                'temperature': float(temperature),
+                'clouds': ResponseBuilder.cloud_description(row['clouds']),
+            }
+            for row, temperature, pressure in zip(rows, temperatures,
+                                                  pressures)
+        ]
+
+    @staticmethod
+    def error_response(message, errorCode, status=400):
+        """Returns a JSON error response."""
+        return ResponseBuilder.format_json_response(
+            {'error': message, 'error_code': errorCode},
+            status
+        )
+
+    def get_response(self):
+        """Gets the HTTP response"""
+        return self._response
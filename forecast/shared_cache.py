@@ -0,0 +1,190 @@
+"""A forecast cache shared between all the worker processes.
+Uses Django's cache framework (the cache defined by config.FORECAST_CACHE_ALIAS
+in settings.CACHES) so that any backend can be used, e.g: memcached or Redis
+in production, or a file based or local memory cache for development and
+tests.
+
+Entries are the forecast rows for a city and time slot (see
+forecast_cache.time_slot) and expire at the next API interval boundary, so a
+slot fetched by one worker is served warm to all the others.
+
+The cache also holds the number of requests made for each city, which is used
+to rank the cities when prefetching forecasts for the most requested cities.
+"""
+
+# IMPORTS
+# Python Core Imports
+from datetime import datetime, timedelta
+from urllib.parse import quote
+import time
+
+# Third Party Imports
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Local Imports
+from . import config
+from .forecast_cache import next_slot_boundary, time_slot
+
+# Increase when the fields of the cached rows (ResponseBuilder.ROW_FIELDS)
+# change.
+ROW_VERSION = 2
+
+
+class SharedForecastCache:
+    """Caches forecast rows keyed on (city, time slot) in a Django cache.
+    Arguments:
+        * alias [str]: the name of the cache in settings.CACHES.
+        * clock [function]: (default=time.time) returns the current epoch
+                            time.
+    """
+
+    def __init__(self, alias, clock=time.time):
+        self.alias = alias
+        self.clock = clock
+
+    @property
+    def cache(self):
+        """The Django cache. Retrieved on each use as cache connections are
+        local to a thread.
+        """
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(city, slot):
+        """Returns the cache key for a city and time slot. The city is quoted
+        as some backends (memcached) do not accept spaces in keys. The version
+        (ROW_VERSION) is part of the key so that rows cached in an older shape
+        are not read after a deploy.
+        """
+        return f'forecast:v{ROW_VERSION}:{quote(city)}:{slot}'
+
+    def get(self, city, slot):
+        """Returns the cached rows for the city and time slot or None."""
+        return self.cache.get(self.make_key(city, slot))
+
+    def set(self, city, slot, rows):
+        """Caches rows for the city and time slot until the next API interval
+        boundary.
+        """
+        now = self.clock()
+        timeout = next_slot_boundary(now) - int(now)
+
+        self.cache.set(self.make_key(city, slot), rows, timeout)
+
+    def get_many(self, cities, slot):
+        """Returns a dictionary of city to the cached rows for the time slot
+        for each of cities which is cached, using a single cache call.
+        """
+        keys = {self.make_key(city, slot): city for city in cities}
+
+        return {
+            keys[key]: rows
+            for key, rows in self.cache.get_many(list(keys)).items()
+        }
+
+    def set_many(self, rowsByCity, slot):
+        """Caches the rows for each city (a dictionary of city to rows) for
+        the time slot until the next API interval boundary, using a single
+        cache call.
+        """
+        if not rowsByCity:
+            return
+
+        now = self.clock()
+        timeout = next_slot_boundary(now) - int(now)
+
+        self.cache.set_many(
+            {self.make_key(city, slot): rows
+             for city, rows in rowsByCity.items()},
+            timeout
+        )
+
+    def invalidate(self, city):
+        """Removes the cached entries for a city.
+        Keys cannot be matched against a pattern in every backend, so every
+        slot which could be requested (from the start of the previous day to
+        config.MAX_FORCAST_DAYS into the future) is removed.
+        """
+        now = datetime.fromtimestamp(self.clock())
+        firstSlot = time_slot(now - timedelta(days=1))
+        lastSlot = time_slot(now + timedelta(days=config.MAX_FORCAST_DAYS))
+
+        self.cache.delete_many([
+            self.make_key(city, slot)
+            for slot in range(firstSlot, lastSlot + 2)
+        ])
+
+    def clear(self):
+        """Removes all the entries from the cache."""
+        self.cache.clear()
+
+
+class CityRequestCounter:
+    """Counts the requests made for each city in a Django cache. Counts are
+    reset config.REQUEST_COUNT_WINDOW_HOURS after the first request for a
+    city.
+    Requests are only counted when the cache is shared between processes, as
+    the counts are read by the prefetch_forecasts command which runs in a
+    process of its own.
+    Arguments:
+        * alias [str]: the name of the cache in settings.CACHES.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        """The Django cache."""
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        """Whether the cache is shared between processes (the local memory
+        and dummy caches are not).
+        """
+        return not isinstance(self.cache, (LocMemCache, DummyCache))
+
+    @staticmethod
+    def make_key(city):
+        """Returns the cache key for a city."""
+        return f'requests:{quote(city)}'
+
+    def increment(self, city):
+        """Adds one to the number of requests made for a city, if the cache
+        is shared.
+        """
+        if not self.shared:
+            return
+
+        key = self.make_key(city)
+        timeout = config.REQUEST_COUNT_WINDOW_HOURS * 3600
+
+        # add() only sets the count if the key does not exist, incr() raises
+        # a ValueError if the key has expired in the meantime.
+        if not self.cache.add(key, 1, timeout):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout)
+
+    def most_requested(self, cities, limit):
+        """Returns up to limit cities, from cities, ordered by the number of
+        requests made for each city. Cities which have not been requested are
+        not returned.
+        """
+        keys = {self.make_key(city): city for city in cities}
+        counts = self.cache.get_many(list(keys))
+
+        ranked = sorted(
+            counts.items(),
+            key=lambda item: (-item[1], keys[item[0]])
+        )
+
+        return [keys[key] for key, count in ranked[:limit]]
+
+
+shared_forecast_cache = SharedForecastCache(config.FORECAST_CACHE_ALIAS)
+city_request_counts = CityRequestCounter(config.FORECAST_CACHE_ALIAS)
@@ -0,0 +1,24 @@
+"""Signal receivers for the forecast app.
+Keeps the forecast caches consistent with the database by removing any cached
+rows for a city when a forecast for that city is saved or deleted.
+"""
+
+# IMPORTS
+# Python Core Imports
+
+# Third Party Imports
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Local Imports
+from .forecast_cache import forecast_cache
+from .models import Forecast
+from .shared_cache import shared_forecast_cache
+
+
+@receiver(post_save, sender=Forecast)
+@receiver(post_delete, sender=Forecast)
+def invalidate_forecast_cache(sender, instance, **kwargs):
+    """Removes the cached forecast rows for the city of instance."""
+    forecast_cache.invalidate(instance.city_id)
+    shared_forecast_cache.invalidate(instance.city_id)
@@ -0,0 +1,137 @@
+"""Deduplicates concurrent work, e.g: fetching the forecasts for a city from
+the API.
+    * SingleFlight: coalesces concurrent calls for the same key within a
+      process so that only one call runs and every other caller waits for,
+      and reuses, its result.
+    * refresh_lock: a lock (a row in models.RefreshLock) on a city shared
+      between all the processes using the database.
+"""
+
+# IMPORTS
+# Python Core Imports
+from contextlib import contextmanager
+import threading
+import time
+
+# Third Party Imports
+from django.db import IntegrityError, transaction
+
+# Local Imports
+from . import config
+from .models import RefreshLock
+
+
+class _Call:
+    """A call in progress."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Number of other callers waiting for the result.
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls which share a key. While a call for a key
+    is in progress, any other calls for the same key wait for it to complete
+    and receive its result (or exception) rather than running the function
+    again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        """Calls function(*args, **kwargs) unless a call for key is already
+        in progress, in which case waits for that call and returns its
+        result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not isLeader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key):
+        """Returns True if a call for key is in progress."""
+        with self._lock:
+            return key in self._calls
+
+    def waiting(self, key):
+        """Returns the number of callers waiting for the call in progress for
+        key (0 if there is no call in progress).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+
+def acquire_refresh_lock(city, now):
+    """Tries to take the lock on city at the epoch time now without waiting.
+    Returns True if the lock was taken.
+    A lock held for longer than config.REFRESH_LOCK_TIMEOUT_SECS is treated
+    as abandoned (e.g: the process holding it died) and is taken over.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                RefreshLock.objects.create(city_id=city, acquired_at=now)
+            return True
+        except IntegrityError:
+            # Take over an abandoned lock. Only one process can delete the
+            # row, the others will fail to create it.
+            deleted, _ = RefreshLock.objects.filter(
+                city_id=city,
+                acquired_at__lt=now - config.REFRESH_LOCK_TIMEOUT_SECS
+            ).delete()
+            if not deleted:
+                return False
+
+    return False
+
+
+def release_refresh_lock(city, acquiredAt):
+    """Releases the lock on city taken at the epoch time acquiredAt."""
+    RefreshLock.objects.filter(city_id=city, acquired_at=acquiredAt).delete()
+
+
+@contextmanager
+def refresh_lock(city, clock=time.time, sleep=time.sleep):
+    """Holds the lock on city for the duration of the with block, waiting
+    for any other process holding the lock to release it first.
+    """
+    while True:
+        now = clock()
+        if acquire_refresh_lock(city, now):
+            break
+        sleep(config.REFRESH_LOCK_POLL_SECS)
+
+    try:
+        yield
+    finally:
+        release_refresh_lock(city, now)
+
+
+city_refreshes = SingleFlight()
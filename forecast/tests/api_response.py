@@ -0,0 +1,39 @@
+"""Builds responses in the format returned by the Open Weather Map forecast
+API. Used by the tests to stand in for the API.
+"""
+
+# IMPORTS
+# Python Core Imports
+import json
+
+# Third Party Imports
+
+# Local Imports
+
+
+def api_data(start, count=40, interval=10800):
+    """Returns the content of an API response (as a dictionary) containing
+    count forecasts, one every interval seconds from the epoch time start.
+    The values of each forecast are derived from its index.
+    """
+    return {
+        'cod': '200',
+        'cnt': count,
+        'list': [
+            {
+                'dt': start + idx * interval,
+                'main': {
+                    'temp': 280 + idx,
+                    'pressure': 1000 + idx,
+                    'humidity': idx,
+                },
+                'clouds': {'all': idx},
+            }
+            for idx in range(count)
+        ],
+    }
+
+
+def api_content(start, count=40, interval=10800):
+    """Returns the content of an API response as bytes."""
+    return json.dumps(api_data(start, count, interval)).encode()
@@ -0,0 +1,75 @@
+"""A local HTTP server standing in for the Open Weather Map forecast API.
+Used by the tests so that the API client can be tested without a network
+connection.
+    * Cities in StubAPI.responses respond with the status and content given.
+    * Any other city responds with 40 forecasts starting at StubAPI.start.
+"""
+
+# IMPORTS
+# Python Core Imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import threading
+
+# Third Party Imports
+
+# Local Imports
+from .api_response import api_content
+
+
+class StubAPI:
+    """Runs the stub API on a free local port for the duration of a with
+    block.
+    Arguments:
+        * start [int]: epoch time of the first forecast returned.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.responses = {}
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections alive between requests.
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                city = query.get('q', [''])[0]
+                with stub._lock:
+                    stub.requests.append(city)
+
+                status, content = stub.responses.get(
+                    city,
+                    (200, api_content(stub.start))
+                )
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/forecast'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,193 @@
+"""Unittests for views.forecast_async.
+The database is accessed from the database thread pool, so the tests commit
+their data (TransactionTestCase) for it to be visible to the pool's
+connections.
+The module includes the following tests:
+    * test_cached_response: the response matches the data in the database.
+    * test_invalid_city: an invalid city returns a 404.
+    * test_concurrent_cold_requests: concurrent requests for a city with no
+      data share a single API call.
+    * test_upstream_outage: an older forecast is served when the API fails.
+    * test_built_once_after_refresh: a request which fetches the forecasts
+      is counted once and a fetch without the forecasts requested returns an
+      error.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime, timedelta
+import asyncio
+import json
+from unittest import mock
+
+# Third Party Imports
+from django.test import AsyncRequestFactory, TransactionTestCase
+
+# Local Imports
+import corefunctions
+from .. import config
+from ..forecast_cache import forecast_cache
+from ..models import Cities, Forecast
+from ..shared_cache import city_request_counts, shared_forecast_cache
+from ..upstream import CircuitOpenError, upstream_client
+from ..views import forecast_async
+from .stub_api import StubAPI
+
+
+class TestForecastAsync(TransactionTestCase):
+    """Unittests for the asynchronous forecast view."""
+
+    def setUp(self):
+        # The tables are emptied after each test, including the cities
+        # created by the migrations.
+        for city in ['london', 'leeds']:
+            Cities.objects.get_or_create(name=city)
+
+        self.factory = AsyncRequestFactory()
+        self.now = datetime.now()
+        forecast_cache.clear()
+        shared_forecast_cache.clear()
+
+    async def test_cached_response(self):
+        """Test that the response contains the data in the database."""
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: Forecast.objects.create(
+                humidity=10,
+                pressure=12,
+                temperature=3,
+                forecast_for=corefunctions.datetime_to_epoch(self.now),
+                city_id='london',
+                clouds=5
+            )
+        )
+
+        response = await forecast_async(
+            self.factory.get('/forecast/london'),
+            'London'
+        )
+        content = json.loads(response.content)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(content['temperature'], '-270.15C')
+        self.assertEquals(content['clouds'], 'clear sky')
+
+    async def test_invalid_city(self):
+        """Test that an invalid city returns a 404."""
+        response = await forecast_async(
+            self.factory.get('/forecast/westeros'),
+            'westeros'
+        )
+        self.assertEquals(response.status_code, 404)
+
+    async def test_concurrent_cold_requests(self):
+        """Test that concurrent requests for a city without data make one
+        API call and all receive the forecast.
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: Forecast.objects.filter(city='leeds').delete()
+        )
+
+        with StubAPI(int(self.now.timestamp())) as stub, \
+                mock.patch.object(upstream_client, 'baseUrl', stub.url):
+            responses = await asyncio.gather(*[
+                forecast_async(self.factory.get('/forecast/leeds'), 'leeds')
+                for _ in range(50)
+            ])
+
+        self.assertEquals(stub.requests, ['leeds'])
+        self.assertTrue(
+            all(response.status_code == 200 for response in responses)
+        )
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    async def test_upstream_outage(self):
+        """Test that when the API fails, a forecast up to
+        config.OUTAGE_STALE_MAX_MINS old is served as stale, as by the
+        synchronous view, and that a 503 is returned without one.
+        """
+        refresh = mock.patch(
+            'forecast.views.refresh_forecasts_async',
+            side_effect=CircuitOpenError('london', 12)
+        )
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None,
+            lambda: Forecast.objects.filter(city='london').delete()
+        )
+
+        with refresh:
+            response = await forecast_async(
+                self.factory.get('/forecast/london'),
+                'london'
+            )
+        self.assertEquals(response.status_code, 503)
+        self.assertEquals(response['Retry-After'], '12')
+
+        await loop.run_in_executor(
+            None,
+            lambda: Forecast.objects.create(
+                humidity=1,
+                pressure=1,
+                temperature=1,
+                forecast_for=corefunctions.datetime_to_epoch(
+                    self.now - timedelta(hours=12)
+                ),
+                city_id='london',
+                clouds=1
+            )
+        )
+        with refresh:
+            response = await forecast_async(
+                self.factory.get('/forecast/london'),
+                'london'
+            )
+        self.assertEquals(response.status_code, 200)
+        self.assertIn('X-Forecast-Stale', response)
+        self.assertEquals(
+            json.loads(response.content)['temperature'], '-272.15C'
+        )
+
+    async def test_built_once_after_refresh(self):
+        """Test that the response built after fetching the forecasts does
+        not count the request again, and that a 502 is returned if the fetch
+        did not store the forecasts requested.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None,
+            lambda: Forecast.objects.filter(city='leeds').delete()
+        )
+
+        async def refresh(city, hasData):
+            await loop.run_in_executor(
+                None,
+                lambda: Forecast.objects.create(
+                    humidity=1,
+                    pressure=1,
+                    temperature=1,
+                    forecast_for=corefunctions.datetime_to_epoch(self.now),
+                    city_id=city,
+                    clouds=1
+                )
+            )
+
+        with mock.patch('forecast.views.refresh_forecasts_async',
+                        side_effect=refresh), \
+                mock.patch.object(city_request_counts,
+                                  'increment') as increment:
+            response = await forecast_async(
+                self.factory.get('/forecast/Leeds'),
+                'Leeds'
+            )
+        self.assertEquals(response.status_code, 200)
+        increment.assert_called_once_with('leeds')
+
+        with mock.patch('forecast.views.refresh_forecasts_async'), \
+                self.assertLogs('forecast', 'WARNING'):
+            response = await forecast_async(
+                self.factory.get('/forecast/london'),
+                'london'
+            )
+        self.assertEquals(response.status_code, 502)
@@ -0,0 +1,223 @@
+"""Unittests for the batch_builder module (/forecast/batch).
+The module includes the following tests:
+    * test_single_query: the forecasts for all the cities are read with a
+      single query and unknown cities have an error.
+    * test_post: the cities can be sent as a JSON body.
+    * test_invalid_requests: invalid requests return a 400.
+    * test_fetches_missing_forecasts: cities without forecasts are fetched
+      from the API and a failed city does not fail the batch.
+    * test_max_fetches: cities past config.BATCH_MAX_FETCHES are fetched in
+      the background and returned as pending.
+    * test_circuit_open: cities past config.BATCH_MAX_FETCHES are not
+      pending while the circuit is open.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime
+import json
+from unittest import mock
+
+# Third Party Imports
+from django.test import TestCase
+from django.urls import reverse
+
+# Local Imports
+from .. import config
+import corefunctions
+from ..forecast_cache import forecast_cache
+from ..models import Forecast
+from ..response_builder import ResponseBuilder
+from ..shared_cache import shared_forecast_cache
+from ..upstream import UpstreamError
+
+
+class TestBatchBuilder(TestCase):
+    """Unittests for the batch forecast view."""
+
+    def setUp(self):
+        forecast_cache.clear()
+        shared_forecast_cache.clear()
+        Forecast.objects.filter(
+            city__in=['london', 'leeds', 'york', 'bristol']
+        ).delete()
+
+        self.now = datetime.now()
+        self.create_forecast('london', 1)
+        self.create_forecast('leeds', 2)
+
+    def create_forecast(self, city, temperature):
+        Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=temperature,
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
+            clouds=1,
+            city_id=city
+        )
+
+    def test_single_query(self):
+        """Test that the forecasts for all the cities are read with one
+        query and that an unknown city does not fail the batch.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('forecast_batch'),
+                {'cities': 'London,leeds,westeros,london'}
+            )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(list(forecasts), ['London', 'leeds', 'westeros',
+                                            'london'])
+        self.assertEquals(
+            forecasts['London'],
+            {
+                'humidity': '1.0%',
+                'pressure': '1.0hPa',
+                'temperature': '-272.15C',
+                'clouds': 'clear sky',
+            }
+        )
+        self.assertEquals(forecasts['leeds']['temperature'], '-271.15C')
+        self.assertEquals(forecasts['westeros']['error_code'],
+                          'city not found')
+
+        # The forecasts are cached for the next batch.
+        with self.assertNumQueries(0):
+            self.client.get(reverse('forecast_batch'), {'cities': 'leeds'})
+
+    def test_post(self):
+        """Test that the cities can be sent in a JSON body."""
+        response = self.client.post(
+            reverse('forecast_batch') + '?temp_units=K',
+            json.dumps({'cities': ['london', 'leeds']}),
+            content_type='application/json'
+        )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(forecasts['leeds']['temperature'], '2.0K')
+
+    def test_invalid_requests(self):
+        """Test that invalid requests return a 400."""
+        url = reverse('forecast_batch')
+
+        self.assertEquals(self.client.get(url).status_code, 400)
+        self.assertEquals(
+            self.client.get(url, {'cities': 'london', 'temp_units': 'X'})
+            .status_code,
+            400
+        )
+        self.assertEquals(
+            self.client.post(url, 'cities', content_type='application/json')
+            .status_code,
+            400
+        )
+        self.assertEquals(
+            self.client.post(url, json.dumps({'cities': 'london'}),
+                             content_type='application/json').status_code,
+            400
+        )
+
+        with mock.patch.object(config, 'BATCH_MAX_CITIES', 1):
+            self.assertEquals(
+                self.client.get(url, {'cities': 'london,leeds'}).status_code,
+                400
+            )
+
+    @mock.patch.object(config, 'BATCH_FETCH_WORKERS', 1)
+    def test_fetches_missing_forecasts(self):
+        """Test that cities without forecasts are fetched from the API and
+        that a city which cannot be fetched has an error.
+        """
+        Forecast.objects.filter(city='leeds').delete()
+
+        def call_API(city):
+            if city == 'york':
+                raise UpstreamError(city, 503)
+            if city == 'bristol':
+                raise UpstreamError(city, 404)
+            self.create_forecast(city, 3)
+            return 1
+
+        with mock.patch.object(ResponseBuilder, 'call_API',
+                               side_effect=call_API), \
+                self.assertLogs('forecast.batch_builder', 'WARNING') as logs:
+            response = self.client.get(
+                reverse('forecast_batch'),
+                {'cities': 'london,leeds,york,bristol'}
+            )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(forecasts['london']['temperature'], '-272.15C')
+        self.assertEquals(forecasts['leeds']['temperature'], '-270.15C')
+        self.assertEquals(forecasts['york']['error_code'], 'upstream error')
+        self.assertEquals(forecasts['bristol']['error_code'],
+                          'city not found')
+        self.assertEquals([record.levelname for record in logs.records],
+                          ['WARNING', 'WARNING'])
+
+    @mock.patch.object(config, 'BATCH_FETCH_WORKERS', 1)
+    @mock.patch.object(config, 'BATCH_MAX_FETCHES', 1)
+    def test_max_fetches(self):
+        """Test that only the first city without forecasts is fetched during
+        the request and that the others are queued and pending.
+        """
+        Forecast.objects.filter(city='leeds').delete()
+
+        def call_API(city):
+            self.create_forecast(city, 3)
+            return 1
+
+        with mock.patch.object(ResponseBuilder, 'call_API',
+                               side_effect=call_API) as callAPI, \
+                mock.patch.object(ResponseBuilder,
+                                  'revalidate') as revalidate:
+            response = self.client.get(
+                reverse('forecast_batch'),
+                {'cities': 'london,leeds,york'}
+            )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            [call[0][0] for call in callAPI.call_args_list], ['leeds']
+        )
+        self.assertEquals(forecasts['leeds']['temperature'], '-270.15C')
+        self.assertEquals(forecasts['york']['error_code'], 'pending')
+        self.assertEquals(revalidate.call_args[0][0], 'york')
+
+    @mock.patch.object(config, 'BATCH_FETCH_WORKERS', 1)
+    @mock.patch.object(config, 'BATCH_MAX_FETCHES', 0)
+    def test_circuit_open(self):
+        """Test that a city which is not fetched because the circuit is open
+        has an error in place of being pending.
+        """
+        with mock.patch.object(ResponseBuilder, 'revalidate',
+                               return_value=False), \
+                mock.patch.object(ResponseBuilder, 'refreshing',
+                                  return_value=False):
+            response = self.client.get(
+                reverse('forecast_batch'),
+                {'cities': 'london,york'}
+            )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(forecasts['london']['temperature'], '-272.15C')
+        self.assertEquals(forecasts['york']['error_code'],
+                          'upstream unavailable')
+
+        # A refresh already in flight is still pending.
+        with mock.patch.object(ResponseBuilder, 'revalidate',
+                               return_value=False), \
+                mock.patch.object(ResponseBuilder, 'refreshing',
+                                  return_value=True):
+            response = self.client.get(
+                reverse('forecast_batch'),
+                {'cities': 'york'}
+            )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(forecasts['york']['error_code'], 'pending')
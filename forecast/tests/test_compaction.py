@@ -0,0 +1,87 @@
+"""Unittests for the compaction module and the compact_forecasts command.
+The module includes the following tests:
+    * test_purge_expired: forecasts before the retention horizon, including
+      the dummy forecasts, are deleted in chunks.
+    * test_maybe_compact: automatic compaction runs at most once per
+      interval and not at all when disabled.
+    * test_command: the command reports the rows reclaimed.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+# Third Party Imports
+from django.core.management import call_command
+from django.test import TestCase
+
+# Local Imports
+from .. import compaction, config
+import corefunctions
+from ..models import Forecast
+from ..shared_cache import shared_forecast_cache
+
+
+class TestCompaction(TestCase):
+    """Unittests for the compaction functions and command."""
+
+    def setUp(self):
+        shared_forecast_cache.clear()
+        Forecast.objects.all().delete()
+
+        self.now = datetime.now()
+        for hoursAgo in [100, 72, 50, 24, 0, -24]:
+            self.create_forecast(
+                corefunctions.datetime_to_epoch(
+                    self.now - timedelta(hours=hoursAgo)
+                )
+            )
+        self.create_forecast(-99)
+
+    def create_forecast(self, forecastFor):
+        Forecast.objects.create(
+            humidity=10,
+            pressure=12,
+            temperature=3,
+            forecast_for=forecastFor,
+            city_id='london',
+            clouds=5
+        )
+
+    def test_purge_expired(self):
+        """Test that forecasts for times before the horizon are deleted,
+        including the dummy forecasts, when deleting in chunks smaller than
+        the number of expired forecasts.
+        """
+        threshold = compaction.retention_threshold(self.now, 48)
+        deleted = compaction.purge_expired(threshold, 3)
+
+        self.assertEquals(deleted, 4)
+        self.assertEquals(Forecast.objects.count(), 3)
+        self.assertFalse(Forecast.objects.filter(forecast_for=-99).exists())
+
+    def test_maybe_compact(self):
+        """Test that automatic compaction starts once per interval and not at
+        all when disabled.
+        """
+        with mock.patch.object(compaction.threading, 'Thread') as thread:
+            self.assertFalse(compaction.maybe_compact())
+
+            with mock.patch.object(config, 'AUTO_COMPACT_INTERVAL_MINS', 60):
+                self.assertTrue(compaction.maybe_compact())
+                self.assertFalse(compaction.maybe_compact())
+
+        self.assertEquals(thread.return_value.start.call_count, 1)
+
+    def test_command(self):
+        """Test that the command deletes the expired forecasts and reports
+        the rows reclaimed.
+        """
+        stdout = StringIO()
+        call_command('compact_forecasts', '--horizon', '48', stdout=stdout)
+
+        self.assertIn('Reclaimed 4 expired rows',
+                      stdout.getvalue())
+        self.assertEquals(Forecast.objects.count(), 3)
@@ -0,0 +1,115 @@
+"""Unittests for the export module, the export view and the
+export_forecasts command.
+The module includes the following tests:
+    * test_export_rows: the rows are filtered by city and time.
+    * test_stream_ndjson: the view streams NDJSON to staff users.
+    * test_stream_csv: the view streams CSV.
+    * test_invalid_requests: non-staff users and invalid parameters are
+      rejected.
+    * test_command: the command writes the forecasts to a file.
+"""
+
+# IMPORTS
+# Python Core Library
+from io import StringIO
+import json
+import os
+import tempfile
+
+# Third Party Imports
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.urls import reverse
+
+# Local Imports
+from ..export import export_rows
+from ..models import Forecast
+
+
+class TestExport(TestCase):
+    """Unittests for exporting forecasts."""
+
+    def setUp(self):
+        Forecast.objects.all().delete()
+        Forecast.objects.bulk_create([
+            Forecast(
+                city_id=city,
+                humidity=idx,
+                pressure=1000,
+                temperature=280,
+                clouds=5,
+                forecast_for=1600000000 + idx * 10800
+            )
+            for city in ['leeds', 'london']
+            for idx in range(3)
+        ])
+
+        self.staff = User.objects.create(username='analyst', is_staff=True)
+
+    def get_export(self, **params):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse('forecast_export'), params)
+
+    def test_export_rows(self):
+        """Test that the rows are filtered by city and time and ordered by
+        city and time.
+        """
+        self.assertEquals(
+            list(export_rows(['london'], 1600010800, None, chunkSize=1)),
+            [('london', 1600010800, 1, 1000, 280, 5),
+             ('london', 1600021600, 2, 1000, 280, 5)]
+        )
+        self.assertEquals(len(list(export_rows())), 6)
+
+    def test_stream_ndjson(self):
+        """Test that the view streams a JSON object per forecast."""
+        response = self.get_export(cities='London')
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals(len(lines), 3)
+        self.assertEquals(
+            json.loads(lines[0]),
+            {'city': 'london', 'forecast_for': 1600000000, 'humidity': 0,
+             'pressure': 1000, 'temperature': 280, 'clouds': 5}
+        )
+
+    def test_stream_csv(self):
+        """Test that the view streams a CSV header and a line per
+        forecast.
+        """
+        response = self.get_export(format='csv', to='2030-01-01')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEquals(
+            lines[0], 'city,forecast_for,humidity,pressure,temperature,clouds'
+        )
+        self.assertEquals(lines[1], 'leeds,1600000000,0.0,1000.0,280.0,5.0')
+
+    def test_invalid_requests(self):
+        """Test that non-staff users and invalid parameters are rejected."""
+        url = reverse('forecast_export')
+        self.assertEquals(self.client.get(url).status_code, 403)
+
+        self.assertEquals(self.get_export(format='xml').status_code, 400)
+        self.assertEquals(self.get_export(**{'from': 'now'}).status_code, 400)
+        self.assertEquals(self.get_export(cities='westeros').status_code, 404)
+
+    def test_command(self):
+        """Test that the command writes the forecasts to a file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'forecasts.ndjson')
+            stderr = StringIO()
+            call_command('export_forecasts', '--city', 'leeds',
+                         '--output', path, stderr=stderr)
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertEquals(len(lines), 3)
+        self.assertEquals(json.loads(lines[2])['humidity'], 2)
+        self.assertIn('Exported 3 forecasts', stderr.getvalue())
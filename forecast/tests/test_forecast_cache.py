@@ -0,0 +1,108 @@
+"""Unittests for the forecast_cache module.
+The module includes the following tests:
+    * test_get_set: cached rows are returned and counted as hits/misses.
+    * test_expires_at_slot_boundary: entries expire at the next API interval
+      boundary.
+    * test_expires_after_ttl: entries expire after ttlSecs within a slot.
+    * test_lru_eviction: the least recently used entry is evicted when the
+      cache is full.
+    * test_invalidate: all entries for a city are removed.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime
+from unittest import mock
+
+# Third Party Imports
+from django.test import SimpleTestCase
+
+# Local Imports
+from .. import config
+from ..forecast_cache import ForecastCache, next_slot_boundary, time_slot
+
+
+class FakeClock:
+    """A clock which only moves when told to."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+class TestForecastCache(SimpleTestCase):
+    """Unittests for the ForecastCache class."""
+
+    def setUp(self):
+        # 10800 is the start of the second 3 hour slot.
+        self.clock = FakeClock(10800)
+        self.cache = ForecastCache(2, ttlSecs=0, clock=self.clock)
+
+    def test_time_slot(self):
+        """Test that times within the same 3 hour block share a slot."""
+        start = datetime.fromtimestamp(10800)
+        end = datetime.fromtimestamp(21599)
+        self.assertEquals(time_slot(start), 1)
+        self.assertEquals(time_slot(end), 1)
+        self.assertEquals(next_slot_boundary(10800), 21600)
+
+    def test_get_set(self):
+        """Test that cached rows are returned and counted."""
+        self.assertIsNone(self.cache.get('london', 1))
+        self.cache.set('london', 1, ({'humidity': 1},))
+        self.assertEquals(self.cache.get('london', 1), ({'humidity': 1},))
+        self.assertEquals(
+            self.cache.stats(),
+            {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+        )
+
+    def test_expires_at_slot_boundary(self):
+        """Test that an entry expires once the next slot has started."""
+        self.clock.now = 21000
+        self.cache.set('london', 1, ({'humidity': 1},))
+
+        self.clock.now = 21599
+        self.assertIsNotNone(self.cache.get('london', 1))
+
+        self.clock.now = 21600
+        self.assertIsNone(self.cache.get('london', 1))
+        self.assertEquals(self.cache.stats()['evictions'], 1)
+        self.assertEquals(len(self.cache), 0)
+
+    def test_expires_after_ttl(self):
+        """Test that an entry expires after ttlSecs, or at the next slot
+        boundary if that is sooner.
+        """
+        cache = ForecastCache(2, ttlSecs=60, clock=self.clock)
+        cache.set('london', 1, ())
+        self.clock.now = 10859
+        self.assertIsNotNone(cache.get('london', 1))
+        self.clock.now = 10860
+        self.assertIsNone(cache.get('london', 1))
+
+        self.clock.now = 21580
+        cache.set('london', 1, ())
+        self.clock.now = 21600
+        self.assertIsNone(cache.get('london', 1))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        self.cache.set('london', 1, ())
+        self.cache.set('leeds', 1, ())
+        self.cache.get('london', 1)
+        self.cache.set('york', 1, ())
+
+        self.assertIsNone(self.cache.get('leeds', 1))
+        self.assertIsNotNone(self.cache.get('london', 1))
+        self.assertIsNotNone(self.cache.get('york', 1))
+        self.assertEquals(self.cache.stats()['evictions'], 1)
+
+    def test_invalidate(self):
+        """Test that invalidating a city removes all of its slots."""
+        self.cache.set('london', 1, ())
+        self.cache.set('london', 2, ())
+        self.cache.invalidate('london')
+        self.assertEquals(len(self.cache), 0)
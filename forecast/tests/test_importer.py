@@ -0,0 +1,215 @@
+"""Unittests for the importer module and the import_forecasts command.
+The module includes the following tests:
+    * test_iter_json_array: the elements of a JSON array are read in small
+      pieces and invalid elements are skipped without reading the rest of
+      the file.
+    * test_api_response: the forecasts in an API response are read with the
+      city's name.
+    * test_parse_record: export and OpenWeatherMap records are converted and
+      invalid records (including values which are not finite or out of
+      range) are rejected.
+    * test_command: the command imports a file, skipping invalid records
+      (including lines which are not JSON) and updating existing forecasts.
+    * test_invalidate_on_error: the cache is cleared for the cities written
+      before an import stops.
+    * test_export_round_trip: a CSV export can be imported again.
+"""
+
+# IMPORTS
+# Python Core Library
+from io import StringIO
+import json
+import os
+import tempfile
+from unittest import mock
+
+# Third Party Imports
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+# Local Imports
+from ..importer import InvalidRecord, Importer, iter_json_array, parse_record
+from ..models import Forecast
+
+
+def owm_record(dt, temp=280.0, city='London'):
+    """Returns a record in the format of the OpenWeatherMap history dumps."""
+    return {
+        'city_name': city,
+        'dt': dt,
+        'main': {'temp': temp, 'pressure': 1012, 'humidity': 80},
+        'clouds': {'all': 40},
+    }
+
+
+class TestImporter(TestCase):
+    """Unittests for importing forecasts."""
+
+    def setUp(self):
+        Forecast.objects.filter(city__in=['london', 'leeds']).delete()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_iter_json_array(self):
+        """Test that the elements are read when they are split across the
+        reads from the file.
+        """
+        records = [owm_record(1600000000 + idx) for idx in range(20)]
+        content = json.dumps(records, indent=2)
+
+        self.assertEquals(
+            list(iter_json_array(StringIO(content), bufferSize=7)),
+            records
+        )
+        self.assertEquals(list(iter_json_array(StringIO(' [ ] '))), [])
+
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('[{"dt": 1}, {"dt"')))
+
+        # An invalid element is skipped and the following elements read.
+        content = '[{"dt": 1}, {"dt": tru, "x": "]"}, {"dt": 3}]'
+        records = list(iter_json_array(StringIO(content), bufferSize=4))
+        self.assertEquals(len(records), 3)
+        self.assertIsInstance(records[1], InvalidRecord)
+        self.assertEquals(records[2], {'dt': 3})
+
+        # An element which is never closed is not read to the end of the
+        # file.
+        f = StringIO('[{"dt": 1, "a": [' + ' ' * 1000 + '1]}]')
+        with self.assertRaises(ValueError):
+            list(iter_json_array(f, bufferSize=10, maxRecordSize=100))
+        self.assertLess(f.tell(), 200)
+
+    def test_api_response(self):
+        """Test that the forecasts of an API response are read with the name
+        of the city.
+        """
+        content = json.dumps({
+            'city': {'name': 'Leeds'},
+            'list': [{'dt': 1600000000, 'main': {}}],
+        })
+
+        self.assertEquals(
+            list(iter_json_array(StringIO(content))),
+            [{'dt': 1600000000, 'main': {}, 'city_name': 'Leeds'}]
+        )
+
+    def test_parse_record(self):
+        """Test that records in each format are converted to forecasts and
+        that invalid records raise a ValueError.
+        """
+        forecast = parse_record(owm_record('1600000000'))
+        self.assertEquals(
+            (forecast.city_id, forecast.forecast_for, forecast.temperature,
+             forecast.pressure, forecast.humidity, forecast.clouds),
+            ('london', 1600000000, 280, 1012, 80, 40)
+        )
+
+        forecast = parse_record({
+            'dt': '1600000000', 'temp': '281.5', 'pressure': '1000',
+            'humidity': '70', 'clouds_all': '0'
+        }, defaultCity='leeds')
+        self.assertEquals(forecast.city_id, 'leeds')
+        self.assertEquals(forecast.temperature, 281.5)
+
+        for record in [
+            owm_record(1600000000, city='Westeros'),
+            owm_record(1600000000, temp=-5),
+            owm_record(-99),
+            {'dt': 1600000000},
+            ['london'],
+            owm_record('inf'),
+            owm_record(1e30),
+            owm_record(1600000000, temp=float('inf')),
+            owm_record(1600000000, temp='nan'),
+        ]:
+            with self.assertRaises(ValueError, msg=record):
+                parse_record(record)
+
+    def test_command(self):
+        """Test that the command imports the valid records, keeps the last
+        of any duplicates and updates the existing forecasts.
+        """
+        Forecast.objects.create(
+            city_id='london', forecast_for=1600000000, humidity=1,
+            pressure=1, temperature=1, clouds=1
+        )
+        lines = [
+            json.dumps(record) for record in [
+                owm_record(1600000000, temp=270),
+                owm_record(1600010800),
+                owm_record(1600010800, temp=290),
+                owm_record(1600021600, city='Westeros'),
+            ]
+        ]
+        lines.insert(2, lines[1][:20])
+        path = self.write_file('history.ndjson', '\n'.join(lines))
+
+        stdout = StringIO()
+        with self.assertLogs('forecast.importer', 'WARNING'):
+            call_command('import_forecasts', path, '--chunk-size', '2',
+                         stdout=stdout, stderr=StringIO())
+
+        # The second chunk updates a forecast written by the first chunk.
+        self.assertIn('wrote 3 forecasts for 1 cities (2 invalid)',
+                      stdout.getvalue())
+        self.assertEquals(
+            list(Forecast.objects.filter(city='london').order_by(
+                'forecast_for'
+            ).values_list('forecast_for', 'temperature')),
+            [(1600000000, 270), (1600010800, 290)]
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('import_forecasts', path, '--strict',
+                         stdout=StringIO(), stderr=StringIO())
+
+    @mock.patch('forecast.importer.ResponseBuilder.invalidate_cache')
+    def test_invalidate_on_error(self, invalidate_cache):
+        """Test that the cities in the chunks written are removed from the
+        cache when a strict import stops at an invalid record.
+        """
+        records = [
+            owm_record(1600000000),
+            owm_record(1600010800, city='Leeds'),
+            owm_record(1600021600, city='Westeros'),
+        ]
+
+        with self.assertRaises(ValueError):
+            Importer(chunkSize=1).run(records, strict=True)
+
+        self.assertEquals(
+            sorted(call.args[0] for call in invalidate_cache.call_args_list),
+            ['leeds', 'london']
+        )
+
+    def test_export_round_trip(self):
+        """Test that a CSV export can be imported again."""
+        Forecast.objects.create(
+            city_id='leeds', forecast_for=1600000000, humidity=50,
+            pressure=1000, temperature=280, clouds=20
+        )
+        path = os.path.join(self.directory.name, 'leeds.csv')
+        call_command('export_forecasts', '--format', 'csv', '--city',
+                     'leeds', '--output', path, stderr=StringIO())
+
+        Forecast.objects.filter(city='leeds').delete()
+        call_command('import_forecasts', path, stdout=StringIO(),
+                     stderr=StringIO())
+
+        self.assertEquals(
+            list(Forecast.objects.filter(city='leeds').values_list(
+                'forecast_for', 'humidity', 'pressure', 'temperature',
+                'clouds'
+            )),
+            [(1600000000, 50, 1000, 280, 20)]
+        )
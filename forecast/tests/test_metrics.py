@@ -0,0 +1,134 @@
+"""Unittests for the metrics module and the /metrics view.
+The module includes the following tests:
+    * test_render: counters and histograms are rendered in the Prometheus
+      text format.
+    * test_multiprocess: the values written by each process to a metrics
+      directory are added up.
+    * test_mmap_values: values are kept when a file is reopened and the file
+      grows as keys are added.
+    * test_metrics_view: requests are counted by status and error code and
+      the stages of a forecast request are timed.
+"""
+
+# IMPORTS
+# Python Core Library
+import os
+import re
+import tempfile
+
+# Third Party Imports
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+# Local Imports
+from ..metrics import (Counter, Histogram, MmapValues, Registry,
+                       read_mmap_file)
+
+
+class TestMetrics(SimpleTestCase):
+    """Unittests for the metrics module."""
+
+    def test_render(self):
+        """Test the text format of a counter and a histogram."""
+        registry = Registry()
+        requests = Counter('requests_total', 'Requests.', ('status',),
+                           registry=registry)
+        latency = Histogram('latency_seconds', 'Latency.', ('stage',),
+                            buckets=(0.1, 1), registry=registry)
+
+        requests.inc(status=200)
+        requests.inc(2, status=200)
+        requests.inc(status=404)
+        for value in [0.05, 0.5, 0.5, 5]:
+            latency.observe(value, stage='db')
+
+        self.assertEquals(registry.render().splitlines(), [
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{status="200"} 3',
+            'requests_total{status="404"} 1',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{stage="db",le="0.1"} 1',
+            'latency_seconds_bucket{stage="db",le="1"} 3',
+            'latency_seconds_bucket{stage="db",le="+Inf"} 4',
+            'latency_seconds_count{stage="db"} 4',
+            'latency_seconds_sum{stage="db"} 6.05',
+        ])
+
+    def test_multiprocess(self):
+        """Test that the files of all the processes are added up."""
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry(directory)
+            requests = Counter('requests_total', 'Requests.', ('status',),
+                               registry=registry)
+            requests.inc(status=200)
+
+            # Another worker process.
+            other = MmapValues(os.path.join(directory, 'metrics_1.db'))
+            other.inc('["requests_total", [["status", "200"]]]', 2)
+            other.inc('["requests_total", [["status", "500"]]]', 1)
+
+            self.assertEquals(registry.collect(), {
+                ('requests_total', (('status', '200'),)): 3,
+                ('requests_total', (('status', '500'),)): 1,
+            })
+
+    def test_mmap_values(self):
+        """Test that a reopened file keeps its values and that the file
+        grows past its initial size.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics_1.db')
+            values = MmapValues(path)
+            for idx in range(5000):
+                values.inc(f'key {idx}', idx)
+            values.inc('key 1', 0.5)
+
+            self.assertGreater(os.path.getsize(path),
+                               MmapValues.INITIAL_SIZE)
+
+            reopened = MmapValues(path)
+            reopened.inc('key 2', 1)
+            stored = dict(read_mmap_file(path))
+            self.assertEquals(len(stored), 5000)
+            self.assertEquals(stored['key 1'], 1.5)
+            self.assertEquals(stored['key 2'], 3)
+            self.assertEquals(stored['key 4999'], 4999)
+
+
+class TestMetricsView(TestCase):
+    """Unittests for the /metrics view."""
+
+    def sample(self, content, line):
+        """Returns the value of the sample on line (without the value) or 0
+        if there is no such sample.
+        """
+        match = re.search('^' + re.escape(line) + r' (\S+)$', content, re.M)
+        return float(match.group(1)) if match else 0
+
+    def test_metrics_view(self):
+        """Test that a request is counted by status and error code and that
+        the city lookup is timed.
+        """
+        notFound = ('forecast_requests_total{view="forecast",status="404",'
+                    'error_code="city not found"}')
+        lookups = 'forecast_stage_seconds_count{stage="city_lookup"}'
+
+        before = self.client.get(reverse('metrics')).content.decode()
+        self.client.get(reverse('forecast', args=['westeros']))
+        response = self.client.get(reverse('metrics'))
+        content = response.content.decode()
+
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEquals(
+            self.sample(content, notFound),
+            self.sample(before, notFound) + 1
+        )
+        self.assertEquals(
+            self.sample(content, lookups),
+            self.sample(before, lookups) + 1
+        )
+        self.assertIn('# TYPE forecast_cache_hit_ratio gauge', content)
+        self.assertIn('\nforecast_quota_tokens ', content)
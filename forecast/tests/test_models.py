@@ -2,6 +2,7 @@
 Will perform the following tests:
     * Check that all cities are in models.Cities.
     * Test entry onto models.Forcast
+    * Test that there is at most one forecast for a city at any time.
 """
 
 
@@ -10,6 +11,7 @@ Will perform the following tests:
 from datetime import datetime
 
 # Third Party Imports
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
 # Local Imports
@@ -42,7 +44,7 @@ class TestForecast(TestCase):
             pressure=testData['pressure'],
             temperature=testData['temperature'],
             clouds=testData['clouds'],
-            forecast_for=corefunctions.date_to_int(datetime.today()),
+            forecast_for=corefunctions.datetime_to_epoch(datetime.today()),
         )
         newEntry.save()
         dbItem = Forecast.objects.get(
@@ -63,6 +65,45 @@ class TestForecast(TestCase):
         else:
             self.assertTrue(False, 'Test item could not be found.')
 
+    def test_unique_city_forecast_for(self):
+        """Test that a second forecast for the same city and time is rejected
+        and that upsert updates the existing forecast instead.
+        """
+        forecastFor = corefunctions.datetime_to_epoch(datetime.today())
+        fields = {
+            'humidity': 1,
+            'pressure': 1,
+            'temperature': 1,
+            'clouds': 1,
+            'forecast_for': forecastFor,
+        }
+        Forecast.objects.create(city_id='london', **fields)
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Forecast.objects.create(city_id='london', **fields)
+
+        fields['humidity'] = 2
+        rowsWritten = Forecast.objects.upsert([
+            Forecast(city_id='london', **fields),
+            Forecast(city_id='leeds', **fields),
+        ])
+
+        self.assertEquals(rowsWritten, 2)
+        self.assertEquals(
+            Forecast.objects.get(
+                city='london',
+                forecast_for=forecastFor
+            ).humidity,
+            2
+        )
+        self.assertTrue(
+            Forecast.objects.filter(
+                city='leeds',
+                forecast_for=forecastFor
+            ).exists()
+        )
+
 
 def test_cities_test_generator():
     """Generates tests to be attached to TestCities.
@@ -0,0 +1,176 @@
+"""Unittests for the prefetch module and the prefetch_forecasts command.
+The module includes the following tests:
+    * test_rate_limiter: calls are spaced out to the rate limit.
+    * test_concurrency_cap: no more than maxWorkers cities are fetched at the
+      same time.
+    * test_failures_counted: a failed city does not stop the other cities
+      being fetched.
+    * test_seconds_until_prefetch: prefetching starts before the slot
+      boundary.
+    * test_most_requested: cities are ranked by the number of requests.
+    * test_top_without_shared_cache: requests are not counted and --top
+      prefetches every city when the cache is not shared.
+    * test_command: the command refreshes the selected cities.
+"""
+
+# IMPORTS
+# Python Core Library
+from io import StringIO
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+# Third Party Imports
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+# Local Imports
+from .. import config
+from ..forecast_cache import forecast_cache
+from ..prefetch import Prefetcher, RateLimiter, seconds_until_prefetch
+from ..response_builder import ResponseBuilder
+from ..shared_cache import (city_request_counts, CityRequestCounter,
+                            shared_forecast_cache)
+
+
+class TestPrefetcher(SimpleTestCase):
+    """Unittests for the RateLimiter and Prefetcher classes."""
+
+    def test_rate_limiter(self):
+        """Test that calls are spaced 60 / callsPerMin seconds apart."""
+        clock = SimpleNamespace(now=0)
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+
+        rateLimiter = RateLimiter(30, lambda: clock.now, sleep)
+        for _ in range(3):
+            rateLimiter.wait()
+
+        self.assertEquals(sleeps, [2, 4])
+
+        # No waiting once enough time has passed.
+        clock.now = 100
+        rateLimiter.wait()
+        self.assertEquals(sleeps, [2, 4])
+
+    def test_concurrency_cap(self):
+        """Test that no more than maxWorkers cities are refreshed at once."""
+        active = SimpleNamespace(now=0, most=0)
+        lock = threading.Lock()
+
+        def refresh(city):
+            with lock:
+                active.now += 1
+                active.most = max(active.most, active.now)
+            time.sleep(0.01)
+            with lock:
+                active.now -= 1
+            return 40
+
+        prefetcher = Prefetcher(
+            maxWorkers=3, callsPerMin=0, jitterSecs=0, refresh=refresh
+        )
+        with mock.patch('forecast.prefetch.connections'):
+            results = prefetcher.run([f'city{idx}' for idx in range(12)])
+
+        self.assertEquals(
+            results,
+            {'refreshed': 12, 'failed': 0, 'rows': 480}
+        )
+        self.assertLessEqual(active.most, 3)
+
+    def test_failures_counted(self):
+        """Test that a failed city is counted and the others still run."""
+        def refresh(city):
+            if city == 'westeros':
+                raise ValueError('unknown city')
+            return 40
+
+        prefetcher = Prefetcher(
+            maxWorkers=1, callsPerMin=0, jitterSecs=0, refresh=refresh
+        )
+        with self.assertLogs('forecast.prefetch', 'ERROR'):
+            results = prefetcher.run(['london', 'westeros', 'leeds'])
+
+        self.assertEquals(
+            results,
+            {'refreshed': 2, 'failed': 1, 'rows': 80}
+        )
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    def test_seconds_until_prefetch(self):
+        """Test that prefetching starts leadMins before the next slot."""
+        # 10800 is the start of a slot, the next slot starts at 21600.
+        self.assertEquals(seconds_until_prefetch(10800, 15), 9900)
+
+        # Inside the lead time, the prefetch for the next slot has already
+        # started so wait for the following slot.
+        self.assertEquals(seconds_until_prefetch(21000, 15), 10800 - 300)
+
+
+class TestPrefetchCommand(TestCase):
+    """Unittests for the prefetch_forecasts command."""
+
+    def setUp(self):
+        forecast_cache.clear()
+        shared_forecast_cache.clear()
+
+    @mock.patch.object(CityRequestCounter, 'shared', True)
+    def test_most_requested(self):
+        """Test that cities are ranked by the number of requests."""
+        for city in ['leeds', 'london', 'london', 'york', 'york', 'york']:
+            city_request_counts.increment(city)
+
+        self.assertEquals(
+            city_request_counts.most_requested(
+                ['bath', 'leeds', 'london', 'york'], 2
+            ),
+            ['york', 'london']
+        )
+
+    def test_top_without_shared_cache(self):
+        """Test that requests are not counted in a local memory cache and
+        that --top then prefetches all the cities given, with a warning.
+        """
+        city_request_counts.increment('york')
+        self.assertEquals(
+            city_request_counts.cache.get(
+                city_request_counts.make_key('york')
+            ),
+            None
+        )
+
+        stderr = StringIO()
+        with mock.patch.object(ResponseBuilder, 'call_API',
+                               return_value=40) as callAPI:
+            call_command(
+                'prefetch_forecasts', 'london', 'york', '--top', '1',
+                '--workers', '1', '--rate', '0', '--jitter', '0',
+                stdout=StringIO(), stderr=stderr
+            )
+
+        self.assertEquals(callAPI.call_count, 2)
+        self.assertIn('--top needs a cache shared', stderr.getvalue())
+
+    def test_command(self):
+        """Test that the command refreshes the cities given, resolving
+        aliases, and reports the results.
+        """
+        stdout = StringIO()
+        with mock.patch.object(ResponseBuilder, 'call_API',
+                               return_value=40) as callAPI:
+            call_command(
+                'prefetch_forecasts', 'London', 'hull',
+                '--workers', '1', '--rate', '0', '--jitter', '0',
+                stdout=stdout
+            )
+
+        self.assertEquals(
+            [call[0][0] for call in callAPI.call_args_list],
+            ['london', 'kingston upon hull']
+        )
+        self.assertIn('Prefetched 2 cities (0 failed, 80 rows)',
+                      stdout.getvalue())
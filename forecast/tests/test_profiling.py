@@ -0,0 +1,89 @@
+"""Unittests for the profiling module.
+The module includes the following tests:
+    * test_server_timing: the stages are listed in order, in milliseconds,
+      followed by the total.
+    * test_server_timing_header: responses of the forecast view carry a
+      Server-Timing header.
+    * test_profile_staff_only: only staff users can profile a request.
+    * test_profile_file: a profile requested with the X-Profile header is
+      stored and its path returned.
+"""
+
+# IMPORTS
+# Python Core Library
+import os
+import pstats
+import tempfile
+from unittest import mock
+
+# Third Party Imports
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+# Local Imports
+from .. import config
+from ..profiling import server_timing
+
+
+class TestServerTiming(SimpleTestCase):
+    """Unittests for the Server-Timing header value."""
+
+    def test_server_timing(self):
+        """Test the order and format of the stages."""
+        timings = {'serialization': 0.0005, 'custom': 0.1, 'db_query': 0.002}
+
+        self.assertEquals(
+            server_timing(timings, 0.01),
+            'db_query;dur=2.000, serialization;dur=0.500, '
+            'custom;dur=100.000, total;dur=10.000'
+        )
+
+
+class TestProfiling(TestCase):
+    """Unittests for the instrumented views."""
+
+    def setUp(self):
+        self.url = reverse('forecast', args=['westeros'])
+        self.staff = User.objects.create_user('staff', password='pass',
+                                              is_staff=True)
+        self.user = User.objects.create_user('user', password='pass')
+
+    def test_server_timing_header(self):
+        """Test that the response has the timings of the request."""
+        response = self.client.get(self.url)
+
+        self.assertEquals(response.status_code, 404)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^city_lookup;dur=[\d.]+, .*total;dur=[\d.]+$'
+        )
+
+    def test_profile_staff_only(self):
+        """Test that a profile is only returned to staff users."""
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'profile': 'text'})
+        self.assertEquals(response.status_code, 404)
+        self.assertTrue(
+            response['Content-Type'].startswith('application/json')
+        )
+
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'profile': 'text'})
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('function calls', response.content.decode())
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_profile_file(self):
+        """Test that the profile is written to config.PROFILE_DIR."""
+        self.client.force_login(self.staff)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(config, 'PROFILE_DIR', directory):
+            response = self.client.get(self.url, HTTP_X_PROFILE='1')
+
+            self.assertEquals(response.status_code, 404)
+            path = response['X-Profile-File']
+            self.assertEquals(os.path.dirname(path), directory)
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
@@ -0,0 +1,141 @@
+"""Unittests for the quota module (the shared API token bucket).
+The module includes the following tests:
+    * test_priorities: background calls stop at the user reserve, user calls
+      can use every token.
+    * test_refill: tokens are refilled at the calls per minute.
+    * test_wait: a call waits for a token up to its maximum wait.
+    * test_concurrent_update: a token is not taken from a bucket which
+      another worker wrote after it was read.
+    * test_priority_context: quota.priority sets the priority of the calls
+      within the with block.
+    * test_upstream_client: the client takes a token before each call and
+      does not call the API when the quota is used up.
+"""
+
+# IMPORTS
+# Python Core Library
+from unittest import mock
+
+# Third Party Imports
+from django.test import TestCase
+
+# Local Imports
+from .. import quota
+from ..models import ApiQuota
+from ..quota import BACKGROUND, QuotaExceeded, QuotaManager, USER
+from ..upstream import QuotaExceededError, UpstreamClient
+
+
+class TestQuotaManager(TestCase):
+    """Unittests for the QuotaManager class."""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.slept = []
+
+        def sleep(secs):
+            self.slept.append(secs)
+            self.now += secs
+
+        # 10 calls per minute (one token every 6 seconds), 2 of which are
+        # reserved for user requests.
+        self.quota = QuotaManager(
+            'test',
+            callsPerMin=10,
+            userReserve=0.2,
+            maxWait={USER: 0, BACKGROUND: 0},
+            clock=lambda: self.now,
+            sleep=sleep
+        )
+
+    def take(self, callPriority):
+        """Returns the number of tokens taken before the quota ran out."""
+        taken = 0
+        while True:
+            try:
+                self.quota.acquire(callPriority)
+            except QuotaExceeded as error:
+                return taken, error.retryAfter
+            taken += 1
+
+    def test_priorities(self):
+        """Test that background calls leave the reserve for user calls."""
+        self.assertEquals(self.take(BACKGROUND), (8, 7))
+        self.assertEquals(self.take(USER), (2, 7))
+
+        stats = self.quota.stats()
+        self.assertEquals(stats[BACKGROUND]['granted'], 8)
+        self.assertEquals(stats[USER]['granted'], 2)
+        self.assertEquals(stats[USER]['denied'], 1)
+        self.assertAlmostEquals(stats['tokens'], 0)
+
+    def test_refill(self):
+        """Test that a token is added every 6 seconds, up to 10 tokens."""
+        self.take(USER)
+
+        self.now += 12
+        self.assertEquals(self.take(USER)[0], 2)
+
+        self.now += 3600
+        self.assertEquals(self.take(USER)[0], 10)
+
+    def test_concurrent_update(self):
+        """Test that when another worker takes a token between reading and
+        writing the bucket, the bucket is read again so that both tokens are
+        counted (databases without row locks).
+        """
+        self.quota.acquire(USER)
+        clock = self.quota.clock
+        calls = []
+
+        def racing_clock():
+            if not calls:
+                # Another worker takes a token.
+                ApiQuota.objects.filter(name='test').update(tokens=8)
+            calls.append(1)
+            return clock()
+
+        with mock.patch.object(self.quota, 'clock', racing_clock):
+            self.assertEquals(self.quota._try_acquire_conditional(USER), 0)
+
+        self.assertEquals(len(calls), 2)
+        self.assertEquals(ApiQuota.objects.get(name='test').tokens, 7)
+
+    def test_wait(self):
+        """Test that a call waits for a token within its maximum wait."""
+        self.take(USER)
+        self.quota.maxWait[USER] = 6
+
+        self.quota.acquire(USER)
+        self.assertEquals(sum(self.slept), 6)
+        self.assertEquals(self.quota.stats()[USER]['waited'], 1)
+
+        with self.assertRaises(QuotaExceeded):
+            self.quota.acquire(BACKGROUND)
+
+    def test_priority_context(self):
+        """Test that calls are USER calls unless made within
+        quota.priority.
+        """
+        self.assertEquals(quota.current_priority(), USER)
+        with quota.priority(BACKGROUND):
+            self.assertEquals(quota.current_priority(), BACKGROUND)
+            self.take(None)
+        self.assertEquals(quota.current_priority(), USER)
+
+        self.assertEquals(self.quota.stats()[BACKGROUND]['granted'], 8)
+
+    def test_upstream_client(self):
+        """Test that the upstream client does not call the API when no token
+        can be taken.
+        """
+        client = UpstreamClient('http://127.0.0.1:9/', 'key',
+                                quota=self.quota)
+        self.take(USER)
+
+        with mock.patch.object(client, 'new_session') as newSession:
+            with self.assertRaises(QuotaExceededError) as error:
+                client.fetch('london')
+
+        newSession.assert_not_called()
+        self.assertEquals(error.exception.retryAfter, 7)
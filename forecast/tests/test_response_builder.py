@@ -25,23 +25,70 @@ The module includes the following test:
 
     * test_pressure_invalid_unit:
         Test that invalid pressure units in the URL return a 400 response.
+
+    * test_repeat_request_cached:
+        Test that a repeated request for the same city and time slot does not
+        query the database and that saving a forecast invalidates the cache.
+
+    * test_shared_cache_between_workers:
+        Test that rows cached by one worker are served to another worker
+        (with an empty in-process cache) without querying the database.
+
+    * test_single_query_per_request:
+        Test that a request which is not cached selects the nearest forecast
+        with a single database query.
+
+    * test_conditional_get:
+        Test that responses carry ETag, Last-Modified and Cache-Control
+        headers and that a request with a matching If-None-Match or
+        If-Modified-Since header returns a 304.
+    * test_nearest_forecast_changes:
+        Test that a response without "at" is cached until another forecast
+        becomes the nearest and that If-Modified-Since does not return a 304
+        once it has.
+    * test_stale_while_revalidate:
+        Test that an older forecast is served, marked as stale, while the
+        forecasts are refreshed in the background, and that the API is
+        called directly when the older forecast is too old.
+    * test_upstream_outage:
+        Test that while the API is failing an older forecast is served if
+        there is one, otherwise an error is returned.
+    * test_revalidate:
+        Test that a background refresh is only queued when the city is not
+        already queued and no refresh of the city is in progress.
+    * test_call_API_bulk_insert:
+        Test that call_API writes all the forecasts in the API response in a
+        single INSERT and reports the number of rows written.
+
+    * test_call_API_upsert:
+        Test that calling the API again updates the existing forecasts rather
+        than adding duplicate forecasts.
 """
 
 # IMPORTS
 # Python Core Library
 from datetime import datetime, timedelta
 import json
-from types import SimpleNamespace
+from unittest import mock
 
 # Third Party Imports
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
 # Local Imports
 import corefunctions
 from .. import config
+from ..forecast_cache import forecast_cache, time_slot
+from .. import response_builder
 from ..response_builder import ResponseBuilder
+from ..shared_cache import shared_forecast_cache
+from ..single_flight import city_refreshes
 from ..models import Cities, Forecast
+from ..upstream import CircuitOpenError, UpstreamError, upstream_client
+from .stub_api import StubAPI
 
 
 class TestResponseBuilder(TestCase):
@@ -52,7 +99,10 @@ class TestResponseBuilder(TestCase):
     def setUp(self):
         """Sets up for each test"""
         self.client = Client()
-        self.request = SimpleNamespace(GET={})
+        self.request = RequestFactory().get('/')
+        forecast_cache.clear()
+        shared_forecast_cache.clear()
+        upstream_client.breaker.reset()
 
     def test_invalid_city(self):
         """Test that an invalid city would would a 404 with an error message
@@ -130,7 +180,9 @@ class TestResponseBuilder(TestCase):
 
         # Test that where there is only one item in the querySet list,
         # that item is returned.
-        forecastDate = corefunctions.date_to_int(self.now - timedelta(days=3))
+        forecastDate = corefunctions.datetime_to_epoch(
+            self.now - timedelta(days=3)
+        )
         new_db_item(1)
 
         response = self.client.get(reverse('forecast', args=['london']))
@@ -145,7 +197,9 @@ class TestResponseBuilder(TestCase):
         # Test that where is this 3 items querySet list where the second item
         # is closesest to the desired forecast date, that the second querySet
         # item is returned.
-        forecastDate = corefunctions.date_to_int(self.now - timedelta(days=-2))
+        forecastDate = corefunctions.datetime_to_epoch(
+            self.now - timedelta(days=-2)
+        )
         new_db_item(2)
 
         response = self.client.get(reverse('forecast', args=['london']))
@@ -161,10 +215,14 @@ class TestResponseBuilder(TestCase):
         # the last item is returned where the last item is closest to the
         # desired forecast date.
 
-        forecastDate = corefunctions.date_to_int(self.now - timedelta(days=1))
+        forecastDate = corefunctions.datetime_to_epoch(
+            self.now - timedelta(days=1)
+        )
         new_db_item(2)
 
-        forecastDate = corefunctions.date_to_int(self.now - timedelta(days=10))
+        forecastDate = corefunctions.datetime_to_epoch(
+            self.now - timedelta(days=10)
+        )
         new_db_item(2)
 
         response = self.client.get(reverse('forecast', args=['london']))
@@ -194,7 +252,7 @@ class TestResponseBuilder(TestCase):
             humidity=10,
             pressure=12,
             temperature=3,
-            forecast_for=corefunctions.date_to_int(datetime.now()),
+            forecast_for=corefunctions.datetime_to_epoch(datetime.now()),
             city=Cities.objects.get(name='london'),
             clouds=5
         ).save()
@@ -232,7 +290,7 @@ class TestResponseBuilder(TestCase):
             humidity=1,
             pressure=1,
             temperature=1,  # -273.15C
-            forecast_for=corefunctions.date_to_int(self.now
+            forecast_for=corefunctions.datetime_to_epoch(self.now
                                                    + timedelta(days=1)),
             clouds=1,
             city=Cities.objects.get(name='london')
@@ -242,7 +300,7 @@ class TestResponseBuilder(TestCase):
             humidity=2,
             pressure=2,
             temperature=2,  # -271.15C
-            forecast_for=corefunctions.date_to_int(self.now
+            forecast_for=corefunctions.datetime_to_epoch(self.now
                                                    + timedelta(days=2, hours=2)),
             clouds=2,
             city=Cities.objects.get(name='london')
@@ -252,7 +310,7 @@ class TestResponseBuilder(TestCase):
             humidity=3,
             pressure=3,
             temperature=3,  # -270.15C
-            forecast_for=corefunctions.date_to_int(self.now
+            forecast_for=corefunctions.datetime_to_epoch(self.now
                                                    + timedelta(days=3)),
             clouds=3,
             city=Cities.objects.get(name='london')
@@ -346,7 +404,7 @@ class TestResponseBuilder(TestCase):
             humidity=1,
             pressure=1,
             temperature=1,  # -273.15C
-            forecast_for=corefunctions.date_to_int(self.now),
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
             clouds=1,
             city=Cities.objects.get(name='london')
         ).save()
@@ -371,7 +429,7 @@ class TestResponseBuilder(TestCase):
             humidity=1,
             pressure=1,
             temperature=1,  # -273.15C
-            forecast_for=corefunctions.date_to_int(self.now),
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
             clouds=1,
             city=Cities.objects.get(name='london')
         ).save()
@@ -389,13 +447,13 @@ class TestResponseBuilder(TestCase):
             humidity=1,
             pressure=1,
             temperature=1,  # -273.15C
-            forecast_for=corefunctions.date_to_int(self.now),
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
             clouds=1,
             city=Cities.objects.get(name='london')
         ).save()
 
         # Check that valid units to do return a error
-        for unit in ['pa', 'bar', 'atm', 'torr', 'psi']:
+        for unit in ['pa', 'bar', 'atm', 'torr', 'psi', 'hPa']:
             response = self.client.get(
                 reverse('forecast', args=['london']) + f'?pressure_units={unit}'
             )
@@ -414,7 +472,7 @@ class TestResponseBuilder(TestCase):
             humidity=1,
             pressure=1,
             temperature=1,  # -273.15C
-            forecast_for=corefunctions.date_to_int(self.now),
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
             clouds=1,
             city=Cities.objects.get(name='london')
         ).save()
@@ -422,3 +480,376 @@ class TestResponseBuilder(TestCase):
             reverse('forecast', args=['london']) + f'?pressure_units=beans'
         )
         self.assertEquals(response.status_code, 400)
+
+    def test_repeat_request_cached(self):
+        """Test that a repeated request for the same city and time slot is
+        served from the forecast cache without querying the database, and
+        that saving a new forecast for the city invalidates the cache.
+        """
+        Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=1,  # -272.15C
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
+            clouds=1,
+            city=Cities.objects.get(name='london')
+        )
+
+        response = ResponseBuilder(self.request, 'london').get_response()
+        self.assertEquals(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = ResponseBuilder(self.request, 'london').get_response()
+        self.assertEquals(
+            json.loads(response.content)['temperature'],
+            '-272.15C'
+        )
+        self.assertEquals(forecast_cache.stats()['hits'], 1)
+
+        Forecast.objects.filter(city='london').delete()
+        Forecast.objects.create(
+            humidity=2,
+            pressure=2,
+            temperature=2,  # -271.15C
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
+            clouds=2,
+            city=Cities.objects.get(name='london')
+        )
+
+        response = ResponseBuilder(self.request, 'london').get_response()
+        self.assertEquals(
+            json.loads(response.content)['temperature'],
+            '-271.15C'
+        )
+
+    def test_shared_cache_between_workers(self):
+        """Test that the forecast rows cached in the shared cache by one
+        worker are used by another worker without querying the database.
+        """
+        Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=1,  # -272.15C
+            forecast_for=corefunctions.datetime_to_epoch(self.now),
+            clouds=1,
+            city=Cities.objects.get(name='london')
+        )
+        ResponseBuilder(self.request, 'london').get_response()
+
+        # Emptying the in-process cache imitates a request landing on a
+        # different worker.
+        forecast_cache.clear()
+
+        with self.assertNumQueries(0):
+            response = ResponseBuilder(self.request, 'london').get_response()
+        self.assertEquals(
+            json.loads(response.content)['temperature'],
+            '-272.15C'
+        )
+
+        # Invalidating the city removes the rows from the shared cache.
+        slot = time_slot(datetime.now())
+        self.assertIsNotNone(shared_forecast_cache.get('london', slot))
+        ResponseBuilder.invalidate_cache('london')
+        self.assertIsNone(shared_forecast_cache.get('london', slot))
+
+    def test_single_query_per_request(self):
+        """Test that a request for a city which is not cached makes a single
+        database query and returns the forecast nearest to the time
+        requested.
+        """
+        for hours, temperature in [(-3, 1), (0, 2), (3, 3), (6, 4)]:
+            Forecast.objects.create(
+                humidity=1,
+                pressure=1,
+                temperature=temperature,
+                forecast_for=corefunctions.datetime_to_epoch(
+                    self.now + timedelta(hours=hours, minutes=10)
+                ),
+                clouds=1,
+                city=Cities.objects.get(name='london')
+            )
+
+        with self.assertNumQueries(1):
+            response = ResponseBuilder(self.request, 'london').get_response()
+        self.assertEquals(
+            json.loads(response.content)['temperature'],
+            '-271.15C'
+        )
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    def test_conditional_get(self):
+        """Test that responses carry caching headers and that a client
+        holding the current forecast receives a 304 without a body. The ETag
+        changes with the units requested and when the forecast is updated.
+        """
+        forecastFor = corefunctions.datetime_to_epoch(self.now)
+        forecast = Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=1,
+            forecast_for=forecastFor,
+            clouds=1,
+            city=Cities.objects.get(name='london'),
+            updated_at=1600000000
+        )
+        url = reverse('forecast', args=['london'])
+
+        response = self.client.get(url)
+        etag = response['ETag']
+        lastModified = response['Last-Modified']
+        self.assertEquals(response.status_code, 200)
+        # The forecast became the nearest half an interval before its time,
+        # after it was fetched.
+        self.assertEquals(lastModified, http_date(forecastFor - 5400))
+        self.assertIn('public', response['Cache-Control'])
+        maxAge = int(response['Cache-Control'].split('max-age=')[1])
+        self.assertTrue(
+            0 < maxAge <= config.API_TIME_INTERVAL_MINS * 60, maxAge
+        )
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response.content, b'')
+        self.assertEquals(response['ETag'], etag)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=lastModified)
+        self.assertEquals(response.status_code, 304)
+
+        response = self.client.get(
+            url, {'temp_units': 'K'}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response['ETag'], etag)
+
+        forecast.updated_at += 60
+        forecast.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response['ETag'], etag)
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    def test_nearest_forecast_changes(self):
+        """Test that a response for the current forecast is only cached
+        until another forecast becomes the nearest, and that a client which
+        cached the earlier forecast gets the new one once past the mid-point
+        between them.
+        """
+        nowEpoch = corefunctions.datetime_to_epoch(self.now)
+        url = reverse('forecast', args=['london'])
+
+        def create_forecasts(minutesBefore, minutesAfter):
+            Forecast.objects.filter(city='london').delete()
+            forecast_cache.clear()
+            shared_forecast_cache.clear()
+            for minutes, temperature in [(-minutesBefore, 1),
+                                         (minutesAfter, 2)]:
+                Forecast.objects.create(
+                    humidity=1,
+                    pressure=1,
+                    temperature=temperature,
+                    forecast_for=nowEpoch + minutes * 60,
+                    clouds=1,
+                    city=Cities.objects.get(name='london'),
+                    updated_at=1600000000
+                )
+
+        # Before the mid-point: the earlier forecast is the nearest until 10
+        # minutes from now.
+        create_forecasts(80, 100)
+        response = self.client.get(url)
+        cachedLastModified = response['Last-Modified']
+        maxAge = int(response['Cache-Control'].split('max-age=')[1])
+        self.assertEquals(json.loads(response.content)['temperature'],
+                          '-272.15C')
+        self.assertTrue(0 <= maxAge <= 600, maxAge)
+
+        # Past the mid-point: the later forecast is the nearest and a client
+        # revalidating with If-Modified-Since only receives it.
+        create_forecasts(100, 80)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=cachedLastModified
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(json.loads(response.content)['temperature'],
+                          '-271.15C')
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    def test_stale_while_revalidate(self):
+        """Test that when there is no forecast near the time requested, the
+        latest forecast up to config.STALE_MAX_MINS earlier is served with
+        staleness headers while the city is refreshed in the background.
+        """
+        Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=1,  # -272.15C
+            forecast_for=corefunctions.datetime_to_epoch(
+                self.now - timedelta(hours=5)
+            ),
+            clouds=1,
+            city=Cities.objects.get(name='london')
+        )
+        url = reverse('forecast', args=['london'])
+
+        with mock.patch.object(ResponseBuilder, 'revalidate') as revalidate, \
+                mock.patch.object(ResponseBuilder, 'call_API') as callAPI:
+            response = self.client.get(url)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            json.loads(response.content)['temperature'], '-272.15C'
+        )
+        staleSecs = int(response['X-Forecast-Stale'])
+        self.assertTrue(5 * 3600 <= staleSecs < 6 * 3600, staleSecs)
+        self.assertIn('Stale', response['Warning'])
+        self.assertIn('max-age=0', response['Cache-Control'])
+        self.assertEquals(revalidate.call_args[0][0], 'london')
+        callAPI.assert_not_called()
+
+        # Older than config.STALE_MAX_MINS, so the request waits for the API.
+        def call_API(city):
+            Forecast.objects.create(
+                humidity=2,
+                pressure=2,
+                temperature=2,  # -271.15C
+                forecast_for=corefunctions.datetime_to_epoch(self.now),
+                clouds=2,
+                city_id=city
+            )
+            return 1
+
+        with mock.patch.object(config, 'STALE_MAX_MINS', 60), \
+                mock.patch.object(ResponseBuilder,
+                                  'revalidate') as revalidate, \
+                mock.patch.object(ResponseBuilder, 'call_API',
+                                  side_effect=call_API) as callAPI:
+            response = self.client.get(url)
+
+        revalidate.assert_not_called()
+        callAPI.assert_called_once_with('london')
+        self.assertEquals(
+            json.loads(response.content)['temperature'], '-271.15C'
+        )
+        self.assertNotIn('X-Forecast-Stale', response)
+
+    @mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+    def test_upstream_outage(self):
+        """Test that when the API fails, a forecast up to
+        config.OUTAGE_STALE_MAX_MINS old is served as stale, an open circuit
+        returns a 503 with Retry-After and a city which the API does not
+        know returns a 404.
+        """
+        url = reverse('forecast', args=['london'])
+        fetch = mock.patch.object(upstream_client, 'fetch')
+
+        with fetch as fetchMock:
+            fetchMock.side_effect = CircuitOpenError('london', 12)
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 503)
+        self.assertEquals(response['Retry-After'], '12')
+        self.assertEquals(
+            json.loads(response.content)['error_code'],
+            'upstream unavailable'
+        )
+
+        with fetch as fetchMock:
+            fetchMock.side_effect = UpstreamError('london', 404)
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 404)
+
+        with fetch as fetchMock:
+            fetchMock.side_effect = UpstreamError('london', 500)
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 502)
+
+        Forecast.objects.create(
+            humidity=1,
+            pressure=1,
+            temperature=1,  # -272.15C
+            forecast_for=corefunctions.datetime_to_epoch(
+                self.now - timedelta(hours=12)
+            ),
+            clouds=1,
+            city=Cities.objects.get(name='london')
+        )
+        with fetch as fetchMock:
+            fetchMock.side_effect = CircuitOpenError('london', 12)
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            json.loads(response.content)['temperature'], '-272.15C'
+        )
+        self.assertIn('X-Forecast-Stale', response)
+
+    def test_revalidate(self):
+        """Test that revalidate queues a background refresh unless the city
+        is already queued or a refresh of the city is in progress.
+        """
+        with mock.patch.object(response_builder,
+                               'revalidate_executor') as executor:
+            self.assertTrue(ResponseBuilder.revalidate('london', lambda: []))
+            self.assertFalse(ResponseBuilder.revalidate('london', lambda: []))
+            self.assertEquals(executor.submit.call_count, 1)
+
+            # Once the refresh has run, the city can be queued again.
+            refresh = executor.submit.call_args[0][0]
+            with mock.patch.object(ResponseBuilder,
+                                   'refresh_forecasts') as refreshForecasts:
+                refresh()
+            refreshForecasts.assert_called_once()
+
+            with mock.patch.object(city_refreshes, 'in_flight',
+                                   return_value=True):
+                self.assertFalse(
+                    ResponseBuilder.revalidate('london', lambda: [])
+                )
+
+            self.assertTrue(ResponseBuilder.revalidate('london', lambda: []))
+            self.assertEquals(executor.submit.call_count, 2)
+
+    def test_call_API_bulk_insert(self):
+        """Test that call_API writes the forecasts in the API response in a
+        single INSERT and returns the number of rows written.
+        """
+        Forecast.objects.filter(city='london').delete()
+
+        with StubAPI(int(self.now.timestamp())) as stub, \
+                mock.patch.object(upstream_client, 'baseUrl', stub.url):
+            with CaptureQueriesContext(connection) as queries:
+                rowsWritten = ResponseBuilder.call_API('london')
+
+        # The API quota is also written, so only count the forecasts.
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith(
+                f'INSERT INTO "{Forecast._meta.db_table}"'
+            )
+        ]
+        self.assertEquals(rowsWritten, 40)
+        self.assertEquals(len(inserts), 1)
+        self.assertEquals(Forecast.objects.filter(city='london').count(), 40)
+
+    def test_call_API_upsert(self):
+        """Test that a refresh replaces the forecasts for the same times
+        rather than duplicating them.
+        """
+        start = int(self.now.timestamp())
+        Forecast.objects.filter(city='london').delete()
+
+        with StubAPI(start) as stub, \
+                mock.patch.object(upstream_client, 'baseUrl', stub.url):
+            ResponseBuilder.call_API('london')
+
+            # The second response overlaps the first by 30 forecasts.
+            stub.start = start + 10 * 10800
+            rowsWritten = ResponseBuilder.call_API('london')
+
+        self.assertEquals(rowsWritten, 40)
+        self.assertEquals(Forecast.objects.filter(city='london').count(), 50)
+
+        # The overlapping forecasts take the values of the second response.
+        latest = Forecast.objects.filter(city='london').order_by(
+            'forecast_for'
+        )[10]
+        self.assertEquals(latest.humidity, 0)
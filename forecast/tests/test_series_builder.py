@@ -0,0 +1,184 @@
+"""Unittests for the series_builder module (/forecast/<city>/series).
+The module includes the following tests:
+    * test_stored_forecasts: all the forecasts between two times are
+      returned using a single query.
+    * test_resample: a step between the stored forecasts interpolates them.
+    * test_units: units are converted for every forecast.
+    * test_invalid_requests: invalid cities and parameters return errors.
+    * test_fetches_missing_forecasts: the API is called when there are no
+      forecasts for the city.
+    * test_upstream_errors: errors fetching the forecasts are returned as by
+      the forecast view.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime, timedelta
+import json
+from unittest import mock
+
+# Third Party Imports
+from django.test import TestCase
+from django.urls import reverse
+
+# Local Imports
+import corefunctions
+from ..models import Forecast
+from ..response_builder import ResponseBuilder
+from ..upstream import CircuitOpenError, UpstreamError, upstream_client
+
+
+class TestSeriesBuilder(TestCase):
+    """Unittests for the forecast series view."""
+
+    def setUp(self):
+        Forecast.objects.filter(city='london').delete()
+
+        # 8 forecasts, 3 hours apart, starting tomorrow.
+        self.start = datetime.now().replace(
+            minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+        self.create_forecasts('london')
+
+    def create_forecasts(self, city):
+        Forecast.objects.bulk_create([
+            Forecast(
+                city_id=city,
+                humidity=10 * idx,
+                pressure=1000 + idx,
+                temperature=273.15 + idx,
+                clouds=5,
+                forecast_for=corefunctions.datetime_to_epoch(
+                    self.start + timedelta(hours=3 * idx)
+                )
+            )
+            for idx in range(8)
+        ])
+
+    def get_series(self, city='london', **params):
+        params.setdefault('from', self.iso(self.start))
+        params.setdefault('to', self.iso(self.start + timedelta(days=1)))
+        return self.client.get(
+            reverse('forecast_series', args=[city]), params
+        )
+
+    @staticmethod
+    def iso(date):
+        return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def test_stored_forecasts(self):
+        """Test that the stored forecasts between from and to are returned
+        using a single query.
+        """
+        with self.assertNumQueries(1):
+            response = self.get_series(
+                'London', to=self.iso(self.start + timedelta(hours=12))
+            )
+        content = json.loads(response.content)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(content['city'], 'london')
+        self.assertEquals(
+            content['units'],
+            {'humidity': '%', 'pressure': 'hPa', 'temperature': 'C'}
+        )
+        self.assertEquals(len(content['forecasts']), 5)
+        self.assertEquals(
+            content['forecasts'][1],
+            {
+                'time': (self.start + timedelta(hours=3)).isoformat(),
+                'humidity': 10,
+                'pressure': 1001,
+                'temperature': 1,
+                'clouds': 'clear sky',
+            }
+        )
+
+    def test_resample(self):
+        """Test that a step of 90 minutes interpolates halfway between the
+        stored forecasts.
+        """
+        response = self.get_series(
+            to=self.iso(self.start + timedelta(hours=6)),
+            step='90'
+        )
+        forecasts = json.loads(response.content)['forecasts']
+
+        self.assertEquals(
+            [forecast['humidity'] for forecast in forecasts],
+            [0, 5, 10, 15, 20]
+        )
+        self.assertEquals(
+            forecasts[1]['time'],
+            (self.start + timedelta(minutes=90)).isoformat()
+        )
+
+    def test_units(self):
+        """Test that the temperature and pressure units are converted."""
+        response = self.get_series(temp_units='K', pressure_units='Pa')
+        content = json.loads(response.content)
+
+        self.assertEquals(
+            content['units'],
+            {'humidity': '%', 'pressure': 'Pa', 'temperature': 'K'}
+        )
+        self.assertEquals(content['forecasts'][2]['temperature'], 275.15)
+        self.assertEquals(content['forecasts'][2]['pressure'], 100200)
+
+    def test_invalid_requests(self):
+        """Test that an invalid city returns a 404 and invalid parameters
+        return a 400.
+        """
+        self.assertEquals(self.get_series('westeros').status_code, 404)
+
+        for params in [
+            {'from': 'tomorrow'},
+            {'to': self.iso(self.start - timedelta(days=1))},
+            {'step': '0'},
+            {'step': 'hourly'},
+            {'step': '1', 'to': self.iso(self.start + timedelta(days=5))},
+            {'temp_units': 'X'},
+            {'pressure_units': 'mmHg'},
+        ]:
+            self.assertEquals(
+                self.get_series(**params).status_code, 400, params
+            )
+
+    def test_fetches_missing_forecasts(self):
+        """Test that the forecasts are fetched from the API when there are
+        none stored for the city.
+        """
+        Forecast.objects.filter(city='leeds').delete()
+
+        def call_API(city):
+            self.create_forecasts(city)
+            return 8
+
+        with mock.patch.object(ResponseBuilder, 'call_API',
+                               side_effect=call_API) as callAPI:
+            response = self.get_series('leeds')
+
+        callAPI.assert_called_once_with('leeds')
+        self.assertEquals(len(json.loads(response.content)['forecasts']), 8)
+
+    def test_upstream_errors(self):
+        """Test that a city unknown to the API is a 404, an open circuit a
+        503 with Retry-After and any other API error a 502.
+        """
+        Forecast.objects.filter(city='leeds').delete()
+
+        for error, status, errorCode in [
+            (UpstreamError('leeds', 404), 404, 'city not found'),
+            (UpstreamError('leeds', 500), 502, 'upstream error'),
+            (CircuitOpenError('leeds', 12), 503, 'upstream unavailable'),
+        ]:
+            with mock.patch.object(upstream_client, 'fetch',
+                                   side_effect=error):
+                response = self.get_series('leeds')
+
+            self.assertEquals(response.status_code, status)
+            self.assertEquals(
+                json.loads(response.content)['error_code'], errorCode
+            )
+
+        self.assertEquals(response['Retry-After'], '12')
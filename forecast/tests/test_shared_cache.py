@@ -0,0 +1,69 @@
+"""Unittests for the shared_cache module.
+The module includes the following tests:
+    * test_get_set: cached rows are returned from the Django cache.
+    * test_timeout: entries are stored until the next API interval boundary.
+    * test_invalidate: all the slots for a city are removed.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime
+from unittest import mock
+
+# Third Party Imports
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+# Local Imports
+from .. import config
+from ..forecast_cache import time_slot
+from ..shared_cache import SharedForecastCache
+
+CACHES = {
+    'test_forecast': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test_forecast',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+@mock.patch.object(config, 'API_TIME_INTERVAL_MINS', 180)
+class TestSharedForecastCache(SimpleTestCase):
+    """Unittests for the SharedForecastCache class."""
+
+    def setUp(self):
+        # 2020-02-15 12:00:00 (GMT), the start of a 3 hour slot.
+        self.now = 1581768000
+        self.cache = SharedForecastCache('test_forecast', lambda: self.now)
+        self.cache.clear()
+
+    def test_get_set(self):
+        """Test that cached rows are returned."""
+        self.assertIsNone(self.cache.get('kingston upon hull', 1))
+        self.cache.set('kingston upon hull', 1, ({'humidity': 1},))
+        self.assertEquals(
+            self.cache.get('kingston upon hull', 1),
+            ({'humidity': 1},)
+        )
+
+    def test_timeout(self):
+        """Test that rows are cached until the next slot boundary."""
+        self.now += 600
+        with mock.patch.object(caches['test_forecast'], 'set') as cacheSet:
+            self.cache.set('london', 1, ())
+        self.assertEquals(cacheSet.call_args[0][2], 10800 - 600)
+
+    def test_invalidate(self):
+        """Test that invalidating a city removes all of its slots."""
+        slot = time_slot(datetime.fromtimestamp(self.now))
+
+        for offset in range(0, 8 * config.MAX_FORCAST_DAYS):
+            self.cache.set('london', slot + offset, ())
+        self.cache.set('leeds', slot, ())
+
+        self.cache.invalidate('london')
+
+        for offset in range(0, 8 * config.MAX_FORCAST_DAYS):
+            self.assertIsNone(self.cache.get('london', slot + offset))
+        self.assertIsNotNone(self.cache.get('leeds', slot))
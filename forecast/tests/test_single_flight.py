@@ -0,0 +1,139 @@
+"""Unittests for the single_flight module.
+The module includes the following tests:
+    * test_concurrent_calls_coalesced: concurrent calls with the same key run
+      the function once and share the result.
+    * test_error_shared: an exception raised by the call is raised in every
+      waiting caller.
+    * test_refresh_lock: the lock is held for the with block and released
+      afterwards.
+    * test_abandoned_refresh_lock: a lock older than the timeout is taken
+      over.
+    * test_refresh_skipped_when_data_exists: the API is not called when
+      another worker has already fetched the data.
+"""
+
+# IMPORTS
+# Python Core Library
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+# Third Party Imports
+from django.test import SimpleTestCase, TestCase
+
+# Local Imports
+from .. import config
+from ..models import RefreshLock
+from ..response_builder import ResponseBuilder
+from ..single_flight import SingleFlight, refresh_lock
+
+
+class TestSingleFlight(SimpleTestCase):
+    """Unittests for the SingleFlight class."""
+
+    def run_concurrently(self, singleFlight, function, count=20):
+        """Calls singleFlight.do from count threads, holding the first call
+        until all the other threads are waiting for it, and returns the
+        results (or exceptions) of each thread.
+        """
+        results = []
+        release = threading.Event()
+
+        def blocked():
+            release.wait(5)
+            return function()
+
+        def worker():
+            try:
+                results.append(singleFlight.do('london', blocked))
+            except Exception as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+
+        # Hold the first call until every other caller is waiting for it.
+        deadline = time.monotonic() + 5
+        while singleFlight.waiting('london') < count - 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        return results
+
+    def test_concurrent_calls_coalesced(self):
+        """Test that concurrent calls run the function once."""
+        calls = []
+
+        def function():
+            calls.append(1)
+            return 'forecast'
+
+        singleFlight = SingleFlight()
+        results = self.run_concurrently(singleFlight, function)
+
+        self.assertEquals(len(results), 20)
+        self.assertTrue(all(result == 'forecast' for result in results))
+        self.assertEquals(len(calls), 1)
+        self.assertFalse(singleFlight.in_flight('london'))
+
+    def test_error_shared(self):
+        """Test that an exception is raised in every waiting caller."""
+        def function():
+            raise ValueError('API unavailable')
+
+        results = self.run_concurrently(SingleFlight(), function)
+
+        self.assertEquals(len(results), 20)
+        self.assertTrue(
+            all(isinstance(result, ValueError) for result in results)
+        )
+
+
+class TestRefreshLock(TestCase):
+    """Unittests for refresh_lock."""
+
+    def test_refresh_lock(self):
+        """Test that the lock row exists only inside the with block."""
+        with refresh_lock('london'):
+            self.assertTrue(RefreshLock.objects.filter(city='london').exists())
+        self.assertFalse(RefreshLock.objects.filter(city='london').exists())
+
+    def test_abandoned_refresh_lock(self):
+        """Test that a lock held for longer than the timeout is taken over
+        and that a lock within the timeout is waited for.
+        """
+        RefreshLock.objects.create(city_id='london', acquired_at=1000)
+        clock = SimpleNamespace(now=1000)
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += config.REFRESH_LOCK_TIMEOUT_SECS
+
+        with refresh_lock('london', lambda: clock.now, sleep):
+            lock = RefreshLock.objects.get(city='london')
+            self.assertGreater(lock.acquired_at, 1000)
+
+        self.assertEquals(len(sleeps), 2)
+        self.assertFalse(RefreshLock.objects.filter(city='london').exists())
+
+
+class TestRefreshForecasts(TestCase):
+    """Unittests for ResponseBuilder.refresh_forecasts."""
+
+    def test_refresh_skipped_when_data_exists(self):
+        """Test that the API is only called when there is no data after
+        acquiring the lock.
+        """
+        with mock.patch.object(ResponseBuilder, 'call_API') as callAPI:
+            ResponseBuilder.refresh_forecasts('london', lambda: True)
+            callAPI.assert_not_called()
+
+            ResponseBuilder.refresh_forecasts('london', lambda: False)
+            callAPI.assert_called_once_with('london')
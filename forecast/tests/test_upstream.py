@@ -0,0 +1,223 @@
+"""Unittests for the upstream module, run against a local stub of the API.
+The module includes the following tests:
+    * test_fetch: the forecasts in the response are returned.
+    * test_connection_reused: calls share one kept alive connection.
+    * test_error_status: a non 200 response raises an UpstreamError.
+    * test_retries: 5xx responses are retried.
+    * test_connection_error: an unreachable API raises an UpstreamError.
+    * test_fetch_many: many cities are fetched concurrently with per city
+      errors.
+    * test_not_found_cached: a city which the API does not know is not
+      requested again until the negative cache expires.
+    * test_circuit_opens: repeated failures stop calls to the API.
+    * test_circuit_breaker: the breaker opens, probes when half open and
+      closes after a success.
+    * test_invalid_body: a 200 which is not a forecast response raises an
+      UpstreamError and a failed probe does not leave the circuit stuck.
+    * test_quota_after_breaker: a token is only taken for a call which the
+      breaker allows and a probe refused by the quota can be retried.
+"""
+
+# IMPORTS
+# Python Core Library
+from datetime import datetime
+import socket
+from unittest import mock
+
+# Third Party Imports
+from django.test import SimpleTestCase
+
+# Local Imports
+from ..quota import QuotaExceeded
+from ..upstream import (CircuitBreaker, CircuitOpenError,
+                        QuotaExceededError, UpstreamClient, UpstreamError)
+from .stub_api import StubAPI
+
+
+class TestUpstreamClient(SimpleTestCase):
+    """Unittests for the UpstreamClient class."""
+
+    def setUp(self):
+        self.start = int(datetime(2020, 2, 15).timestamp())
+        self.stub = StubAPI(self.start).__enter__()
+        self.now = 0
+        self.client = UpstreamClient(
+            self.stub.url, 'key', timeout=2, retries=2, backoff=0,
+            notFoundSecs=60, clock=lambda: self.now
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.__exit__()
+
+    def test_fetch(self):
+        """Test that the forecasts in the response are returned."""
+        forecasts = self.client.fetch('london')
+        self.assertEquals(len(forecasts), 40)
+        self.assertEquals(forecasts[0]['dt'], self.start)
+        self.assertEquals(self.stub.requests, ['london'])
+
+    def test_connection_reused(self):
+        """Test that consecutive calls reuse the same connection."""
+        for _ in range(5):
+            self.client.fetch('london')
+        self.assertEquals(self.stub.connections, 1)
+
+    def test_error_status(self):
+        """Test that a 404 raises an UpstreamError and is not retried."""
+        self.stub.responses['westeros'] = (404, b'{"cod": "404"}')
+        with self.assertRaises(UpstreamError) as error:
+            self.client.fetch('westeros')
+        self.assertEquals(error.exception.status, 404)
+        self.assertEquals(self.stub.requests, ['westeros'])
+
+    def test_retries(self):
+        """Test that a 503 is retried before raising an UpstreamError."""
+        self.stub.responses['london'] = (503, b'{}')
+        with self.assertRaises(UpstreamError) as error:
+            self.client.fetch('london')
+        self.assertEquals(error.exception.status, 503)
+        self.assertEquals(self.stub.requests, ['london'] * 3)
+
+    def test_connection_error(self):
+        """Test that an unreachable API raises an UpstreamError."""
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            port = unused.getsockname()[1]
+
+        client = UpstreamClient(f'http://127.0.0.1:{port}/', 'key',
+                                timeout=1, retries=0)
+        with self.assertRaises(UpstreamError) as error:
+            client.fetch('london')
+        self.assertIsNone(error.exception.status)
+
+    def test_fetch_many(self):
+        """Test that many cities are fetched and errors are per city."""
+        self.stub.responses['westeros'] = (404, b'{"cod": "404"}')
+        results = self.client.fetch_many(
+            ['london', 'leeds', 'westeros', 'london'],
+            maxWorkers=3
+        )
+
+        self.assertEquals(set(results), {'london', 'leeds', 'westeros'})
+        self.assertEquals(len(results['london']), 40)
+        self.assertIsInstance(results['westeros'], UpstreamError)
+        self.assertEquals(sorted(self.stub.requests),
+                          ['leeds', 'london', 'westeros'])
+
+    def test_not_found_cached(self):
+        """Test that a 404 is remembered for notFoundSecs seconds."""
+        self.stub.responses['westeros'] = (404, b'{"cod": "404"}')
+        for now in [0, 59, 60]:
+            self.now = now
+            with self.assertRaises(UpstreamError) as error:
+                self.client.fetch('westeros')
+            self.assertEquals(error.exception.status, 404)
+
+        self.assertEquals(self.stub.requests, ['westeros', 'westeros'])
+        self.assertEquals(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuit_opens(self):
+        """Test that once the API has failed failureThreshold times in a
+        row, calls fail fast without calling the API.
+        """
+        client = UpstreamClient(
+            self.stub.url, 'key', timeout=2, retries=0,
+            breaker=CircuitBreaker(2, 30, clock=lambda: self.now)
+        )
+        self.stub.responses['london'] = (503, b'{}')
+
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                client.fetch('london')
+        with self.assertRaises(CircuitOpenError) as error:
+            client.fetch('leeds')
+        client.close()
+
+        self.assertEquals(error.exception.retryAfter, 31)
+        self.assertEquals(self.stub.requests, ['london', 'london'])
+
+    def test_circuit_breaker(self):
+        """Test the transitions between the breaker's states."""
+        breaker = CircuitBreaker(3, 30, clock=lambda: self.now)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEquals(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        # Half open: one probe is allowed, its failure opens the circuit.
+        self.now = 30
+        self.assertEquals(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEquals(breaker.state, CircuitBreaker.OPEN)
+
+        # A successful probe closes the circuit.
+        self.now = 60
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEquals(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_invalid_body(self):
+        """Test that a body which is not an object with a "list" raises an
+        UpstreamError, including on the half open probe, after which
+        another probe is allowed.
+        """
+        client = UpstreamClient(
+            self.stub.url, 'key', timeout=2, retries=0,
+            breaker=CircuitBreaker(1, 30, clock=lambda: self.now)
+        )
+        self.stub.responses['london'] = (200, b'[1, 2]')
+        self.stub.responses['leeds'] = (200, b'{"list": 1}')
+
+        with self.assertRaises(UpstreamError) as error:
+            client.fetch('london')
+        self.assertEquals(error.exception.status, 200)
+        self.assertEquals(client.breaker.state, CircuitBreaker.OPEN)
+
+        # The failed probe opens the circuit again until the next probe.
+        self.now = 30
+        with self.assertRaises(UpstreamError):
+            client.fetch('leeds')
+        self.now = 60
+        self.assertEquals(len(client.fetch('york')), 40)
+        self.assertEquals(client.breaker.state, CircuitBreaker.CLOSED)
+        client.close()
+
+    def test_quota_after_breaker(self):
+        """Test that no token is taken while the circuit is open and that a
+        half open probe refused by the quota does not block the next probe.
+        """
+        quota = mock.Mock()
+        client = UpstreamClient(
+            self.stub.url, 'key', timeout=2, retries=0, quota=quota,
+            breaker=CircuitBreaker(1, 30, clock=lambda: self.now)
+        )
+        self.stub.responses['london'] = (503, b'{}')
+
+        with self.assertRaises(UpstreamError):
+            client.fetch('london')
+        with self.assertRaises(CircuitOpenError):
+            client.fetch('leeds')
+        self.assertEquals(quota.acquire.call_count, 1)
+
+        self.now = 30
+        quota.acquire.side_effect = QuotaExceeded(5)
+        with self.assertRaises(QuotaExceededError):
+            client.fetch('leeds')
+        self.assertEquals(client.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        quota.acquire.side_effect = None
+        self.assertEquals(len(client.fetch('leeds')), 40)
+        self.assertEquals(client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEquals(quota.acquire.call_count, 3)
+        client.close()
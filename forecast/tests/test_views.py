@@ -3,6 +3,7 @@ Tests will check that the the views render correctly.
 The following views will be tested:
     * views.ping
     * views.forecast
+    * views.handler404 and views.handler500
 """
 
 # IMPORTS
@@ -11,10 +12,11 @@ import os
 import json
 
 # Third Party Imports
-from django.test import Client, SimpleTestCase
+from django.test import Client, RequestFactory, SimpleTestCase
 from django.urls import reverse
 
 # Local Imports
+from .. import views
 
 
 class TestPing(SimpleTestCase):
@@ -62,3 +64,37 @@ class TestForcast(SimpleTestCase):
         self.assertEquals(response.status_code, 404)
         self.assertEquals(content['error'], "Cannot find city 'westeros'")
         self.assertEquals(content['error_code'], 'city not found')
+
+
+class TestErrorHandlers(SimpleTestCase):
+    """Unittests for the 404 and 500 handlers, whose responses are
+    serialised once.
+    """
+
+    def test_handler404(self):
+        """Test that the 404 handler distinguishes a missing city."""
+        for path, error in [('/forecast/', 'no city provided'),
+                            ('/weather', 'page not found')]:
+            response = views.handler404(RequestFactory().get(path), None)
+            self.assertEquals(response.status_code, 404)
+            self.assertEquals(json.loads(response.content)['error'], error)
+
+    def test_handler500(self):
+        """Test that the 500 handler returns a 500 with a generic error and
+        that each call returns a new response.
+        """
+        request = RequestFactory().get('/forecast/london')
+        response = views.handler500(request)
+
+        self.assertEquals(response.status_code, 500)
+        self.assertEquals(
+            json.loads(response.content),
+            {
+                'error': 'Something went wrong',
+                'error_code': 'internal server error'
+            }
+        )
+        self.assertEquals(
+            response['Content-Type'], 'application/json; charset=utf-8'
+        )
+        self.assertIsNot(views.handler500(request), response)
@@ -0,0 +1,406 @@
+"""Client for the Open Weather Map forecast API (the upstream data source).
+All calls share one requests.Session so that connections to the API are
+pooled and kept alive between calls, and every call has a timeout so that a
+slow API cannot hang a worker. Failed calls (connection errors and 429/5xx
+responses) are retried with an exponential backoff.
+While the API is failing, a circuit breaker makes calls fail fast rather
+than tie up workers waiting on it, and cities which the API does not know
+(404 responses) are remembered so that they are not requested again.
+Calls are metered by the shared API quota (see quota.py).
+"""
+
+# IMPORTS
+# Python Core Imports
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import threading
+import time
+
+# Third Party Imports
+from django.db import close_old_connections, connections
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Local Imports
+from . import config
+from .metrics import stage, UPSTREAM_CALLS
+from .quota import api_quota, QuotaExceeded
+
+
+class UpstreamError(Exception):
+    """Raised when the API cannot provide the forecasts for a city.
+    Attributes:
+        * city [str]: the city requested.
+        * status [int]: the HTTP status code of the response or None if no
+                        response was received.
+    """
+
+    def __init__(self, city, status=None, message=''):
+        super().__init__(
+            f'API request for {city} failed ({status or "no response"}) '
+            f'{message}'.strip()
+        )
+        self.city = city
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the API while the circuit breaker is open.
+    Attributes:
+        * retryAfter [int]: seconds until the API will be called again.
+    """
+
+    def __init__(self, city, retryAfter):
+        super().__init__(city, message='circuit open')
+        self.retryAfter = retryAfter
+
+
+class QuotaExceededError(UpstreamError):
+    """Raised without calling the API when the API quota has been used up.
+    Attributes:
+        * retryAfter [int]: seconds until the quota is expected to allow a
+                            call.
+    """
+
+    def __init__(self, city, retryAfter):
+        super().__init__(city, message='quota exceeded')
+        self.retryAfter = retryAfter
+
+
+class CircuitBreaker:
+    """Stops calls to the API after consecutive failures. Thread safe.
+    The circuit is closed (calls are allowed) until failureThreshold calls
+    in a row fail, when it opens and calls are refused for openSecs seconds.
+    After that the circuit is half open: a single probe call is allowed, which
+    closes the circuit if it succeeds and opens it again if it fails.
+    Arguments:
+        * failureThreshold [int]: consecutive failures which open the
+                                  circuit. A value of 0 disables the
+                                  breaker.
+        * openSecs [float]: seconds the circuit stays open.
+        * clock [function]: (default=time.monotonic)
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half open'
+
+    def __init__(
+        self,
+        failureThreshold=config.UPSTREAM_FAILURE_THRESHOLD,
+        openSecs=config.UPSTREAM_OPEN_SECS,
+        clock=time.monotonic
+    ):
+        self.failureThreshold = failureThreshold
+        self.openSecs = openSecs
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Closes the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._openedAt = None
+            self._probing = False
+
+    @property
+    def state(self):
+        """The state of the circuit: CLOSED, OPEN or HALF_OPEN."""
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._openedAt is None:
+            return self.CLOSED
+        if self.clock() - self._openedAt < self.openSecs:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_after(self):
+        """Returns the number of seconds until a call will be allowed."""
+        with self._lock:
+            if self._openedAt is None:
+                return 0
+            return max(
+                0, int(self._openedAt + self.openSecs - self.clock()) + 1
+            )
+
+    def allow(self):
+        """Returns True if a call may be made. While half open, only the
+        first caller is allowed through (as the probe).
+        """
+        if not self.failureThreshold:
+            return True
+
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """Ends a probe which was allowed but not made, so that the next
+        caller may probe.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        """Records a successful call, closing the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._openedAt = None
+            self._probing = False
+
+    def record_failure(self):
+        """Records a failed call, opening the circuit once
+        failureThreshold calls in a row have failed or if the probe failed.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._probing or \
+                    self._failures >= (self.failureThreshold or float('inf')):
+                self._openedAt = self.clock()
+            self._probing = False
+
+
+class UpstreamClient:
+    """Fetches forecasts from the API using a pooled HTTP session.
+    Arguments:
+        * baseUrl [str]: URL of the forecast API.
+        * apiKey [str]: API key sent as the "appid" parameter.
+        * timeout [float]: seconds to wait to connect and for a response.
+        * retries [int]: number of times a failed call is retried.
+        * backoff [float]: backoff factor between retries (seconds), the nth
+                           retry waits backoff * 2 ** (n - 1) seconds.
+        * poolSize [int]: maximum number of connections kept open.
+        * notFoundSecs [float]: seconds a city which the API does not know
+                                is remembered for, so that it is not
+                                requested again.
+        * breaker [CircuitBreaker]: (default=a new CircuitBreaker)
+        * quota [quota.QuotaManager]: (default=None) takes a token before
+                                      each call. If None, calls are not
+                                      metered.
+        * clock [function]: (default=time.monotonic)
+    """
+
+    def __init__(
+        self,
+        baseUrl,
+        apiKey,
+        timeout=config.API_TIMEOUT_SECS,
+        retries=config.API_RETRIES,
+        backoff=config.API_BACKOFF_SECS,
+        poolSize=config.API_POOL_SIZE,
+        notFoundSecs=config.UPSTREAM_NOT_FOUND_SECS,
+        breaker=None,
+        quota=None,
+        clock=time.monotonic
+    ):
+        self.baseUrl = baseUrl
+        self.apiKey = apiKey
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.poolSize = poolSize
+        self.notFoundSecs = notFoundSecs
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.quota = quota
+        self.clock = clock
+
+        # City to the time until which the API is not asked for it again.
+        self._notFound = {}
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The HTTP session, created on first use."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self.new_session()
+        return self._session
+
+    def new_session(self):
+        """Returns a session which pools connections and retries failed
+        calls.
+        """
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # Return the last response rather than raising once the retries
+            # are used up so that the status code can be reported.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.poolSize,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def fetch(self, city):
+        """Returns the forecasts for a city (the "list" in the API response).
+        Raises UpstreamError if the API does not respond with a 200, or
+        without calling the API if it recently responded with a 404 for the
+        city. Raises CircuitOpenError if the API has been failing and
+        QuotaExceededError if the quota does not allow a call in time.
+        """
+        notFoundUntil = self._notFound.get(city)
+        if notFoundUntil is not None:
+            if self.clock() < notFoundUntil:
+                UPSTREAM_CALLS.inc(result='not_found_cached')
+                raise UpstreamError(city, 404, 'cached')
+            self._notFound.pop(city, None)
+
+        # The breaker is asked first so that a token is only taken for a
+        # call which will be made.
+        if not self.breaker.allow():
+            UPSTREAM_CALLS.inc(result='circuit_open')
+            raise CircuitOpenError(city, self.breaker.retry_after())
+
+        if self.quota is not None:
+            try:
+                self.quota.acquire()
+            except QuotaExceeded as error:
+                self.breaker.release()
+                UPSTREAM_CALLS.inc(result='quota_exceeded')
+                raise QuotaExceededError(city, error.retryAfter) from error
+
+        with stage('upstream_call'):
+            try:
+                forecasts = self._call(city)
+            except UpstreamError as error:
+                UPSTREAM_CALLS.inc(
+                    result='not_found' if error.status == 404 else 'error'
+                )
+                raise
+            except Exception:
+                # An unexpected error must still end a half open probe.
+                self.breaker.record_failure()
+                UPSTREAM_CALLS.inc(result='error')
+                raise
+
+        UPSTREAM_CALLS.inc(result='ok')
+
+        return forecasts
+
+    def _call(self, city):
+        """Calls the API for the forecasts for a city, recording the outcome
+        with the circuit breaker.
+        """
+        try:
+            response = self.session.get(
+                self.baseUrl,
+                params={'appid': self.apiKey, 'q': city},
+                timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            self.breaker.record_failure()
+            raise UpstreamError(city, message=str(error)) from error
+
+        if response.status_code == 404:
+            # The API is working but does not know the city.
+            self.breaker.record_success()
+            self._notFound[city] = self.clock() + self.notFoundSecs
+            raise UpstreamError(city, 404)
+
+        if response.status_code != 200:
+            self.breaker.record_failure()
+            raise UpstreamError(city, response.status_code)
+
+        try:
+            forecasts = response.json()['list']
+            if not isinstance(forecasts, list):
+                raise TypeError('"list" is not an array')
+        except (ValueError, KeyError, TypeError) as error:
+            self.breaker.record_failure()
+            raise UpstreamError(city, 200, 'invalid response') from error
+
+        self.breaker.record_success()
+
+        return forecasts
+
+    async def fetch_async(self, city):
+        """Awaitable version of fetch. The call runs on the client's own
+        thread pool (one thread per pooled connection) so the event loop is
+        free while waiting on the API.
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.poolSize,
+                        thread_name_prefix='upstream'
+                    )
+
+        # The context is copied so that the call is timed as part of the
+        # request (see metrics.request_timings).
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            contextvars.copy_context().run,
+            self._fetch_in_thread,
+            city
+        )
+
+    def _fetch_in_thread(self, city):
+        """Calls fetch on one of the client's threads, closing the thread's
+        database connection (opened by the quota) when it is too old, as
+        Django does at the end of each request.
+        """
+        close_old_connections()
+        try:
+            return self.fetch(city)
+        finally:
+            close_old_connections()
+
+    def fetch_many(self, cities, maxWorkers=config.API_POOL_SIZE):
+        """Fetches the forecasts for many cities concurrently. Returns a
+        dictionary of city to the forecasts for that city, or to the
+        UpstreamError raised if the forecasts could not be fetched.
+        """
+        def fetch(city):
+            try:
+                return city, self.fetch(city)
+            except UpstreamError as error:
+                return city, error
+            finally:
+                # Each worker thread opens its own database connection.
+                connections.close_all()
+
+        cities = list(dict.fromkeys(cities))
+        if not cities:
+            return {}
+
+        with ThreadPoolExecutor(min(maxWorkers, len(cities))) as executor:
+            return dict(executor.map(fetch, cities))
+
+    def close(self):
+        """Closes the pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+upstream_client = UpstreamClient(
+    config.API_URL,
+    config.API_KEY,
+    quota=api_quota
+)
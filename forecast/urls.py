@@ -1,7 +1,18 @@
 """Routes URLs to views. The following URLs are defined in this module:
     * ping/             Pings the server to check its status
+    * metrics           Routes to a view that will return the metrics of
+                        the service (Prometheus text format).
+    * forecast/batch    Routes to a view that will return weather
+                        information on many cities.
+    * forecast/export   Routes to a view that will stream the stored
+                        forecasts (staff only).
     * forecast/<city>   Routes to a view that will return weather
                         information on city.
+    * forecast/<city>/series
+                        Routes to a view that will return all the
+                        forecasts for city between two times.
+forecast/batch and forecast/export are defined before forecast/<city> so that
+they are not taken to be cities.
 """
 
 # IMPORTS
@@ -11,9 +22,21 @@
 from django.urls import path
 
 # Local Imports
-from . import views
+from . import config, views
 
 urlpatterns = [
     path('ping/', views.ping, name='ping'),
-    path('forecast/<str:city>', views.forecast, name='forecast')
+    path('metrics', views.metrics_view, name='metrics'),
+    path('forecast/batch', views.forecast_batch, name='forecast_batch'),
+    path('forecast/export', views.forecast_export, name='forecast_export'),
+    path(
+        'forecast/<str:city>',
+        views.forecast_async if config.ASYNC_VIEWS else views.forecast,
+        name='forecast'
+    ),
+    path(
+        'forecast/<str:city>/series',
+        views.forecast_series,
+        name='forecast_series'
+    ),
 ]
\ No newline at end of file
@@ -1,73 +1,186 @@
 """Renders forecast related views. These views include:
     * /ping: pings the service (JSON response)
+    * /metrics: metrics of the service in the Prometheus text format.
     */forecast/<city>: Gives weather information on a city.
+    * /forecast/batch: Gives weather information on many cities.
+    * /forecast/export: Streams the stored forecasts as NDJSON or CSV (staff
+      only).
+    * /forecast/<city>/series: Gives all the forecasts for a city between
+      two times.
+    * forecast_async: asynchronous version of the forecast view for ASGI
+      servers (routed to /forecast/<city> when config.ASYNC_VIEWS is set).
 """
 
 
 # IMPORTS
 # Python Core Imports
+from functools import lru_cache
 import os
-import json
 import re
 
 # Third Party Imports
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
 
 # Local Imports
-from .response_builder import ResponseBuilder
+from .async_support import refresh_forecasts_async, run_db
+from .batch_builder import BatchBuilder
+from . import export
+import corefunctions
+from .json_response import json_response, PreparedResponse
+from . import metrics
+from .profiling import instrument
+from .quota import api_quota
+from .response_builder import RefreshRequired, ResponseBuilder
+from .series_builder import SeriesBuilder
+from .upstream import UpstreamError
 
-contentType = 'application/json; charset=utf-8'
+NO_CITY_PROVIDED = PreparedResponse({
+    "error": "no city provided",
+    "error_code": "invalid request"
+}, 404)
+PAGE_NOT_FOUND = PreparedResponse({
+    "error": "page not found",
+    "error_code": "page not found"
+}, 404)
 
 
-def ping(request):
-    """Function to ping the server. Returns a response indicating that the
-    server is running.
-    """
+@lru_cache(maxsize=None)
+def ping_response():
+    """Returns the response to a ping, which is read and serialised once."""
     # Application Version
     with open(os.path.join(os.getcwd(), 'VERSION'), 'r') as f:
         version = f.read()
 
-    response = json.dumps(
+    return PreparedResponse(
         {'name': 'weatherservice', 'status': 'ok', 'version': version}
     )
 
-    return HttpResponse(response, content_type=contentType)
+
+def ping(request):
+    """Function to ping the server. Returns a response indicating that the
+    server is running.
+    """
+    return ping_response()()
+
+
+def metrics_view(request):
+    """Returns the metrics of the service in the Prometheus text format."""
+    return HttpResponse(
+        metrics.exposition(metrics.gauge(
+            'forecast_quota_tokens',
+            'API quota tokens left in the shared bucket.',
+            api_quota.tokens()
+        )),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 
+@instrument
 def forecast(request, city=None):
     """Returns weather information on city."""
     return ResponseBuilder(request, city).get_response()
 
 
+@csrf_exempt
+@instrument
+def forecast_batch(request):
+    """Returns weather information on the cities in the request."""
+    return BatchBuilder(request).get_response()
+
+
+def forecast_export(request):
+    """Streams the stored forecasts as NDJSON (default) or CSV. Only
+    available to staff users. The following parameters are read:
+        * format: "ndjson" or "csv".
+        * cities: comma separated cities to export (default: all cities).
+        * from, to: ISO 8601 times of the first and last forecasts.
+    """
+    def error(message, errorCode, status=400):
+        return json_response(
+            {'error': message, 'error_code': errorCode}, status
+        )
+
+    if not request.user.is_staff:
+        return error('Staff access required', 'forbidden', 403)
+
+    exportFormat = request.GET.get('format', 'ndjson').lower()
+    if exportFormat not in export.STREAM_FORMATS:
+        return error(
+            f'Format must be one of {", ".join(export.STREAM_FORMATS)}',
+            'invalid format'
+        )
+
+    cities = []
+    for city in filter(None, request.GET.get('cities', '').split(',')):
+        canonicalCity = corefunctions.city_registry.lookup(city)
+        if canonicalCity is None:
+            return error(f"Cannot find city '{city}'", 'city not found', 404)
+        cities.append(canonicalCity)
+
+    try:
+        epochs = {
+            name: corefunctions.datetime_to_epoch(
+                corefunctions.parse_date_string(request.GET[name])
+            )
+            for name in ('from', 'to') if request.GET.get(name)
+        }
+    except ValueError:
+        return error('Invalid date format, use ISO 8601', 'invalid date')
+
+    rows = export.export_rows(cities, epochs.get('from'), epochs.get('to'))
+
+    response = StreamingHttpResponse(
+        export.stream_lines(rows, exportFormat),
+        content_type=export.STREAM_FORMATS[exportFormat]
+    )
+    response['Content-Disposition'] = \
+        f'attachment; filename="forecasts.{exportFormat}"'
+
+    return response
+
+
+@instrument
+def forecast_series(request, city=None):
+    """Returns the weather forecasts for city between two times."""
+    return SeriesBuilder(request, city).get_response()
+
+
+@instrument
+async def forecast_async(request, city=None):
+    """Returns weather information on city without blocking the event loop.
+    The response is built on the database thread pool. If there is no data
+    for the city, the forecasts are fetched from the API asynchronously
+    (requests for the same city share one fetch) before building the
+    response again, without counting the request twice or fetching again.
+    If the fetch fails, the response is built as by the forecast view (e.g:
+    an older forecast is served).
+    """
+    try:
+        builder = await run_db(ResponseBuilder, request, city, False)
+    except RefreshRequired as required:
+        refreshError = None
+        try:
+            await refresh_forecasts_async(required.city, required.hasData)
+        except UpstreamError as error:
+            refreshError = error
+        builder = await run_db(
+            ResponseBuilder, request, required.city, False, refreshError,
+            True
+        )
+
+    return builder.get_response()
+
+
 def handler404(request, exception):
     """Handles a 404 HTTP response."""
     url = request.build_absolute_uri()
     if re.search('(forecast\/)|(forecast)$', url):
-        return HttpResponse(
-            json.dumps({
-                "error": "no city provided",
-                "error_code": "invalid request"
-            }),
-            status=404,
-            content_type=contentType
-        )
+        return NO_CITY_PROVIDED()
     else:
-        return HttpResponse(
-            json.dumps({
-                "error": "page not found",
-                "error_code": "page not found"
-            }),
-            status=404,
-            content_type=contentType
-        )
+        return PAGE_NOT_FOUND()
+
 
 def handler500(request):
-    """Handles a 404 HTTP response."""
-    return HttpResponse(
-        json.dumps({
-            "error": "Something went wrong",
-            "error_code": "internal server error"
-        }),
-        status=404,
-        content_type=contentType
-    )
\ No newline at end of file
+    """Handles a 500 HTTP response."""
+    return ResponseBuilder.SERVER_ERROR()
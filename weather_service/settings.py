@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'forecast.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +95,26 @@ else:
     }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# The "forecast" cache is shared between all the workers. Use a backend which
+# is shared between processes (e.g: memcached, Redis or a file based cache) in
+# production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'forecast': {
+        'BACKEND': os.getenv(
+            'FORECAST_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('FORECAST_CACHE_LOCATION', 'forecast'),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 